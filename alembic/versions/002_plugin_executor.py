@@ -0,0 +1,19 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "002_plugin_executor"
+down_revision: Union[str, None] = "001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # per-plugin executor placement ("thread" | "async" | "process")
+    op.add_column("plugins", sa.Column("executor", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("plugins", "executor")
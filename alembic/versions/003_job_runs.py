@@ -0,0 +1,54 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "003_job_runs"
+down_revision: Union[str, None] = "002_plugin_executor"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.text("CREATE SEQUENCE IF NOT EXISTS job_runs_id_seq"))
+
+    # Create job_runs table
+    op.create_table(
+        "job_runs",
+        sa.Column(
+            "id",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('job_runs_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("scheduler_job_id", sa.Text(), nullable=False),
+        sa.Column("plugin_id", sa.Integer(), nullable=False),
+        sa.Column("session_id", sa.Integer(), nullable=False),
+        sa.Column("job_id", sa.Integer(), nullable=True),
+        sa.Column("scheduled_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("duration", sa.Float(), nullable=True),
+        sa.Column("status", sa.Text(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("result_format", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.CheckConstraint("status IN ('success','error','missed')", name="ck_job_runs_status"),
+    )
+
+    # Create job_run_results table, blobs kept apart so listing runs never reads them
+    op.create_table(
+        "job_run_results",
+        sa.Column("run_id", sa.BigInteger(), nullable=False),
+        sa.Column("format", sa.Text(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint("run_id"),
+        sa.ForeignKeyConstraint(["run_id"], ["job_runs.id"], ondelete="CASCADE"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("job_run_results")
+    op.drop_table("job_runs")
+    op.execute(sa.text("DROP SEQUENCE IF EXISTS job_runs_id_seq"))
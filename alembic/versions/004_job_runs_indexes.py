@@ -0,0 +1,22 @@
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "004_job_runs_indexes"
+down_revision: Union[str, None] = "003_job_runs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keyset pagination (newest first) per job, per status, and retention/since scans
+    op.create_index("ix_job_runs_plugin_session_id", "job_runs", ["plugin_id", "session_id", "id"])
+    op.create_index("ix_job_runs_status_id", "job_runs", ["status", "id"])
+    op.create_index("ix_job_runs_finished_at", "job_runs", ["finished_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_job_runs_finished_at", table_name="job_runs")
+    op.drop_index("ix_job_runs_status_id", table_name="job_runs")
+    op.drop_index("ix_job_runs_plugin_session_id", table_name="job_runs")
@@ -0,0 +1,93 @@
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "005_jobs_indexes"
+down_revision: Union[str, None] = "004_job_runs_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# active configs besides the newest one of their (plugin, session)
+DUPLICATE_ACTIVE = (
+    "active = 1 AND id NOT IN ("
+    "SELECT MAX(id) FROM jobs WHERE active = 1 GROUP BY plugin_id, session_id)"
+)
+# jobs of a plugin that no longer exists, they can never be scheduled
+ORPHANED = "plugin_id NOT IN (SELECT id FROM plugins)"
+
+# rows listed in the error when the jobs table needs cleaning up
+SHOWN_ROWS = 20
+
+
+def upgrade() -> None:
+    # rows in the way of the unique index and the foreign key are only changed on request:
+    # alembic -x cleanup_jobs=1 upgrade head
+    cleanup = context.get_x_argument(as_dictionary=True).get("cleanup_jobs") == "1"
+    if cleanup:
+        op.execute(sa.text(f"UPDATE jobs SET active = 0 WHERE {DUPLICATE_ACTIVE}"))
+        op.execute(sa.text(f"DELETE FROM jobs WHERE {ORPHANED}"))
+    elif not context.is_offline_mode():
+        check_jobs()
+
+    op.create_foreign_key("fk_jobs_plugin_id", "jobs", "plugins", ["plugin_id"], ["id"])
+
+    # build without blocking writes on a large jobs table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_jobs_plugin_session",
+            "jobs",
+            ["plugin_id", "session_id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "uq_jobs_plugin_session_active",
+            "jobs",
+            ["plugin_id", "session_id"],
+            unique=True,
+            postgresql_where=sa.text("active = 1"),
+            sqlite_where=sa.text("active = 1"),
+            postgresql_concurrently=True,
+        )
+
+
+def check_jobs():
+    """Raise with the rows the unique index or the foreign key would fail on, if any."""
+    bind = op.get_bind()
+    problems = []
+    for reason, condition in (
+        ("more than one active config for its plugin and session", DUPLICATE_ACTIVE),
+        ("its plugin does not exist", ORPHANED),
+    ):
+        count = bind.execute(sa.text(f"SELECT COUNT(*) FROM jobs WHERE {condition}")).scalar()
+        if not count:
+            continue
+        rows = bind.execute(
+            sa.text(
+                f"SELECT id, plugin_id, session_id FROM jobs WHERE {condition} "
+                f"ORDER BY id LIMIT {SHOWN_ROWS}"
+            )
+        ).all()
+        listed = ", ".join(
+            f"id={job_id} (plugin_id={plugin_id}, session_id={session_id})"
+            for job_id, plugin_id, session_id in rows
+        )
+        more = f" and {count - len(rows)} more" if count > len(rows) else ""
+        problems.append(f"{count} jobs where {reason}: {listed}{more}")
+
+    if problems:
+        raise RuntimeError(
+            "Cannot add the jobs indexes and foreign key:\n  "
+            + "\n  ".join(problems)
+            + "\nFix these rows, or run `alembic -x cleanup_jobs=1 upgrade head` to deactivate "
+            "all but the newest active config of each plugin and session and delete the jobs "
+            "of missing plugins."
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_jobs_plugin_session_active", table_name="jobs")
+    op.drop_index("ix_jobs_plugin_session", table_name="jobs")
+    op.drop_constraint("fk_jobs_plugin_id", "jobs", type_="foreignkey")
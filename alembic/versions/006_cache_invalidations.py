@@ -0,0 +1,34 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "006_cache_invalidations"
+down_revision: Union[str, None] = "005_jobs_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.text("CREATE SEQUENCE IF NOT EXISTS cache_invalidations_id_seq"))
+
+    # lookup cache invalidations, polled by every node past the last id it has seen
+    op.create_table(
+        "cache_invalidations",
+        sa.Column(
+            "id",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('cache_invalidations_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("kind", sa.Text(), nullable=False),
+        sa.Column("key", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("cache_invalidations")
+    op.execute(sa.text("DROP SEQUENCE IF EXISTS cache_invalidations_id_seq"))
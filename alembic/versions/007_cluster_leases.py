@@ -0,0 +1,33 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "007_cluster_leases"
+down_revision: Union[str, None] = "006_cache_invalidations"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nodes of a cluster, and the shards of scheduler jobs each one holds a lease on
+    op.create_table(
+        "cluster_nodes",
+        sa.Column("node_id", sa.Text(), nullable=False),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("node_id"),
+    )
+    op.create_table(
+        "shard_leases",
+        sa.Column("shard", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("node_id", sa.Text(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("shard"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("shard_leases")
+    op.drop_table("cluster_nodes")
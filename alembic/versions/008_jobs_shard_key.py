@@ -0,0 +1,50 @@
+import zlib
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "008_jobs_shard_key"
+down_revision: Union[str, None] = "007_cluster_leases"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (plugin, session) pairs updated per statement while backfilling
+BATCH = 1000
+
+
+def upgrade() -> None:
+    # crc32 of the scheduler job id, models.job_shard_key, set by the application on insert
+    op.add_column("jobs", sa.Column("shard_key", sa.BigInteger(), nullable=True))
+    if context.is_offline_mode():
+        raise RuntimeError("Filling jobs.shard_key needs a database connection, run it online.")
+
+    bind = op.get_bind()
+    pairs = bind.execute(
+        sa.text("SELECT DISTINCT plugin_id, session_id FROM jobs ORDER BY plugin_id, session_id")
+    ).all()
+    statement = sa.text(
+        "UPDATE jobs SET shard_key = :shard_key "
+        "WHERE plugin_id = :plugin_id AND session_id = :session_id"
+    )
+    for start in range(0, len(pairs), BATCH):
+        bind.execute(
+            statement,
+            [
+                {
+                    "shard_key": zlib.crc32(f"{plugin_id}/{session_id}".encode()),
+                    "plugin_id": plugin_id,
+                    "session_id": session_id,
+                }
+                for plugin_id, session_id in pairs[start : start + BATCH]
+            ],
+        )
+
+    with op.batch_alter_table("jobs") as batch:
+        batch.alter_column("shard_key", existing_type=sa.BigInteger(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("jobs") as batch:
+        batch.drop_column("shard_key")
@@ -0,0 +1,173 @@
+"""
+Run `--nodes` clustered `PluginManager`s in one process against one SQLite database seeded
+with `--plugins` x `--sessions` no-op jobs (`benchmarks.synthetic`), and check and time how
+they share the jobs (`cluster.Cluster`):
+
+- "join": nodes start one after the other, seconds until every job is scheduled on exactly
+  one node, and the jobs per node then,
+- "mutate": a job deactivated and activated through a node that does not own it, seconds
+  until its owner paused and resumed it,
+- "leave": a node stops cleanly, seconds until its jobs are scheduled elsewhere,
+- "cut off": a node loses the database but keeps running, seconds until it dropped its jobs
+  and the others took them over once its leases expired.
+
+Every tick submitted on any node is recorded, and ticks of one job submitted by two nodes
+are counted as duplicates.
+
+    python -m benchmarks.bench_cluster --nodes 3 --plugins 4 --sessions 250
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Set
+
+from apscheduler.events import EVENT_JOB_SUBMITTED
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_suite import seed
+from cluster import Cluster
+from lookup_cache import LookupCache
+from models import Job
+from plugin_manager import PluginManager
+
+
+def scheduled(node: PluginManager) -> Set[str]:
+    return {job.id for job in node.scheduler.get_jobs()}
+
+
+def settled(nodes: List[PluginManager], expected: Set[str]) -> bool:
+    """
+    Whether each of `nodes` holds the shards rendezvous hashing gives it among them, and every
+    expected job is on exactly one of them.
+    """
+    node_ids = [node.cluster.node_id for node in nodes]  # type: ignore
+    for node in nodes:
+        cluster = node.cluster
+        assert cluster is not None
+        wanted = {s for s in range(cluster.shards) if cluster.owner(s, node_ids) == cluster.node_id}
+        if cluster.owned != wanted:
+            return False
+    seen: Counter = Counter()
+    for node in nodes:
+        seen.update(scheduled(node))
+    return set(seen) == expected and all(count == 1 for count in seen.values())
+
+
+async def wait_for(check: Callable[[], bool], timeout: float) -> float:
+    start = time.perf_counter()
+    while not check():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("cluster did not settle")
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - start
+
+
+async def bench(args) -> Dict[str, Any]:
+    engine, _ = seed("noop", args.plugins, args.sessions, args.interval)
+    with Session(engine) as session:
+        rows = session.execute(select(Job.id, Job.plugin_id, Job.session_id)).all()
+    expected = {f"{plugin_id}/{session_id}" for _, plugin_id, session_id in rows}
+
+    # (job id, tick) -> nodes that submitted it
+    submitted: Dict[tuple, List[str]] = {}
+
+    def make_node(n: int) -> PluginManager:
+        node = PluginManager(
+            engine,
+            engine=args.engine,
+            lookup_cache=LookupCache(db_engine=engine, poll_interval=args.heartbeat / 2),
+            cluster=Cluster(
+                engine,
+                node_id=f"node-{n}",
+                shards=args.shards,
+                heartbeat_interval=args.heartbeat,
+                lease_seconds=args.lease,
+            ),
+        )
+        node_id = node.cluster.node_id  # type: ignore
+
+        def record(event):
+            key = (event.job_id, event.scheduled_run_times[-1].timestamp())
+            submitted.setdefault(key, []).append(node_id)
+
+        node.scheduler.add_listener(record, EVENT_JOB_SUBMITTED)
+        return node
+
+    result: Dict[str, Any] = {"jobs": len(expected), "nodes": args.nodes, "shards": args.shards}
+    timeout = 10 * args.lease
+
+    start = time.perf_counter()
+    nodes = []
+    for n in range(args.nodes):
+        node = make_node(n)
+        node.start()
+        nodes.append(node)
+    await wait_for(lambda: settled(nodes, expected), timeout)
+    result["join_seconds"] = time.perf_counter() - start
+    result["jobs_per_node"] = [len(scheduled(node)) for node in nodes]
+    await asyncio.sleep(args.duration)
+
+    # through a node that does not schedule the job
+    job_id, plugin_id, session_id = rows[0]
+    scheduler_job_id = f"{plugin_id}/{session_id}"
+    owner = next(node for node in nodes if scheduler_job_id in scheduled(node))
+    other = next(node for node in nodes if node is not owner)
+
+    def paused(value: bool) -> Callable[[], bool]:
+        return lambda: (owner.scheduler.get_job(scheduler_job_id).next_run_time is None) == value
+
+    other.deactivate_job(job_id)
+    deactivate_seconds = await wait_for(paused(True), timeout)
+    other.activate_job(job_id)
+    result["mutate_seconds"] = [deactivate_seconds, await wait_for(paused(False), timeout)]
+
+    # a clean stop releases the leases at once
+    leaving = nodes.pop()
+    leaving.stop()
+    result["leave_seconds"] = await wait_for(lambda: settled(nodes, expected), timeout)
+
+    # a node cut off from the database keeps its leases until they expire, and has to stop
+    # running their jobs before that
+    if len(nodes) > 1:
+        cut_off = nodes.pop()
+
+        def unreachable():
+            raise OSError("database unreachable")
+
+        cut_off.cluster.heartbeat = unreachable  # type: ignore
+        result["cut_off_seconds"] = await wait_for(
+            lambda: not scheduled(cut_off) and settled(nodes, expected), timeout
+        )
+        nodes.append(cut_off)
+
+    await asyncio.sleep(args.duration)
+    for node in nodes:
+        node.stop()
+    result["ticks"] = len(submitted)
+    result["duplicate_ticks"] = sum(len(set(owners)) > 1 for owners in submitted.values())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--plugins", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=250)
+    parser.add_argument("--interval", type=int, default=1, help="seconds between job ticks")
+    parser.add_argument("--duration", type=float, default=3, help="seconds of steady running")
+    parser.add_argument("--shards", type=int, default=256)
+    parser.add_argument("--heartbeat", type=float, default=0.5, help="seconds")
+    parser.add_argument("--lease", type=float, default=2.0, help="seconds")
+    parser.add_argument("--engine", default="apscheduler", help="apscheduler or event")
+    args = parser.parse_args()
+    if args.nodes < 2:
+        parser.error("--nodes must be at least 2")
+    print(json.dumps(asyncio.run(bench(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Compare the scheduler engines of `PluginManager` (`engine="apscheduler"` or `"event"`) at 10k
+and 100k jobs: memory per job, time to add them, pause + resume per job, and the cost of a
+wakeup that dispatches every job once, per job. Memory is what the process holds.
+
+    python -m benchmarks.bench_engine --jobs 10000 100000
+
+`--engines apscheduler-sqlalchemy` adds APScheduler on a SQLAlchemyJobStore (a throwaway
+SQLite file), as in `test_worker.py`, where every run and state change rewrites a pickled row.
+Runs are handed to an executor that only counts them, so only the scheduler is measured.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from apscheduler.executors.base import BaseExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
+
+from event_scheduler import EventScheduler
+from job_placement import PhasedIntervalTrigger, phase_start
+
+ENGINES = ("apscheduler", "apscheduler-sqlalchemy", "event")
+
+
+def noop(package: str, scheduler_job_id: str):
+    pass
+
+
+class CountingExecutor(BaseExecutor):
+    """Counts submitted runs and finishes them right away."""
+
+    def __init__(self):
+        super().__init__()
+        self.submitted = 0
+
+    def _do_submit_job(self, job, run_times):
+        self.submitted += 1
+        self._run_job_success(job.id, [])
+
+
+def make_scheduler(engine: str):
+    if engine == "event":
+        return EventScheduler()
+    if engine == "apscheduler-sqlalchemy":
+        path = os.path.join(tempfile.mkdtemp(), "jobs.sqlite")
+        return AsyncIOScheduler(jobstores={"default": SQLAlchemyJobStore(f"sqlite:///{path}")})
+    return AsyncIOScheduler()
+
+
+def add_jobs(scheduler, jobs: int, plugins: int, interval: float, spread: float) -> List[str]:
+    ids = []
+    for n in range(jobs):
+        plugin_id = n % plugins + 1
+        scheduler_job_id = f"{plugin_id}/{n // plugins + 1}"
+        scheduler.add_job(
+            noop,
+            PhasedIntervalTrigger(
+                seconds=interval,
+                start_date=phase_start(scheduler_job_id, spread),
+            ),
+            args=[f"bench.plugin_{plugin_id}", scheduler_job_id],
+            id=scheduler_job_id,
+            name=scheduler_job_id,
+            coalesce=True,
+            max_instances=1,
+        )
+        ids.append(scheduler_job_id)
+    return ids
+
+
+async def bench(engine: str, jobs: int, plugins: int, samples: int) -> Dict[str, float]:
+    # every job ticks within the first `spread` seconds of the interval: one wakeup past that
+    # finds them all due, and the next one none
+    interval, spread = 10.0, 1.0
+
+    # memory, on a scheduler of its own as tracing slows the adds down
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scheduler = make_scheduler(engine)
+    scheduler.add_executor(CountingExecutor(), "default")
+    scheduler.start(paused=True)
+    add_jobs(scheduler, jobs, plugins, interval, spread)
+    gc.collect()
+    bytes_per_job = (tracemalloc.get_traced_memory()[0] - before) / jobs
+    tracemalloc.stop()
+    scheduler.shutdown(wait=False)
+    del scheduler
+    await asyncio.sleep(0)
+    gc.collect()
+
+    executor = CountingExecutor()
+    scheduler = make_scheduler(engine)
+    scheduler.add_executor(executor, "default")
+    # paused, so nothing runs before the wakeup below
+    scheduler.start(paused=True)
+    start = time.perf_counter()
+    ids = add_jobs(scheduler, jobs, plugins, interval, spread)
+    add_seconds = time.perf_counter() - start
+
+    random.seed(0)
+    sample = random.sample(ids, min(samples, len(ids)))
+    start = time.perf_counter()
+    for scheduler_job_id in sample:
+        scheduler.pause_job(scheduler_job_id)
+        scheduler.resume_job(scheduler_job_id)
+    pause_resume_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    # drive the wakeups by hand, without the loop's timer
+    scheduler.state = STATE_RUNNING
+    scheduler._process_jobs()
+    time.sleep(interval - time.time() % interval + spread)
+    executor.submitted = 0
+    start = time.perf_counter()
+    scheduler._process_jobs()
+    dispatch_seconds = time.perf_counter() - start
+    dispatched = executor.submitted
+
+    # a wakeup with nothing due
+    start = time.perf_counter()
+    scheduler._process_jobs()
+    idle_wakeup_us = (time.perf_counter() - start) * 1e6
+
+    scheduler.shutdown(wait=False)
+    await asyncio.sleep(0)
+    return {
+        "bytes_per_job": bytes_per_job,
+        "add_seconds": add_seconds,
+        "pause_resume_us": pause_resume_us,
+        "dispatched": dispatched,
+        "dispatch_us_per_job": dispatch_seconds / max(dispatched, 1) * 1e6,
+        "idle_wakeup_us": idle_wakeup_us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--plugins", type=int, default=10)
+    parser.add_argument("--engines", default="apscheduler,event")
+    parser.add_argument("--samples", type=int, default=1000, help="jobs paused and resumed")
+    args = parser.parse_args()
+
+    engines = args.engines.split(",")
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine}, pick from {', '.join(ENGINES)}")
+
+    for jobs in args.jobs:
+        result = {"jobs": jobs}
+        for engine in engines:
+            result[engine] = asyncio.run(bench(engine, jobs, args.plugins, args.samples))
+        print(json.dumps(result, indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    main()
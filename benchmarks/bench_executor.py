@@ -0,0 +1,96 @@
+"""
+Compare plugin runs per second between the thread path (`asyncio.run` per tick inside the
+default thread pool) and the native async path (`PluginRunner.run_async` on one loop).
+
+    python -m benchmarks.bench_executor --jobs 500 --rounds 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import pluggy
+from pydantic import BaseModel
+
+from plugin_manager import PluginManager
+from plugin_runner import ActiveConfig, PluginRunner
+
+hookimpl = pluggy.HookimplMarker("alpha-miner")
+
+PACKAGE = "benchmarks.bench_executor.NoopPlugin"
+
+
+class NoopConfig(BaseModel):
+    value: int = 0
+
+
+class NoopPlugin:
+
+    @hookimpl
+    @classmethod
+    def schema(cls):
+        return NoopConfig.model_json_schema()
+
+    @hookimpl
+    @classmethod
+    def config(cls, json=None):
+        return NoopConfig.model_validate(json or {})
+
+    @hookimpl
+    @classmethod
+    async def run(cls, config: NoopConfig, logger: logging.Logger):
+        await asyncio.sleep(0)
+        return True
+
+
+def setup(jobs: int) -> tuple[PluginRunner, list[str]]:
+    if PluginManager.manager.get_plugin(PACKAGE) is None:
+        PluginManager.manager.register(NoopPlugin, PACKAGE)
+
+    runner = PluginRunner(PluginManager.manager)
+    job_ids = [f"0/{i}" for i in range(jobs)]
+    for job_id in job_ids:
+        runner.active_configs[job_id] = ActiveConfig(NoopConfig().model_dump_json())
+    return runner, job_ids
+
+
+async def bench_thread(runner: PluginRunner, job_ids: list[str], rounds: int) -> float:
+    # same path as APScheduler's AsyncIOExecutor for a plain function
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(
+            *(loop.run_in_executor(None, runner.run, PACKAGE, job_id) for job_id in job_ids)
+        )
+    return len(job_ids) * rounds / (time.perf_counter() - start)
+
+
+async def bench_async(runner: PluginRunner, job_ids: list[str], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(runner.run_async(PACKAGE, job_id) for job_id in job_ids))
+    return len(job_ids) * rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    runner, job_ids = setup(args.jobs)
+
+    result = {
+        "jobs": args.jobs,
+        "rounds": args.rounds,
+        "thread_runs_per_sec": asyncio.run(bench_thread(runner, job_ids, args.rounds)),
+        "async_runs_per_sec": asyncio.run(bench_async(runner, job_ids, args.rounds)),
+    }
+    result["speedup"] = result["async_runs_per_sec"] / result["thread_runs_per_sec"]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Check that the incremental indicators (`plugins.indicators`) give the same signals as the
+DuckDB window query of `plugins.signals`, and time both, over consecutive days with one
+new bar per symbol each.
+
+    python -m benchmarks.bench_indicators --symbols 10 100 1000 --days 30
+
+Exits with status 1 if any day's results differ.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from plugins import signals
+
+
+def compare(sql, incremental) -> dict:
+    values = ["close", "ma_5", "ma_15"]
+    difference = np.abs(sql[values].to_numpy() - incremental[values].to_numpy())
+    return {
+        "same_rows": list(sql["symbol"]) == list(incremental["symbol"])
+        and list(sql["timestamp"]) == list(incremental["timestamp"]),
+        "same_signals": list(sql["signal"]) == list(incremental["signal"]),
+        "max_abs_diff": float(difference.max()),
+    }
+
+
+def bench(count: int, days: int) -> dict:
+    symbols = [f"SYM{i}" for i in range(count)]
+    price_map = {symbol: 0.5 + i for i, symbol in enumerate(symbols)}
+    start = date.today()
+    signals._history = signals.PriceHistory()
+    state = signals.signal_state()
+
+    sql_ms, incremental_ms, checks = [], [], []
+    for day in range(days):
+        today = start + timedelta(days=day)
+        # generate the day's bars first, both paths then read the same history
+        signals._history.series(symbols, price_map, np.datetime64(today, "D"))
+
+        t = time.perf_counter()
+        sql = signals.create_signals_sql(symbols, price_map, today)
+        sql_ms.append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        incremental = signals.create_signals(symbols, price_map, today, state=state)
+        incremental_ms.append((time.perf_counter() - t) * 1000)
+
+        checks.append(compare(sql, incremental))
+
+    # the first day feeds the whole history, later days a single bar
+    return {
+        "identical": all(c["same_rows"] and c["same_signals"] for c in checks),
+        "max_abs_diff": max(c["max_abs_diff"] for c in checks),
+        "signals": dict(zip(*np.unique(incremental["signal"], return_counts=True))),
+        "sql_ms": statistics.median(sql_ms[1:]),
+        "incremental_first_ms": incremental_ms[0],
+        "incremental_ms": statistics.median(incremental_ms[1:]),
+        "speedup": statistics.median(sql_ms[1:]) / statistics.median(incremental_ms[1:]),
+        "state_bytes": state.means.state_size(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    result = {count: bench(count, args.days) for count in args.symbols}
+    print(json.dumps(result, indent=2, default=int))
+    if not all(r["identical"] for r in result.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Time the per-user job queries behind `/schema`, `/activate` and `/delete` on a large jobs
+table, first without and then with the `jobs` indexes (`ix_jobs_plugin_session`,
+`uq_jobs_plugin_session_active`).
+
+    python -m benchmarks.bench_jobs --jobs 1000000 --db postgresql://localhost/bench
+
+Without `--db` a throwaway SQLite file is used. The tables are recreated, do not point this at
+a real database.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import Engine, create_engine, insert
+
+from lookup_cache import LookupCache
+from models import Base, Job, Plugin
+from plugin_manager import PluginManager
+from plugin_runner import PluginRunner
+
+
+def seed(db_engine: Engine, jobs: int, plugins: int, configs: int) -> int:
+    """Insert `jobs` configs, `configs` per (plugin, session) with the first one active."""
+    Base.metadata.drop_all(db_engine)
+    Base.metadata.create_all(db_engine)
+
+    sessions = max(1, jobs // (plugins * configs))
+    with db_engine.begin() as connection:
+        connection.execute(
+            insert(Plugin),
+            [
+                {"id": i, "package": f"bench.plugin_{i}", "interval": 60}
+                for i in range(1, plugins + 1)
+            ],
+        )
+
+        rows = []
+        for session_id in range(1, sessions + 1):
+            for plugin_id in range(1, plugins + 1):
+                for n in range(configs):
+                    rows.append(
+                        {
+                            "session_id": session_id,
+                            "plugin_id": plugin_id,
+                            "config": "{}",
+                            "active": 1 if n == 0 else 0,
+                        }
+                    )
+            if len(rows) >= 50_000:
+                connection.execute(insert(Job), rows)
+                rows = []
+        if rows:
+            connection.execute(insert(Job), rows)
+
+    return sessions
+
+
+def make_manager(db_engine: Engine) -> PluginManager:
+    # skip __init__, which would load plugins and schedule every seeded job
+    plugin_manager = PluginManager.__new__(PluginManager)
+    plugin_manager.db_engine = db_engine
+    plugin_manager.log_handler = None
+    plugin_manager.lookup_cache = LookupCache()
+    plugin_manager.scheduler = AsyncIOScheduler()
+    plugin_manager.runner = PluginRunner(PluginManager.manager)
+    plugin_manager.shard_lock = threading.RLock()
+    plugin_manager.cluster_jobs = None
+    return plugin_manager
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(plugin_manager: PluginManager, pairs: list[tuple[int, int]]) -> dict:
+    list_ms, activate_ms, delete_ms = [], [], []
+    for plugin_id, session_id in pairs:
+        scheduler_job_id = f"{plugin_id}/{session_id}"
+        plugin_manager.scheduler.add_job(print, id=scheduler_job_id, next_run_time=None)
+
+        list_ms.append(timed(plugin_manager.get_jobs_for_plugin_and_user, plugin_id, session_id))
+        jobs = plugin_manager.get_jobs_for_plugin_and_user(plugin_id, session_id)
+        inactive = [job.id for job in jobs if not job.active]
+        # switch the active config, then delete one that is not the last
+        activate_ms.append(timed(plugin_manager.activate_job, inactive[0]))
+        delete_ms.append(timed(plugin_manager.remove_job, inactive[-1]))
+
+    def summary(samples: list[float]) -> dict:
+        return {
+            "mean_ms": statistics.fmean(samples),
+            "p95_ms": statistics.quantiles(samples, n=20)[-1],
+        }
+
+    return {
+        "get_jobs_for_plugin_and_user": summary(list_ms),
+        "activate_job": summary(activate_ms),
+        "remove_job": summary(delete_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--plugins", type=int, default=10)
+    parser.add_argument("--configs", type=int, default=3, help="configs per plugin and session")
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.configs < 3:
+        parser.error("--configs must be at least 3")
+
+    db = args.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_jobs.db")
+    db_engine = create_engine(db)
+
+    start = time.perf_counter()
+    sessions = seed(db_engine, args.jobs, args.plugins, args.configs)
+    seed_seconds = time.perf_counter() - start
+
+    plugin_manager = make_manager(db_engine)
+    indexes = [
+        index
+        for index in Job.__table__.indexes
+        if index.name in ("ix_jobs_plugin_session", "uq_jobs_plugin_session_active")
+    ]
+
+    random.seed(0)
+    pairs = random.sample(
+        [(p, s) for p in range(1, args.plugins + 1) for s in range(1, sessions + 1)],
+        2 * args.samples,
+    )
+
+    for index in indexes:
+        index.drop(db_engine)
+    before = bench(plugin_manager, pairs[: args.samples])
+
+    for index in indexes:
+        index.create(db_engine)
+    after = bench(plugin_manager, pairs[args.samples :])
+
+    result = {
+        "db": db_engine.dialect.name,
+        "jobs": sessions * args.plugins * args.configs,
+        "seed_seconds": seed_seconds,
+        "before": before,
+        "after": after,
+        "speedup": {name: before[name]["mean_ms"] / after[name]["mean_ms"] for name in before},
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Time `create_signals` (`plugins.signals`) for 10 to 1000 symbols against the previous
+implementation (a Python loop per bar and a fresh DuckDB database per call, kept below as
+`create_signals_loop`).
+
+    python -m benchmarks.bench_signals --symbols 10 100 1000 --rounds 5
+
+"cold" is the first call, which generates the history. "warm" reuses it. "next_day" appends
+one bar per symbol.
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from plugins import signals
+
+
+def create_signals_loop(symbols, price_map):
+    np.random.seed(42)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for symbol in symbols:
+        price = price_map[symbol]
+        for i in reversed(range(signals.NUM_DAYS)):
+            price = max(0.0001, price - np.random.normal(0, price * 0.01))
+            rows.append(
+                {
+                    "timestamp": today - timedelta(days=i),
+                    "symbol": symbol,
+                    "close": round(price, 6 if price < 1 else 2),
+                    "volume": np.random.randint(1_000_000, 50_000_000),
+                }
+            )
+
+    con = duckdb.connect(database=":memory:")
+    con.register("prices_df", pd.DataFrame(rows))
+    con.execute("CREATE TABLE bars AS SELECT * FROM prices_df")
+    return con.execute(signals.SIGNALS_QUERY).df()
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(count: int, rounds: int) -> dict:
+    symbols = [f"SYM{i}" for i in range(count)]
+    price_map = {symbol: 10.0 + i for i, symbol in enumerate(symbols)}
+    today = date.today()
+
+    loop_ms = [timed(create_signals_loop, symbols, price_map) for _ in range(rounds)]
+
+    cold_ms, warm_ms, next_day_ms = [], [], []
+    for _ in range(rounds):
+        signals._history = signals.PriceHistory()
+        cold_ms.append(timed(signals.create_signals, symbols, price_map, today))
+        warm_ms.append(timed(signals.create_signals, symbols, price_map, today))
+        next_day_ms.append(
+            timed(signals.create_signals, symbols, price_map, today + timedelta(days=1))
+        )
+
+    loop = statistics.median(loop_ms)
+    warm = statistics.median(warm_ms)
+    return {
+        "loop_ms": loop,
+        "cold_ms": statistics.median(cold_ms),
+        "warm_ms": warm,
+        "next_day_ms": statistics.median(next_day_ms),
+        "speedup_warm": loop / warm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps({count: bench(count, args.rounds) for count in args.symbols}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
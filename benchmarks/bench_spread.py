@@ -0,0 +1,113 @@
+"""
+Simulate when the ticks of many jobs of one plugin fire, and how many of their runs overlap,
+with the scheduler's triggers: all jobs on the same tick (no phase offsets), spread by phase
+offsets, with jitter on top, and with a per-plugin run limit.
+
+    python -m benchmarks.bench_spread --jobs 10000 --interval 60 --duration 2 --limit 200
+
+Nothing is run, fire times come from the triggers `JobPlacement.trigger` builds and every
+run is assumed to take `--duration` seconds.
+"""
+
+import argparse
+import heapq
+import json
+import random
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from job_placement import JobPlacement
+from plugin_manager import PluginManager
+
+
+def fire_times(
+    jobs: int, interval: float, window: float, phase_offsets: bool, jitter: Optional[float]
+) -> List[float]:
+    """Seconds after start-up at which the ticks of `jobs` jobs fire within `window`."""
+    plugin_manager = PluginManager.__new__(PluginManager)
+    plugin_manager.phase_offsets = phase_offsets
+    plugin_manager.jitter = jitter
+    placements = JobPlacement(plugin_manager, default_executor=False)
+
+    now = datetime.now(timezone.utc)
+    end = now + timedelta(seconds=window)
+    times = []
+    for session_id in range(1, jobs + 1):
+        trigger = placements.trigger(f"1/{session_id}", interval)
+        fire_time = trigger.get_next_fire_time(None, now)
+        while fire_time is not None and fire_time < end:
+            times.append((fire_time - now).total_seconds())
+            fire_time = trigger.get_next_fire_time(fire_time, fire_time)
+    times.sort()
+    return times
+
+
+def limited(starts: List[float], duration: float, limit: Optional[int]) -> List[float]:
+    """Start times once at most `limit` runs execute at once, waiting in tick order."""
+    if not limit:
+        return starts
+    # when each of the `limit` slots frees up
+    slots = [0.0] * limit
+    result = []
+    for fire_time in starts:
+        start = max(fire_time, heapq.heappop(slots))
+        heapq.heappush(slots, start + duration)
+        result.append(start)
+    return result
+
+
+def summary(fired: List[float], starts: List[float], duration: float) -> dict:
+    per_second = Counter(int(start) for start in starts)
+    seconds = range(int(starts[-1]) + 1) if starts else range(0)
+    counts = [per_second.get(second, 0) for second in seconds]
+
+    # peak number of runs executing at the same time
+    events = sorted([(start, 1) for start in starts] + [(start + duration, -1) for start in starts])
+    running = peak = 0
+    for _, delta in events:
+        running += delta
+        peak = max(peak, running)
+
+    waits = [start - fire_time for fire_time, start in zip(fired, starts)]
+    return {
+        "runs": len(starts),
+        "starts_per_second": {
+            "max": max(counts, default=0),
+            "p95": statistics.quantiles(counts, n=20)[-1] if len(counts) > 1 else 0,
+            "stdev": statistics.pstdev(counts) if counts else 0,
+        },
+        "peak_concurrent_runs": peak,
+        "wait_seconds": {"mean": statistics.fmean(waits), "max": max(waits)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10_000)
+    parser.add_argument("--interval", type=float, default=60)
+    parser.add_argument("--window", type=float, default=600, help="seconds to simulate")
+    parser.add_argument("--duration", type=float, default=2, help="seconds per run")
+    parser.add_argument("--jitter", type=float, default=5)
+    parser.add_argument("--limit", type=int, default=200, help="max runs of the plugin at once")
+    args = parser.parse_args()
+
+    random.seed(0)
+    scenarios = {
+        "aligned": (False, None, None),
+        "phase_offsets": (True, None, None),
+        "phase_offsets+jitter": (True, args.jitter, None),
+        "phase_offsets+jitter+limit": (True, args.jitter, args.limit),
+        "aligned+limit": (False, None, args.limit),
+    }
+
+    result = {"jobs": args.jobs, "interval": args.interval, "duration": args.duration}
+    for name, (phase_offsets, jitter, limit) in scenarios.items():
+        fired = fire_times(args.jobs, args.interval, args.window, phase_offsets, jitter)
+        result[name] = summary(fired, limited(fired, args.duration, limit), args.duration)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
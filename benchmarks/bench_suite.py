@@ -0,0 +1,401 @@
+"""
+Offline benchmark and load-test suite: seeds `--plugins` plugins x `--sessions` sessions of
+synthetic plugins (`benchmarks.synthetic`) with `create_data` into a temporary SQLite
+database, drives a real `PluginManager` and, for the log and API scenarios, the FastAPI app
+served by uvicorn on localhost.
+
+    python -m benchmarks.bench_suite --plugins 4 --sessions 50 --duration 10 --out bench.json
+    python -m benchmarks.bench_suite --compare before.json bench.json
+
+Scenarios (`--scenarios`, all by default):
+
+- "noop", "cpu", "log": scheduler tick overhead (time spent in APScheduler's `_process_jobs`
+  per wake-up), runs per second, start lag and run duration percentiles, and missed /
+  max-instances / coalesced ticks, for no-op, CPU-bound and log-heavy plugins,
+- "websockets": log lines per second delivered to `--clients` WebSocket clients of
+  `/ws/logs/...`, next to the lines the jobs wrote, and what the log path dropped,
+- "api": latency of `GET /schema/...` and `POST /config/...` with `--concurrency` requests
+  in flight, while the scheduler runs the jobs.
+
+Every scenario runs in a fresh process so class-level state does not leak between them.
+Lag percentiles come from the fixed-bucket histograms of `metrics.py`, request latencies
+from every sample. Results are JSON, `--compare` prints the change of every number.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+SCENARIOS = ("noop", "cpu", "log", "websockets", "api")
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max/mean of `samples` (seconds) in milliseconds."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "p50": at(0.5),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": ordered[-1] * 1000,
+        "mean": statistics.fmean(ordered) * 1000,
+    }
+
+
+def histogram_ms(histogram) -> Dict[str, Optional[float]]:
+    summary = histogram.summary()
+    return {
+        key: (value * 1000 if value is not None else None)
+        for key, value in summary.items()
+        if key != "count"
+    }
+
+
+def seed(kind: str, plugins: int, sessions: int, interval: int):
+    from sqlalchemy import create_engine
+
+    from benchmarks import synthetic
+    from create_data import create_data
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-suite-"), "bench.sqlite")
+    db_connection = f"sqlite:///{path}"
+    engine = create_engine(db_connection)
+    create_data(
+        engine,
+        session_ids=list(range(1, sessions + 1)),
+        plugin_data=[
+            {
+                "package": synthetic.package(kind, n),
+                "interval": interval,
+                "description": f"synthetic {kind} plugin {n}",
+            }
+            for n in range(plugins)
+        ],
+    )
+    return engine, db_connection
+
+
+class TickTimer:
+    """Times every wake-up of the scheduler, the work it does outside the runs."""
+
+    def __init__(self, scheduler):
+        self.durations: List[float] = []
+        process_jobs = scheduler._process_jobs
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return process_jobs()
+            finally:
+                self.durations.append(time.perf_counter() - start)
+
+        scheduler._process_jobs = timed
+
+
+async def serve(app):
+    """Serve `app` on a free localhost port, returns the uvicorn server, its task and port."""
+    import uvicorn
+
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=0, lifespan="off", log_level="warning", ws="websockets"
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, port
+
+
+async def run_scenario(name: str, args) -> Dict[str, Any]:
+    from benchmarks import synthetic
+    from log_handler import JobLogHandler
+    from metrics import EVENTS, SchedulerMetrics
+    from plugin_manager import PluginManager
+
+    # job loggers pass everything to the log handler, as in server.py
+    logging.basicConfig(level=logging.DEBUG, handlers=[logging.NullHandler()])
+    synthetic.CPU_MS = args.cpu_ms
+    synthetic.LOG_LINES = args.log_lines
+    kind = name if name in synthetic.KINDS else ("log" if name == "websockets" else "noop")
+    engine, db_connection = seed(kind, args.plugins, args.sessions, args.interval)
+    loop = asyncio.get_running_loop()
+
+    server = task = None
+    sink: Counter = Counter()
+    if name in ("websockets", "api"):
+        import server as app_module
+
+        log_handler = JobLogHandler(app_module.manager.send_logs, loop)
+        async_db_engine = app_module.create_async_db_engine(db_connection)
+    else:
+
+        async def count_lines(job_id: str, lines: list):
+            sink["lines"] += len(lines)
+
+        log_handler = JobLogHandler(count_lines, loop)
+        async_db_engine = None
+
+    plugin_manager = PluginManager(
+        engine,
+        log_handler=log_handler,
+        execution_mode=args.mode,
+        async_db_engine=async_db_engine,
+    )
+    ticks = TickTimer(plugin_manager.scheduler)
+    plugin_manager.start()
+
+    if name in ("websockets", "api"):
+        app_module.app.state.plugin_manager = plugin_manager
+        app_module.app.state.log_handler = log_handler
+        server, task, port = await serve(app_module.app)
+
+    try:
+        await asyncio.sleep(args.warmup)
+        # measure from here on
+        plugin_manager.metrics = SchedulerMetrics()
+        ticks.durations.clear()
+        sink.clear()
+        cpu_start, start = time.process_time(), time.perf_counter()
+
+        if name == "websockets":
+            extra = await drive_websockets(port, args)
+        elif name == "api":
+            extra = await drive_api(port, args)
+        else:
+            extra = {}
+            await asyncio.sleep(args.duration)
+
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        metrics = plugin_manager.metrics
+        totals = metrics.totals()
+        jobs = args.plugins * args.sessions
+        result = {
+            "jobs": jobs,
+            "seconds": elapsed,
+            "cpu_percent": 100 * cpu / elapsed,
+            "runs_per_sec": totals["runs"] / elapsed,
+            "expected_runs_per_sec": jobs / args.interval,
+            **{event: totals[event] for event in EVENTS if event != "runs"},
+            "ticks": len(ticks.durations),
+            "tick_ms": percentiles(ticks.durations),
+            # wake-up time per run it started
+            "tick_ms_per_run": (
+                sum(ticks.durations) * 1000 / totals["runs"] if totals["runs"] else None
+            ),
+            "start_lag_ms": histogram_ms(metrics.merged("lag")),
+            "run_duration_ms": histogram_ms(metrics.merged("duration")),
+            **extra,
+        }
+        if kind == "log":
+            result["lines_written_per_sec"] = totals["runs"] * args.log_lines / elapsed
+        if name not in ("websockets", "api"):
+            # job lines and the scheduler's event lines, through the log handler
+            result["log_lines_per_sec"] = sink["lines"] / elapsed
+        result["log_dropped"] = log_handler.dropped
+        return result
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await task
+        plugin_manager.stop()
+
+
+async def drive_websockets(port: int, args) -> Dict[str, Any]:
+    from websockets.asyncio.client import connect
+
+    import server as app_module
+
+    job_ids = [f"{p}/{s}" for p in range(1, args.plugins + 1) for s in range(1, args.sessions + 1)]
+    received = [0] * args.clients
+
+    async def client(i: int):
+        url = f"ws://127.0.0.1:{port}/ws/logs/{job_ids[i % len(job_ids)]}"
+        async with connect(url, max_size=None) as websocket:
+            async for message in websocket:
+                received[i] += len(json.loads(message))
+
+    clients = [asyncio.create_task(client(i)) for i in range(args.clients)]
+    # connected and past the replay of recent lines
+    await asyncio.sleep(1)
+    before = sum(received)
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    delivered = sum(received) - before
+    elapsed = time.perf_counter() - start
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    ws_stats = app_module.manager.stats()
+    return {
+        "clients": args.clients,
+        "lines_delivered_per_sec": delivered / elapsed,
+        "lines_delivered_per_client_per_sec": delivered / elapsed / args.clients,
+        "ws_skipped_frames": ws_stats.get("skipped_frames"),
+        "ws_evictions": ws_stats.get("evictions"),
+    }
+
+
+async def drive_api(port: int, args) -> Dict[str, Any]:
+    import httpx
+
+    rng = random.Random(args.seed)
+    jobs = args.plugins * args.sessions
+    latencies: Dict[str, List[float]] = {"schema": [], "config": []}
+    errors: Counter = Counter()
+    requests = iter(range(args.requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in requests:
+            if i % 2 == 0:
+                endpoint = "schema"
+                plugin_id = rng.randint(1, args.plugins)
+                session_id = rng.randint(1, args.sessions)
+                call = client.get(f"/schema/{session_id}/{plugin_id}")
+            else:
+                endpoint = "config"
+                # jobs were seeded one per plugin and session, ids 1..jobs
+                call = client.post(
+                    f"/config/{rng.randint(1, jobs)}",
+                    json={"config": {"value": i}, "description": "bench"},
+                )
+            start = time.perf_counter()
+            response = await call
+            latencies[endpoint].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors[f"{endpoint} {response.status_code}"] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "requests_per_sec": args.requests / elapsed,
+        "schema_ms": percentiles(latencies["schema"]),
+        "config_ms": percentiles(latencies["config"]),
+        "http_errors": dict(errors),
+    }
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            result.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return result
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = flatten(json.load(f)["results"])
+    with open(after_path) as f:
+        after = flatten(json.load(f)["results"])
+    keys = sorted(before.keys() | after.keys())
+    width = max(len(key) for key in keys)
+    for key in keys:
+        a, b = before.get(key), after.get(key)
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+        cells = [f"{value:.6g}" if value is not None else "-" for value in (a, b)]
+        print(f"{key:<{width}}  {cells[0]:>12}  {cells[1]:>12}  {change}")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--plugins", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--interval", type=int, default=1, help="seconds between a job's runs")
+    parser.add_argument("--mode", choices=("thread", "async"), default="thread")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--cpu-ms", type=float, default=5)
+    parser.add_argument("--log-lines", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--only", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.only:
+        # child process of one scenario, see below
+        result = asyncio.run(run_scenario(args.only, args))
+        print(json.dumps(result))
+        sys.stdout.flush()
+        os._exit(0)
+
+    results = {}
+    for name in args.scenarios:
+        print(f"running {name}...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_suite", *sys.argv[1:], "--only", name],
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode != 0 or not child.stdout.strip():
+            results[name] = {"error": child.stderr.strip().splitlines()[-1:]}
+            continue
+        results[name] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key not in ("out", "only")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Synthetic plugins for the benchmark suite (`benchmarks.bench_suite`):
+
+- `NoopPlugin` returns right away, so only the scheduler's own work is measured,
+- `CpuPlugin` keeps its thread busy for `CPU_MS` milliseconds,
+- `LogPlugin` writes `LOG_LINES` lines to the job logger.
+
+The `plugins` table wants one package per row, so any `<Name>_<n>` attribute of this module
+(`benchmarks.synthetic.NoopPlugin_7`) is a subclass of `<Name>` made on first access.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import pluggy
+from pydantic import BaseModel
+
+hookimpl = pluggy.HookimplMarker("alpha-miner")
+
+# milliseconds of CPU work per run of CpuPlugin
+CPU_MS = 5.0
+# lines per run of LogPlugin
+LOG_LINES = 20
+
+
+class SyntheticConfig(BaseModel):
+    value: int = 0
+
+
+class NoopPlugin:
+
+    @hookimpl
+    @classmethod
+    def schema(cls):
+        return SyntheticConfig.model_json_schema()
+
+    @hookimpl
+    @classmethod
+    def config(cls, json=None):
+        return SyntheticConfig.model_validate(json or {})
+
+    @hookimpl
+    @classmethod
+    async def run(cls, config: SyntheticConfig, logger: logging.Logger):
+        await asyncio.sleep(0)
+        return True
+
+
+class CpuPlugin(NoopPlugin):
+
+    @hookimpl
+    @classmethod
+    async def run(cls, config: SyntheticConfig, logger: logging.Logger):
+        deadline = time.thread_time() + CPU_MS / 1000
+        total = 0
+        while time.thread_time() < deadline:
+            total += sum(range(1000))
+        return total
+
+
+class LogPlugin(NoopPlugin):
+
+    @hookimpl
+    @classmethod
+    async def run(cls, config: SyntheticConfig, logger: logging.Logger):
+        for i in range(LOG_LINES):
+            logger.info(f"line {i} of {LOG_LINES}, value={config.value}")
+        return True
+
+
+KINDS = {"noop": NoopPlugin, "cpu": CpuPlugin, "log": LogPlugin}
+
+_variants: Dict[str, type] = {}
+
+
+def package(kind: str, n: int) -> str:
+    """Package string of the n-th plugin of `kind` ("noop", "cpu" or "log")."""
+    return f"{__name__}.{KINDS[kind].__name__}_{n}"
+
+
+def __getattr__(name: str) -> type:
+    base, _, n = name.rpartition("_")
+    parent = globals().get(base)
+    if parent not in KINDS.values() or not n.isdigit():
+        raise AttributeError(name)
+    variant = _variants.get(name)
+    if variant is None:
+        variant = _variants[name] = type(name, (parent,), {"__module__": __name__})
+    return variant
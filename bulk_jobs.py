@@ -0,0 +1,389 @@
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+from apscheduler.schedulers.base import STATE_RUNNING
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from models import Job, Plugin
+
+if TYPE_CHECKING:
+    from plugin_manager import PluginManager
+
+logger = logging.getLogger(__name__)
+
+# session ids per IN (...) of the bulk job statements, under every driver's parameter limit
+BULK_CHUNK = 500
+
+# session id -> {"success": True, "job_id": ...} or {"success": False, "error": ...}
+BulkResults = Dict[int, Dict[str, Any]]
+# yields (statement, params) and is sent each one's result, returns the jobs whose scheduler
+# side must change, and the results of the sessions that need no scheduler change
+BulkSteps = Generator[Tuple[Any, Any], Any, Tuple[List[Job], BulkResults]]
+
+
+class BulkJobs:
+    """
+    Job writes for many sessions of one plugin: a few set-based statements in one transaction,
+    then the scheduler side of them in one batch. They return per session
+    {"success": True, "job_id": ...} or {"success": False, "error": ...}.
+    """
+
+    def __init__(self, plugin_manager: "PluginManager"):
+        self.plugin_manager = plugin_manager
+
+    def add(
+        self,
+        plugin_id: int,
+        configs: Dict[int, str],
+        description: Optional[str] = None,
+        active: bool = True,
+    ) -> BulkResults:
+        with Session(self.plugin_manager.db_engine) as session:
+            jobs, results = execute(
+                session, list(configs), add_steps, plugin_id, configs, description, active
+            )
+            self._publish(session, jobs)
+            session.commit()
+            plugin = session.get(Plugin, plugin_id)
+        return self._apply(jobs, self._added(plugin), results)
+
+    async def add_async(
+        self,
+        plugin_id: int,
+        configs: Dict[int, str],
+        description: Optional[str] = None,
+        active: bool = True,
+    ) -> BulkResults:
+        async with self.plugin_manager.async_session() as session:
+            jobs, results = await execute_async(
+                session, list(configs), add_steps, plugin_id, configs, description, active
+            )
+            self._publish(session, jobs)
+            await session.commit()
+            plugin = await session.get(Plugin, plugin_id)
+        return self._apply(jobs, self._added(plugin), results)
+
+    def update(
+        self, plugin_id: int, configs: Dict[int, str], description: Optional[str] = None
+    ) -> BulkResults:
+        with Session(self.plugin_manager.db_engine) as session:
+            jobs, results = execute(
+                session, list(configs), update_steps, plugin_id, configs, description
+            )
+            self._publish(session, jobs)
+            session.commit()
+        return self._apply(jobs, self.plugin_manager.job_config_updated, results)
+
+    async def update_async(
+        self, plugin_id: int, configs: Dict[int, str], description: Optional[str] = None
+    ) -> BulkResults:
+        async with self.plugin_manager.async_session() as session:
+            jobs, results = await execute_async(
+                session, list(configs), update_steps, plugin_id, configs, description
+            )
+            self._publish(session, jobs)
+            await session.commit()
+        return self._apply(jobs, self.plugin_manager.job_config_updated, results)
+
+    def set_active(self, plugin_id: int, session_ids: List[int], active: bool) -> BulkResults:
+        with Session(self.plugin_manager.db_engine) as session:
+            jobs, results = execute(session, session_ids, activation_steps, plugin_id, active)
+            self._publish(session, jobs)
+            session.commit()
+        return self._apply(jobs, self._activation(active), results)
+
+    async def set_active_async(
+        self, plugin_id: int, session_ids: List[int], active: bool
+    ) -> BulkResults:
+        async with self.plugin_manager.async_session() as session:
+            jobs, results = await execute_async(
+                session, session_ids, activation_steps, plugin_id, active
+            )
+            self._publish(session, jobs)
+            await session.commit()
+        return self._apply(jobs, self._activation(active), results)
+
+    def _publish(self, session, jobs: List[Job]):
+        # keyed, so the other nodes only look at these jobs instead of all of their shards
+        for job in jobs:
+            self.plugin_manager.publish_jobs(session, job)
+
+    def _added(self, plugin: Optional[Plugin]) -> Callable[[Job], Any]:
+        assert plugin is not None
+        plugin_manager = self.plugin_manager
+
+        def apply(job: Job):
+            plugin_manager.lookup_cache.invalidate_jobs(f"{job.plugin_id}/{job.session_id}")
+            plugin_manager.add_job_instance(job, plugin)
+
+        return apply
+
+    def _activation(self, active: bool) -> Callable[[Job], Any]:
+        if active:
+            return self.plugin_manager.job_activated
+        return self.plugin_manager.job_deactivated
+
+    def _apply(
+        self, jobs: List[Job], apply: Callable[[Job], Any], results: BulkResults
+    ) -> BulkResults:
+        """Scheduler side of a committed bulk write, job by job, with the result of each."""
+        with self._scheduler_batch():
+            for job in jobs:
+                session_id = int(job.session_id)  # type: ignore
+                try:
+                    apply(job)
+                    results[session_id] = {"success": True, "job_id": job.id}
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+                    results[session_id] = {"success": False, "job_id": job.id, "error": str(e)}
+        return results
+
+    @contextlib.contextmanager
+    def _scheduler_batch(self):
+        # each job added or resumed wakes a running scheduler up to recompute its next wakeup,
+        # a paused one wakes up once on resume instead. Ticks coming due meanwhile wait for it
+        scheduler = self.plugin_manager.scheduler
+        pause = scheduler.state == STATE_RUNNING
+        if pause:
+            scheduler.pause()
+        try:
+            yield
+        finally:
+            if pause:
+                scheduler.resume()
+
+
+def chunks(items: List[Any], size: int = BULK_CHUNK) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def execute(
+    session, session_ids: List[int], steps: Callable[..., BulkSteps], *args
+) -> Tuple[List[Job], BulkResults]:
+    """
+    Run `steps(session_ids, *args)` on a `Session` in a savepoint. If the database refuses it,
+    run them again a session at a time, and give each session that still fails its error.
+    """
+    try:
+        with session.begin_nested():
+            return _drive(session, steps(session_ids, *args))
+    except DBAPIError as e:
+        if len(session_ids) == 1:
+            return [], {session_ids[0]: _failed(e)}
+
+    jobs: List[Job] = []
+    results: BulkResults = {}
+    for session_id in session_ids:
+        try:
+            with session.begin_nested():
+                done = _drive(session, steps([session_id], *args))
+        except DBAPIError as e:
+            results[session_id] = _failed(e)
+        else:
+            jobs += done[0]
+            results.update(done[1])
+    return jobs, results
+
+
+async def execute_async(
+    session, session_ids: List[int], steps: Callable[..., BulkSteps], *args
+) -> Tuple[List[Job], BulkResults]:
+    """`execute` on an `AsyncSession`."""
+    try:
+        async with session.begin_nested():
+            return await _drive_async(session, steps(session_ids, *args))
+    except DBAPIError as e:
+        if len(session_ids) == 1:
+            return [], {session_ids[0]: _failed(e)}
+
+    jobs: List[Job] = []
+    results: BulkResults = {}
+    for session_id in session_ids:
+        try:
+            async with session.begin_nested():
+                done = await _drive_async(session, steps([session_id], *args))
+        except DBAPIError as e:
+            results[session_id] = _failed(e)
+        else:
+            jobs += done[0]
+            results.update(done[1])
+    return jobs, results
+
+
+def _drive(session, steps: BulkSteps) -> Tuple[List[Job], BulkResults]:
+    try:
+        statement = next(steps)
+        while True:
+            statement = steps.send(session.execute(*statement))
+    except StopIteration as done:
+        return done.value
+
+
+async def _drive_async(session, steps: BulkSteps) -> Tuple[List[Job], BulkResults]:
+    try:
+        statement = next(steps)
+        while True:
+            statement = steps.send(await session.execute(*statement))
+    except StopIteration as done:
+        return done.value
+
+
+def _failed(error: DBAPIError) -> Dict[str, Any]:
+    logger.warning("Bulk job write failed: %s", error.orig)
+    return {"success": False, "error": f"Database error: {error.orig}"}
+
+
+def add_steps(
+    session_ids: List[int],
+    plugin_id: int,
+    configs: Dict[int, str],
+    description: Optional[str],
+    active: bool,
+) -> BulkSteps:
+    """A new job per session id with its config JSON, the active one if `active`."""
+    if active:
+        for chunk in chunks(session_ids):
+            yield deactivate_sessions(plugin_id, chunk), None
+    result = yield insert(Job).returning(Job.id, Job.session_id), [
+        dict(
+            session_id=session_id,
+            plugin_id=plugin_id,
+            config=configs[session_id],
+            active=int(active),
+            description=description,
+        )
+        for session_id in session_ids
+    ]
+    # detached copies of the inserted (id, session_id) rows, no reload needed
+    jobs = [
+        Job(
+            id=job_id,
+            session_id=session_id,
+            plugin_id=plugin_id,
+            config=configs[session_id],
+            active=int(active),
+            description=description,
+        )
+        for job_id, session_id in result.all()
+    ]
+    return jobs, {}
+
+
+def update_steps(
+    session_ids: List[int], plugin_id: int, configs: Dict[int, str], description: Optional[str]
+) -> BulkSteps:
+    """Set the config of the active job of each session id."""
+    rows: List[Any] = []
+    for chunk in chunks(session_ids):
+        rows += (yield jobs_of(plugin_id, chunk, active_only=True), None).all()
+    jobs, results = plan_update(plugin_id, session_ids, rows, configs, description)
+    if jobs:
+        extra = {"description": description} if description else {}
+        # by primary key, an executemany of one UPDATE
+        yield update(Job), [{"id": job.id, "config": job.config, **extra} for job in jobs]
+    return jobs, results
+
+
+def activation_steps(session_ids: List[int], plugin_id: int, active: bool) -> BulkSteps:
+    """
+    Activate a config of each session id (the newest, unless one is active already), or
+    deactivate the active one.
+    """
+    rows: List[Any] = []
+    for chunk in chunks(session_ids):
+        rows += (yield jobs_of(plugin_id, chunk, active_only=not active), None).all()
+    jobs, results = plan_activation(plugin_id, session_ids, rows, active)
+    for chunk in chunks([job.id for job in jobs]):
+        yield update(Job).where(Job.id.in_(chunk)).values(active=int(active)), None
+    return jobs, results
+
+
+def jobs_of(plugin_id: int, session_ids: List[int], active_only: bool = False):
+    query = (
+        select(Job.id, Job.session_id, Job.active, Job.config)
+        .where(Job.plugin_id == plugin_id, Job.session_id.in_(session_ids))
+        .order_by(Job.id)
+    )
+    if active_only:
+        query = query.where(Job.active == 1)
+    return query
+
+
+def deactivate_sessions(plugin_id: int, session_ids: List[int]):
+    return (
+        update(Job)
+        .where(Job.active == 1, Job.plugin_id == plugin_id, Job.session_id.in_(session_ids))
+        .values(active=0)
+    )
+
+
+def plan_activation(
+    plugin_id: int, session_ids: List[int], rows: Iterable[Tuple], active: bool
+) -> Tuple[List[Job], BulkResults]:
+    """
+    Jobs to (de)activate, from the `jobs_of` rows of the sessions, and the results of the
+    sessions left as they are. Activation picks the newest config of a session without an
+    active one.
+    """
+    chosen: Dict[int, Tuple] = {}
+    for row in rows:
+        # oldest first, so the newest config wins, unless one is active
+        current = chosen.get(row[1])
+        if current is None or not current[2]:
+            chosen[row[1]] = tuple(row)
+
+    changes, results = [], {}
+    for session_id in session_ids:
+        row = chosen.get(session_id)
+        if row is None:
+            results[session_id] = (
+                {"success": False, "error": "No job for this session"}
+                if active
+                else {"success": True, "job_id": None}
+            )
+        elif active and row[2]:
+            results[session_id] = {"success": True, "job_id": row[0]}
+        else:
+            changes.append(
+                Job(
+                    id=row[0],
+                    session_id=session_id,
+                    plugin_id=plugin_id,
+                    config=row[3],
+                    active=int(active),
+                )
+            )
+    return changes, results
+
+
+def plan_update(
+    plugin_id: int,
+    session_ids: List[int],
+    rows: Iterable[Tuple],
+    configs: Dict[int, str],
+    description: Optional[str],
+) -> Tuple[List[Job], BulkResults]:
+    """Active jobs with their new config, from `jobs_of` rows, and sessions without one."""
+    found = {row[1]: row[0] for row in rows}
+    jobs = [
+        Job(
+            id=found[session_id],
+            session_id=session_id,
+            plugin_id=plugin_id,
+            config=configs[session_id],
+            active=1,
+            description=description,
+        )
+        for session_id in session_ids
+        if session_id in found
+    ]
+    results = {
+        session_id: {"success": False, "error": "No active job for this session"}
+        for session_id in session_ids
+        if session_id not in found
+    }
+    return jobs, results
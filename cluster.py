@@ -0,0 +1,297 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Engine, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import ClusterNode, ShardLease, job_shard_key
+
+logger = logging.getLogger(__name__)
+
+ShardCallback = Callable[[Set[int]], Any]
+
+
+class Cluster:
+    """
+    Splits the scheduler jobs of `PluginManager` between the nodes sharing a database.
+
+    A job belongs to shard `crc32("{plugin_id}/{session_id}") % shards`, kept in the jobs'
+    `shard_key` column, and a node schedules the jobs of the shards it holds a lease on in
+    `shard_leases`. Every `heartbeat_interval` seconds a
+    node renews its row in `cluster_nodes` and its leases, both for `lease_seconds`. The live
+    nodes agree on which node each shard should go to by rendezvous hashing, so a node joining
+    or leaving moves about 1/n of the shards. A node hands a shard over by releasing its lease
+    once it stopped scheduling the shard's jobs, and the next owner claims it with a
+    conditional UPDATE, which only one node can win. Leases of a node that died expire.
+
+    Loading and dropping the jobs of shards happens in a thread of its own, so the heartbeats
+    go on meanwhile; a shard stays leased until its jobs are dropped. A node that could not
+    renew its leases drops their jobs before the leases expire, so leases must outlast a few
+    heartbeats and the clock skew between nodes.
+    """
+
+    def __init__(
+        self,
+        db_engine: Engine,
+        node_id: Optional[str] = None,
+        shards: int = 256,
+        heartbeat_interval: float = 5.0,
+        lease_seconds: float = 20.0,
+    ):
+        if lease_seconds <= 2 * heartbeat_interval:
+            raise ValueError("lease_seconds must outlast two heartbeats")
+        self.db_engine = db_engine
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.shards = shards
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_seconds = lease_seconds
+
+        # shards leased to this node, replaced whole so readers need no lock
+        self.owned: frozenset = frozenset()
+        # of those, shards whose jobs are being dropped, and dropped ones to release
+        self._releasing: Set[int] = set()
+        self._released: Set[int] = set()
+        # ("acquired" | "released" | "lost", shards) for the callbacks, in order
+        self._changes: "queue.Queue[Optional[Tuple[str, Set[int]]]]" = queue.Queue()
+        # live nodes as of the last heartbeat
+        self.nodes: List[str] = []
+        self.heartbeats = 0
+        self.rebalances = 0
+        self._on_acquired: Optional[ShardCallback] = None
+        self._on_released: Optional[ShardCallback] = None
+        # monotonic time the leases last renewed run out, less a heartbeat of margin
+        self._valid_until = 0.0
+        # one heartbeat at a time, from the thread or a direct call
+        self._lock = threading.Lock()
+        self._released_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._applier: Optional[threading.Thread] = None
+
+    def shard_of(self, plugin_id: int, session_id: int) -> int:
+        return job_shard_key(plugin_id, session_id) % self.shards
+
+    def shard_of_job(self, scheduler_job_id: str) -> int:
+        plugin_id, _, session_id = scheduler_job_id.partition("/")
+        return self.shard_of(int(plugin_id), int(session_id))
+
+    def in_shards(self, shard_key: Any, shards: Iterable[int]):
+        """SQL condition on the `shard_key` column for jobs of `shards`."""
+        return (shard_key % self.shards).in_(sorted(shards))
+
+    def owner(self, shard: int, nodes: Iterable[str]) -> str:
+        """The node among `nodes` that `shard` should go to."""
+        return max(nodes, key=lambda node: zlib.crc32(f"{node}/{shard}".encode()))
+
+    def listen(self, acquired: ShardCallback, released: ShardCallback):
+        """
+        Call `acquired` with the shards this node starts holding and `released` with those it
+        is about to give up or has lost, in order, from a thread of their own. `released`
+        returns once their jobs stopped being scheduled.
+        """
+        self._on_acquired = acquired
+        self._on_released = released
+
+    # ---- membership and leases ----
+
+    def start(self):
+        """
+        Join and take this node's shards in a first heartbeat, then keep beating in a thread.
+        Returns once the jobs of those shards are loaded.
+        """
+        if self._thread is not None:
+            return
+        self._ensure_shards()
+        self._stopping.clear()
+        self._applier = threading.Thread(target=self._apply, name="cluster-shards", daemon=True)
+        self._applier.start()
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, name="cluster-heartbeat", daemon=True)
+        self._thread.start()
+        # the leases are renewed meanwhile
+        self._changes.join()
+
+    def stop(self):
+        """Stop beating and leave. The jobs must have stopped being scheduled already."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._applier is not None:
+            self._changes.put(None)
+            self._applier.join()
+            self._applier = None
+        self.leave()
+
+    def _ensure_shards(self):
+        with Session(self.db_engine) as session:
+            existing = set(session.scalars(select(ShardLease.shard)))
+            if existing and max(existing) >= self.shards:
+                raise ValueError(
+                    f"shard_leases has {max(existing) + 1} shards, not {self.shards}: "
+                    "every node of a cluster needs the same number"
+                )
+            missing = [shard for shard in range(self.shards) if shard not in existing]
+            if missing:
+                session.add_all(ShardLease(shard=shard) for shard in missing)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # another node added them first
+                    session.rollback()
+
+    def _run(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                if self.owned and time.monotonic() >= self._valid_until:
+                    # the leases may go to other nodes soon, stop running their jobs first
+                    with self._lock:
+                        logger.warning(f"{self.node_id} could not renew its leases, dropping them")
+                        self._changes.put(("lost", set(self.owned - self._releasing)))
+                        self.owned = frozenset()
+                        self._releasing = set()
+
+    def _apply(self):
+        while True:
+            change = self._changes.get()
+            try:
+                if change is None:
+                    return
+                kind, shards = change
+                if self._stopping.is_set():
+                    continue
+                callback = self._on_acquired if kind == "acquired" else self._on_released
+                if callback is not None:
+                    try:
+                        callback(shards)
+                    except Exception as e:
+                        logger.error(e, exc_info=True)
+                if kind == "released":
+                    with self._released_lock:
+                        self._released |= shards
+            finally:
+                self._changes.task_done()
+
+    def heartbeat(self):
+        """
+        Renew this node and its leases, release the shards whose jobs were dropped, and hand
+        over or claim shards to match the live nodes.
+        """
+        with self._lock:
+            started = time.monotonic()
+            now = datetime.now(timezone.utc)
+            expires = now + timedelta(seconds=self.lease_seconds)
+            with Session(self.db_engine) as session:
+                session.merge(
+                    ClusterNode(node_id=self.node_id, heartbeat_at=now, expires_at=expires)
+                )
+                # nodes gone for a whole lease are forgotten
+                session.execute(
+                    delete(ClusterNode).where(
+                        ClusterNode.expires_at < now - timedelta(seconds=self.lease_seconds)
+                    )
+                )
+                session.commit()
+                nodes = sorted(
+                    session.scalars(select(ClusterNode.node_id).where(ClusterNode.expires_at > now))
+                )
+            wanted = {
+                shard for shard in range(self.shards) if self.owner(shard, nodes) == self.node_id
+            }
+
+            with self._released_lock:
+                released, self._released = self._released & self._releasing, set()
+            if released:
+                self._release(released)
+                self._releasing -= released
+                self.owned = self.owned - released
+            # their jobs are dropped first, the leases released on a later heartbeat
+            leaving = set(self.owned - wanted - self._releasing)
+            if leaving:
+                self._releasing |= leaving
+                self._changes.put(("released", leaving))
+
+            with Session(self.db_engine) as session:
+                # renews ours, claims free and expired ones; a shard still leased to another
+                # node is claimed on a later heartbeat, once that node released it
+                session.execute(
+                    update(ShardLease)
+                    .where(
+                        ShardLease.shard.in_(sorted(wanted | self.owned)),
+                        or_(
+                            ShardLease.node_id == self.node_id,
+                            ShardLease.node_id.is_(None),
+                            ShardLease.expires_at < now,
+                        ),
+                    )
+                    .values(node_id=self.node_id, expires_at=expires)
+                )
+                session.commit()
+                held = set(
+                    session.scalars(
+                        select(ShardLease.shard).where(ShardLease.node_id == self.node_id)
+                    )
+                )
+            self._valid_until = started + self.lease_seconds - self.heartbeat_interval
+
+            # taken over by another node while our lease had run out
+            lost = set(self.owned - held)
+            if lost:
+                logger.warning(f"{self.node_id} lost {len(lost)} shard(s) to other nodes")
+                self._changes.put(("lost", lost - self._releasing))
+                self._releasing -= lost
+            acquired = held - self.owned
+            self.owned = frozenset(held)
+            if acquired:
+                self._changes.put(("acquired", acquired))
+            if acquired or released or lost:
+                self.rebalances += 1
+                logger.info(
+                    f"{self.node_id} holds {len(held)} of {self.shards} shards "
+                    f"(+{len(acquired)} -{len(released | lost)}, {len(nodes)} nodes)"
+                )
+            self.nodes = nodes
+            self.heartbeats += 1
+
+    def _release(self, shards: Set[int]):
+        with Session(self.db_engine) as session:
+            session.execute(
+                update(ShardLease)
+                .where(ShardLease.node_id == self.node_id, ShardLease.shard.in_(sorted(shards)))
+                .values(node_id=None, expires_at=None)
+            )
+            session.commit()
+
+    def leave(self):
+        """Release every lease and the node row, so the other nodes take over right away."""
+        with self._lock:
+            if self.owned:
+                self._release(set(self.owned))
+            with Session(self.db_engine) as session:
+                session.execute(delete(ClusterNode).where(ClusterNode.node_id == self.node_id))
+                session.commit()
+            self.owned = frozenset()
+            self._releasing = set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "nodes": list(self.nodes),
+            "shards": self.shards,
+            "owned": sorted(self.owned),
+            "releasing": len(self._releasing),
+            "heartbeats": self.heartbeats,
+            "rebalances": self.rebalances,
+        }
@@ -0,0 +1,126 @@
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cluster import Cluster
+from models import Job
+
+if TYPE_CHECKING:
+    from plugin_manager import PluginManager
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterJobs:
+    """Keeps a manager's scheduler to the jobs of the shards its node holds in `cluster`."""
+
+    def __init__(self, plugin_manager: "PluginManager", cluster: Cluster):
+        self.plugin_manager = plugin_manager
+        self.cluster = cluster
+        # shards whose jobs are scheduled here
+        self.shards: set[int] = set()
+        cluster.listen(self.sync_shards, self._shards_released)
+        plugin_manager.lookup_cache.add_listener(self._remote_invalidation)
+        if plugin_manager.lookup_cache.poll_interval is None:
+            logger.warning(
+                "cluster without lookup cache polling, job changes made on other nodes "
+                "only reach this node on the next rebalance"
+            )
+
+    def owns(self, scheduler_job_id: str) -> bool:
+        return self.cluster.shard_of_job(scheduler_job_id) in self.shards
+
+    def _shards_released(self, shards: set[int]):
+        plugin_manager = self.plugin_manager
+        with plugin_manager.shard_lock:
+            for job in plugin_manager.scheduler.get_jobs():
+                if self.cluster.shard_of_job(job.id) in shards:
+                    plugin_manager.last_job_removed(job.id)
+            self.shards -= shards
+
+    def sync_shards(self, shards: Iterable[int]):
+        """Schedule the jobs of `shards` as their rows are, and drop those without rows."""
+        plugin_manager = self.plugin_manager
+        scheduled: Dict[int, List[str]] = {}
+        for job in plugin_manager.scheduler.get_jobs():
+            scheduled.setdefault(self.cluster.shard_of_job(job.id), []).append(job.id)
+        registered = set()
+        for shard in sorted(shards):
+            # a shard at a time, the job mutations of its jobs wait for it
+            with plugin_manager.shard_lock:
+                with Session(plugin_manager.db_engine) as session:
+                    jobs = session.scalars(
+                        select(Job)
+                        .where(self.cluster.in_shards(Job.shard_key, [shard]))
+                        .order_by(Job.id)
+                    ).all()
+                rows: Dict[str, List[Job]] = {}
+                for job in jobs:
+                    rows.setdefault(f"{job.plugin_id}/{job.session_id}", []).append(job)
+                self.shards.add(shard)
+                for scheduler_job_id in scheduled.get(shard, ()):
+                    if scheduler_job_id not in rows:
+                        self._apply_job_rows(scheduler_job_id, [])
+                for scheduler_job_id, job_rows in rows.items():
+                    plugin_id = int(job_rows[0].plugin_id)  # type: ignore
+                    plugin = plugin_manager.get_plugin_by_id(plugin_id)
+                    if plugin is not None and plugin.id not in registered:
+                        plugin_manager.register_plugin(str(plugin.package))
+                        registered.add(plugin.id)
+                    self._apply_job_rows(scheduler_job_id, job_rows)
+
+    def sync_job(self, scheduler_job_id: str):
+        """Schedule the job as its rows are, if its shard is this node's."""
+        plugin_manager = self.plugin_manager
+        plugin_id, _, session_id = scheduler_job_id.partition("/")
+        with plugin_manager.shard_lock:
+            if not self.owns(scheduler_job_id):
+                return
+            with Session(plugin_manager.db_engine) as session:
+                jobs = session.scalars(
+                    select(Job)
+                    .where(Job.plugin_id == int(plugin_id), Job.session_id == int(session_id))
+                    .order_by(Job.id)
+                ).all()
+            plugin = plugin_manager.get_plugin_by_id(int(plugin_id))
+            if jobs and plugin is not None:
+                plugin_manager.register_plugin(str(plugin.package))
+            self._apply_job_rows(scheduler_job_id, list(jobs))
+
+    def _apply_job_rows(self, scheduler_job_id: str, jobs: List[Job]):
+        # with the shard lock held; only what differs from the rows is changed
+        plugin_manager = self.plugin_manager
+        scheduled = plugin_manager.scheduler.get_job(scheduler_job_id)
+        plugin_id = int(jobs[0].plugin_id) if jobs else None  # type: ignore
+        plugin = plugin_manager.get_plugin_by_id(plugin_id) if plugin_id is not None else None
+        if plugin is None:
+            if scheduled is not None:
+                plugin_manager.last_job_removed(scheduler_job_id)
+            return
+        active = next((job for job in jobs if job.active), None)
+        if scheduled is None:
+            # activated too if `active`
+            plugin_manager.add_job_instance(active or jobs[0], plugin)
+            return
+        entry = plugin_manager.runner.active_configs.get(scheduler_job_id)
+        if active is None:
+            if entry is not None or scheduled.next_run_time is not None:
+                plugin_manager.job_deactivated(jobs[0])
+        elif (
+            entry is None
+            or entry.job_id != active.id
+            or entry.config != active.config
+            or scheduled.next_run_time is None
+        ):
+            plugin_manager.job_activated(active)
+
+    def _remote_invalidation(self, kind: str, key: Optional[str]):
+        # job rows written by any node, this one's own writes are already applied
+        if kind != "jobs":
+            return
+        if key:
+            self.sync_job(key)
+        else:
+            self.sync_shards(set(self.shards))
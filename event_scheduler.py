@@ -0,0 +1,558 @@
+import heapq
+import itertools
+import random
+import time
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from math import floor
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from apscheduler.events import (
+    EVENT_ALL_JOBS_REMOVED,
+    EVENT_JOB_ADDED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MODIFIED,
+    EVENT_JOB_REMOVED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+    JobSubmissionEvent,
+    SchedulerEvent,
+)
+from apscheduler.executors.base import MaxInstancesReachedError
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_PAUSED
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import ref_to_obj, undefined
+
+# the one "jobstore" of the jobs, as events and executors report it
+JOBSTORE = "default"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# jobs of a function, executor and interval are split into this many groups by their offset,
+# which keeps each group's arrays short for inserts and removals
+SEGMENTS = 64
+
+
+class EventJob:
+    """
+    Snapshot of an `EventScheduler` job with the attributes of APScheduler's `Job` that
+    executors and `PluginManager` read. Changes go through the scheduler, not this object.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "func",
+        "args",
+        "kwargs",
+        "executor",
+        "trigger",
+        "offset",
+        "next_run_time",
+        "max_instances",
+        "misfire_grace_time",
+        "coalesce",
+        "_jobstore_alias",
+    )
+
+    pending = False
+
+    def __init__(
+        self, group: "_Group", job_id: str, offset: float, args: tuple, kwargs, next_run_time
+    ):
+        self.id = self.name = job_id
+        self.func = group.func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.executor = group.executor
+        self.trigger = group.trigger
+        # seconds into each interval the job ticks at
+        self.offset = offset
+        self.next_run_time = next_run_time
+        self.max_instances = group.max_instances
+        self.misfire_grace_time = group.misfire_grace_time
+        self.coalesce = True
+        self._jobstore_alias = JOBSTORE
+
+    def __str__(self):
+        return f"{self.name} (every {self.trigger.interval_length}s at +{self.offset:.3f}s)"
+
+
+class _Group:
+    """
+    Jobs sharing function, executor, interval, jitter, run options and segment of the
+    interval. The scheduled ones sit on a ring ordered by offset within the interval: `offsets`
+    and `ids` side by side, with `cursor` at the next one due, at `base + offsets[cursor]`.
+    Paused jobs are only members.
+    """
+
+    __slots__ = (
+        "key",
+        "func",
+        "executor",
+        "interval",
+        "jitter",
+        "max_instances",
+        "misfire_grace_time",
+        "trigger",
+        "members",
+        "paused",
+        "offsets",
+        "ids",
+        "cursor",
+        "base",
+        "seq",
+    )
+
+    def __init__(
+        self,
+        key: Tuple,
+        func,
+        executor: str,
+        interval: float,
+        jitter: Optional[float],
+        max_instances: int,
+        misfire_grace_time: Optional[int],
+        tz,
+    ):
+        self.key = key
+        self.func = func
+        self.executor = executor
+        self.interval = interval
+        self.jitter = jitter
+        self.max_instances = max_instances
+        self.misfire_grace_time = misfire_grace_time
+        # what `EventJob.trigger` shows: the interval, phases are per job
+        self.trigger = IntervalTrigger(
+            seconds=interval, start_date=_EPOCH, timezone=tz, jitter=jitter
+        )
+        # job id -> (offset, args, kwargs)
+        self.members: Dict[str, Tuple[float, tuple, Optional[dict]]] = {}
+        self.paused: Set[str] = set()
+        self.offsets = array("d")
+        self.ids: List[str] = []
+        self.cursor = 0
+        self.base = 0.0
+        # sequence number of the group's live heap entry, -1 when it has none
+        self.seq = -1
+
+    def next_due(self) -> float:
+        return self.base + self.offsets[self.cursor]
+
+    def _advance(self):
+        self.cursor += 1
+        if self.cursor >= len(self.ids):
+            self.cursor = 0
+            self.base += self.interval
+
+    def seat(self, after: float):
+        """Point the cursor at the first tick after `after`."""
+        base = floor(after / self.interval) * self.interval
+        cursor = bisect_right(self.offsets, after - base)
+        if cursor >= len(self.ids):
+            cursor, base = 0, base + self.interval
+        self.cursor, self.base = cursor, base
+
+    def _index(self, job_id: str, offset: float) -> int:
+        lo = bisect_left(self.offsets, offset)
+        return self.ids.index(job_id, lo, bisect_right(self.offsets, offset))
+
+    def schedule(self, job_id: str, offset: float, now: float):
+        if not self.ids:
+            self.offsets.append(offset)
+            self.ids.append(job_id)
+            self.seat(now)
+            return
+        i = bisect_right(self.offsets, offset)
+        self.offsets.insert(i, offset)
+        self.ids.insert(i, job_id)
+        # behind the cursor, or level with ticks just run: its turn comes next interval
+        if i < self.cursor or (i == self.cursor and i and self.offsets[i - 1] == offset):
+            self.cursor += 1
+
+    def unschedule(self, job_id: str, offset: float):
+        i = self._index(job_id, offset)
+        del self.offsets[i]
+        del self.ids[i]
+        if i < self.cursor:
+            self.cursor -= 1
+        if self.cursor >= len(self.ids):
+            self.cursor = 0
+            if self.ids:
+                self.base += self.interval
+
+    def next_run(self, job_id: str, offset: float) -> Optional[float]:
+        if job_id in self.paused:
+            return None
+        behind = self._index(job_id, offset) < self.cursor
+        return self.base + offset + (self.interval if behind else 0)
+
+    def due(self, now: float) -> List[Tuple[str, float]]:
+        """(job id, tick) of every job due by `now`, moving the cursor past them."""
+        if self.next_due() <= now - self.interval:
+            # more than an interval behind: each job runs once, for its latest tick
+            self.seat(now - self.interval)
+        due = []
+        while self.ids and self.next_due() <= now:
+            due.append((self.ids[self.cursor], self.next_due()))
+            self._advance()
+        return due
+
+
+class EventScheduler(AsyncIOScheduler):
+    """
+    AsyncIOScheduler for interval jobs at the scale of 100k+ jobs. Instead of one `Job` with
+    its own trigger per job in a jobstore, jobs are grouped by function, executor, interval,
+    jitter, run options and which of `SEGMENTS` slices of the interval their offset falls in,
+    and every group keeps its scheduled jobs as parallel arrays ordered by that offset. A
+    min-heap holds one entry per group, its next due time, so a wakeup pops the due groups and
+    walks their cursors, O(1) per run, and pausing or resuming a job is a bisect in its group.
+
+    A job ticks at `start_date + k * interval` of the interval trigger it is added with, so
+    its phase is all there is to its schedule: nothing is written per run or per state
+    change, and the jobs are recreated from the `plugins` and `jobs` rows on start.
+
+    Differences from APScheduler's jobs: only interval triggers, which never end. A trigger's
+    `jitter` delays each run by a fresh random amount, as `PhasedIntervalTrigger` does, capped
+    below the interval, and the ticks stay on the job's phase. Runs always coalesce: a job
+    more than an interval late runs once, and `misfire_grace_time` is checked against that
+    tick by the executor, as for APScheduler's jobs. A `next_run_time` given to `add_job` or
+    `modify_job` only tells paused (None) from scheduled. Executors, listeners and
+    `pause`/`resume` are APScheduler's.
+    """
+
+    def __init__(self, gconfig={}, **options):
+        self._groups: Dict[Hashable, _Group] = {}
+        # job id -> its group
+        self._job_groups: Dict[str, _Group] = {}
+        self._heap: List[Tuple[float, int, _Group]] = []
+        # (run time, sequence, job id, group) of jittered runs ticked but not yet submitted
+        self._jittered: List[Tuple[float, int, str, _Group]] = []
+        self._sequence = itertools.count()
+        # when the timer fires next, None when no timer is set
+        self._wakeup_at: Optional[float] = None
+        super().__init__(gconfig, **options)
+        self._jobs_lock = self._create_lock()
+
+    # ---- job API, the subset of BaseScheduler's that PluginManager uses ----
+
+    def add_job(
+        self,
+        func,
+        trigger=None,
+        args=None,
+        kwargs=None,
+        id=None,
+        name=None,
+        misfire_grace_time=undefined,
+        coalesce=undefined,
+        max_instances=undefined,
+        next_run_time=undefined,
+        jobstore=JOBSTORE,
+        executor="default",
+        replace_existing=False,
+        **trigger_args,
+    ) -> EventJob:
+        if isinstance(func, str):
+            func = ref_to_obj(func)
+        interval, offset, jitter = self._interval_and_offset(trigger, trigger_args)
+        job_id = id or uuid.uuid4().hex
+        options = self._job_defaults
+        with self._jobs_lock:
+            if job_id in self._job_groups:
+                if not replace_existing:
+                    raise ConflictingIdError(job_id)
+                self._discard(job_id)
+            job = self._insert(
+                job_id,
+                func,
+                executor,
+                interval,
+                jitter,
+                offset,
+                tuple(args or ()),
+                kwargs or None,
+                options["max_instances"] if max_instances is undefined else max_instances,
+                (
+                    options["misfire_grace_time"]
+                    if misfire_grace_time is undefined
+                    else misfire_grace_time
+                ),
+                next_run_time is not None,
+            )
+        self._dispatch_event(JobEvent(EVENT_JOB_ADDED, job_id, JOBSTORE))
+        self._wake_for(self._job_groups.get(job_id))
+        return job
+
+    def modify_job(self, job_id, jobstore=None, **changes) -> EventJob:
+        with self._jobs_lock:
+            group = self._group(job_id)
+            offset, args, kwargs = group.members[job_id]
+            interval, jitter = group.interval, group.jitter
+            if "trigger" in changes:
+                interval, offset, jitter = self._interval_and_offset(changes.pop("trigger"), {})
+            scheduled = job_id not in group.paused
+            if "next_run_time" in changes:
+                scheduled = changes.pop("next_run_time") is not None
+            func = changes.pop("func", group.func)
+            self._discard(job_id)
+            job = self._insert(
+                job_id,
+                ref_to_obj(func) if isinstance(func, str) else func,
+                changes.pop("executor", group.executor),
+                interval,
+                jitter,
+                offset,
+                tuple(changes.pop("args", args)),
+                changes.pop("kwargs", kwargs) or None,
+                changes.pop("max_instances", group.max_instances),
+                changes.pop("misfire_grace_time", group.misfire_grace_time),
+                scheduled,
+            )
+            changes.pop("name", None)
+            changes.pop("coalesce", None)
+            if changes:
+                raise AttributeError(f"Cannot modify these job attributes: {', '.join(changes)}")
+        self._dispatch_event(JobEvent(EVENT_JOB_MODIFIED, job_id, JOBSTORE))
+        self._wake_for(self._job_groups.get(job_id))
+        return job
+
+    def pause_job(self, job_id, jobstore=None) -> EventJob:
+        with self._jobs_lock:
+            group = self._group(job_id)
+            offset = group.members[job_id][0]
+            if job_id not in group.paused:
+                group.unschedule(job_id, offset)
+                group.paused.add(job_id)
+                self._push(group)
+            job = self._snapshot(group, job_id)
+        self._dispatch_event(JobEvent(EVENT_JOB_MODIFIED, job_id, JOBSTORE))
+        return job
+
+    def resume_job(self, job_id, jobstore=None) -> EventJob:
+        with self._jobs_lock:
+            group = self._group(job_id)
+            if job_id in group.paused:
+                group.paused.discard(job_id)
+                group.schedule(job_id, group.members[job_id][0], time.time())
+                self._push(group)
+            job = self._snapshot(group, job_id)
+        self._dispatch_event(JobEvent(EVENT_JOB_MODIFIED, job_id, JOBSTORE))
+        self._wake_for(group)
+        return job
+
+    def remove_job(self, job_id, jobstore=None):
+        with self._jobs_lock:
+            self._group(job_id)
+            self._discard(job_id)
+        self._dispatch_event(JobEvent(EVENT_JOB_REMOVED, job_id, JOBSTORE))
+
+    def remove_all_jobs(self, jobstore=None):
+        with self._jobs_lock:
+            self._groups.clear()
+            self._job_groups.clear()
+            self._heap.clear()
+            self._jittered.clear()
+        self._dispatch_event(SchedulerEvent(EVENT_ALL_JOBS_REMOVED, JOBSTORE))
+
+    def get_job(self, job_id, jobstore=None) -> Optional[EventJob]:
+        with self._jobs_lock:
+            group = self._job_groups.get(job_id)
+            return self._snapshot(group, job_id) if group is not None else None
+
+    def get_jobs(self, jobstore=None, pending=None) -> List[EventJob]:
+        with self._jobs_lock:
+            return [
+                self._snapshot(group, job_id)
+                for group in self._groups.values()
+                for job_id in group.members
+            ]
+
+    def job_count(self) -> Tuple[int, int]:
+        """Jobs scheduled and paused."""
+        with self._jobs_lock:
+            paused = sum(len(group.paused) for group in self._groups.values())
+            return len(self._job_groups) - paused, paused
+
+    # ---- internals ----
+
+    def _interval_and_offset(self, trigger, trigger_args) -> Tuple[float, float, Optional[float]]:
+        if not isinstance(trigger, IntervalTrigger):
+            trigger = self._create_trigger(trigger, trigger_args)
+        if not isinstance(trigger, IntervalTrigger):
+            raise TypeError(f"EventScheduler only runs interval triggers, not {trigger!r}")
+        interval = trigger.interval_length
+        # in whole microseconds, so phases on interval boundaries come out as exactly 0
+        since_epoch = (trigger.start_date - _EPOCH) // _MICROSECOND
+        offset = since_epoch % round(interval * 1_000_000) / 1_000_000
+        # a run may not be pushed past the job's next tick
+        jitter = min(trigger.jitter, interval * 0.99) if trigger.jitter else None
+        return interval, offset, jitter
+
+    def _group(self, job_id: str) -> _Group:
+        group = self._job_groups.get(job_id)
+        if group is None:
+            raise JobLookupError(job_id)
+        return group
+
+    def _insert(
+        self,
+        job_id,
+        func,
+        executor,
+        interval,
+        jitter,
+        offset,
+        args,
+        kwargs,
+        max_instances,
+        misfire_grace_time,
+        scheduled,
+    ) -> EventJob:
+        # with the jobs lock held
+        segment = min(int(offset / interval * SEGMENTS), SEGMENTS - 1)
+        key = (func, executor, interval, jitter, max_instances, misfire_grace_time, segment)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(
+                key,
+                func,
+                executor,
+                interval,
+                jitter,
+                max_instances,
+                misfire_grace_time,
+                self.timezone,
+            )
+        group.members[job_id] = (offset, args, kwargs)
+        self._job_groups[job_id] = group
+        if scheduled:
+            group.schedule(job_id, offset, time.time())
+            self._push(group)
+        else:
+            group.paused.add(job_id)
+        return self._snapshot(group, job_id)
+
+    def _discard(self, job_id: str):
+        # with the jobs lock held
+        group = self._job_groups.pop(job_id)
+        offset, _, _ = group.members.pop(job_id)
+        if job_id in group.paused:
+            group.paused.discard(job_id)
+        else:
+            group.unschedule(job_id, offset)
+            self._push(group)
+        if not group.members:
+            del self._groups[group.key]
+            group.seq = -1
+
+    def _snapshot(self, group: _Group, job_id: str) -> EventJob:
+        offset, args, kwargs = group.members[job_id]
+        due = group.next_run(job_id, offset)
+        next_run_time = datetime.fromtimestamp(due, self.timezone) if due is not None else None
+        return EventJob(group, job_id, offset, args, kwargs, next_run_time)
+
+    def _push(self, group: _Group):
+        """Replace the group's heap entry, the old one is skipped when popped."""
+        if not group.ids:
+            group.seq = -1
+            return
+        group.seq = next(self._sequence)
+        heapq.heappush(self._heap, (group.next_due(), group.seq, group))
+        if len(self._heap) > 4 * len(self._groups) + 64:
+            # mostly stale entries, from mutations
+            self._heap = [
+                (group.next_due(), group.seq, group)
+                for group in self._groups.values()
+                if group.seq >= 0
+            ]
+            heapq.heapify(self._heap)
+
+    def _next_wakeup(self) -> Optional[float]:
+        # with the jobs lock held
+        heap, jittered = self._heap, self._jittered
+        # skip stale entries, so the next wakeup is a real one
+        while heap and heap[0][1] != heap[0][2].seq:
+            heapq.heappop(heap)
+        times = [entries[0][0] for entries in (heap, jittered) if entries]
+        return min(times) if times else None
+
+    def _wake_for(self, group: Optional[_Group]):
+        # a job now due before the timer fires needs an earlier wakeup
+        if group is None or not group.ids or not self.running or self.state == STATE_PAUSED:
+            return
+        if self._wakeup_at is None or group.next_due() < self._wakeup_at:
+            self._wakeup_at = group.next_due()
+            self.wakeup()
+
+    def _process_jobs(self):
+        if self.state == STATE_PAUSED:
+            self._logger.debug("Scheduler is paused -- not processing jobs")
+            self._wakeup_at = None
+            return None
+
+        now = time.time()
+        due: List[Tuple[_Group, str, float]] = []
+        with self._jobs_lock:
+            heap, jittered = self._heap, self._jittered
+            while heap and heap[0][0] <= now:
+                _, seq, group = heapq.heappop(heap)
+                if seq != group.seq:
+                    continue
+                for job_id, tick in group.due(now):
+                    if group.jitter:
+                        run_time = tick + random.uniform(0, group.jitter)
+                        heapq.heappush(jittered, (run_time, next(self._sequence), job_id, group))
+                    else:
+                        due.append((group, job_id, tick))
+                self._push(group)
+            while jittered and jittered[0][0] <= now:
+                run_time, _, job_id, group = heapq.heappop(jittered)
+                # unless removed, moved to another group or paused since its tick
+                if self._job_groups.get(job_id) is group and job_id not in group.paused:
+                    due.append((group, job_id, run_time))
+            next_due = self._next_wakeup()
+            jobs = [
+                (EventJob(group, job_id, *group.members[job_id], None), group.executor, tick)
+                for group, job_id, tick in due
+            ]
+
+        for job, executor_alias, tick in jobs:
+            self._submit(job, executor_alias, tick)
+
+        self._wakeup_at = next_due
+        if next_due is None:
+            return None
+        return max(0.0, next_due - time.time())
+
+    def _submit(self, job: EventJob, executor_alias: str, tick: float):
+        run_times = [datetime.fromtimestamp(tick, self.timezone)]
+        try:
+            executor = self._lookup_executor(executor_alias)
+        except KeyError:
+            self._logger.error(
+                'Executor lookup ("%s") failed for job "%s" -- removing it', executor_alias, job
+            )
+            self.remove_job(job.id)
+            return
+        try:
+            executor.submit_job(job, run_times)
+        except MaxInstancesReachedError:
+            self._logger.warning(
+                'Execution of job "%s" skipped: maximum number of running instances reached (%d)',
+                job,
+                job.max_instances,
+            )
+            event = JobSubmissionEvent(EVENT_JOB_MAX_INSTANCES, job.id, JOBSTORE, run_times)
+        except BaseException:
+            self._logger.exception(
+                'Error submitting job "%s" to executor "%s"', job, executor_alias
+            )
+            return
+        else:
+            event = JobSubmissionEvent(EVENT_JOB_SUBMITTED, job.id, JOBSTORE, run_times)
+        self._dispatch_event(event)
@@ -0,0 +1,632 @@
+import asyncio
+import logging
+import multiprocessing
+import sys
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from apscheduler.events import JobSubmissionEvent
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import (
+    BaseExecutor,
+    MaxInstancesReachedError,
+    run_coroutine_job,
+    run_job,
+)
+from apscheduler.util import iscoroutinefunction_partial
+
+
+class AsyncLoopExecutor(BaseExecutor):
+    """
+    Runs coroutine jobs directly on long-lived event loops instead of one loop per run.
+
+    With ``worker_loops=0`` coroutines are scheduled on the scheduler's own loop (the server's
+    uvloop). Otherwise a small pool of background threads is started, each owning one loop, and
+    every job is pinned to one of them so that clients a plugin keeps between runs stay on the
+    loop that created them. Plain callables are still offloaded to the loop's default thread pool.
+
+    ``max_runs_per_loop`` caps how many coroutine runs may be in flight on each loop, those of
+    all jobs and plugins pinned to it together. Per job that is ``max_instances`` and per
+    plugin the manager's run limit.
+    """
+
+    def __init__(self, worker_loops: int = 0, max_runs_per_loop: Optional[int] = None):
+        super().__init__()
+        self.worker_loops = worker_loops
+        self.max_runs_per_loop = max_runs_per_loop
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._threads: List[threading.Thread] = []
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._pending_futures: Set = set()
+        # loop -> runs waiting for its semaphore, each loop only counts its own
+        self._queued: Counter = Counter()
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._eventloop = scheduler._eventloop
+
+        for i in range(self.worker_loops):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop,),
+                name=f"{alias}-loop-{i}",
+                daemon=True,
+            )
+            thread.start()
+            self._loops.append(loop)
+            self._threads.append(thread)
+
+    def shutdown(self, wait=True):
+        for f in list(self._pending_futures):
+            if not f.done():
+                f.cancel()
+        self._pending_futures.clear()
+
+        for loop in self._loops:
+            loop.call_soon_threadsafe(loop.stop)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+        self._loops.clear()
+        self._threads.clear()
+        self._semaphores.clear()
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def _loop_for(self, job_id: str) -> asyncio.AbstractEventLoop:
+        if not self._loops:
+            return self._eventloop
+        return self._loops[hash(job_id) % len(self._loops)]
+
+    async def _run_limited(self, job, run_times):
+        if self.max_runs_per_loop is None:
+            return await run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+
+        # created lazily so the semaphore belongs to the loop it is awaited on
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_runs_per_loop)
+
+        self._queued[loop] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued[loop] -= 1
+        try:
+            return await run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+        finally:
+            semaphore.release()
+
+    def queued(self) -> int:
+        """Submitted runs waiting for a slot under `max_runs_per_loop`."""
+        return sum(self._queued.values())
+
+    def _do_submit_job(self, job, run_times):
+        def callback(f):
+            self._pending_futures.discard(f)
+            try:
+                events = f.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        if iscoroutinefunction_partial(job.func):
+            loop = self._loop_for(job.id)
+            coro = self._run_limited(job, run_times)
+            if loop is self._eventloop:
+                f = loop.create_task(coro)
+            else:
+                f = asyncio.run_coroutine_threadsafe(coro, loop)
+        else:
+            f = self._eventloop.run_in_executor(
+                None, run_job, job, job._jobstore_alias, run_times, self._logger.name
+            )
+
+        f.add_done_callback(callback)
+        self._pending_futures.add(f)
+
+
+# dispatched when a run is refused for its plugin's run limit, just before the scheduler
+# reports the same tick as EVENT_JOB_MAX_INSTANCES; outside APScheduler's own event bits
+EVENT_JOB_RUN_LIMITED = 2**20
+
+
+class RunLimitReachedError(MaxInstancesReachedError):
+    """A run refused because its plugin has no free `RunLimiter` slot."""
+
+
+def _refuse_run(executor: BaseExecutor, job, run_times):
+    executor._scheduler._dispatch_event(
+        JobSubmissionEvent(EVENT_JOB_RUN_LIMITED, job.id, job._jobstore_alias, run_times)
+    )
+    raise RunLimitReachedError(job)
+
+
+class RunLimiter:
+    """
+    Caps how many runs of the same key (a plugin package) are in flight at once, across the
+    thread pool and any number of event loops.
+
+    Coroutines await `acquire_async` without blocking their loop, first come, first served: a
+    released slot is handed straight to the oldest waiter. Thread runs never wait, they take a
+    slot with `try_acquire` before they are handed to a pool thread, or are skipped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        # key -> waiters, (loop, future) pairs
+        self._waiters: Dict[str, Deque] = {}
+        # key -> runs that had to wait for a slot
+        self.waited: Counter = Counter()
+        # key -> runs skipped because no slot was free
+        self.skipped: Counter = Counter()
+
+    def _try_acquire(self, key: str, limit: int, waiter) -> bool:
+        with self._lock:
+            if self._running.get(key, 0) < limit and not self._waiters.get(key):
+                self._running[key] = self._running.get(key, 0) + 1
+                return True
+            self._waiters.setdefault(key, deque()).append(waiter)
+            self.waited[key] += 1
+            return False
+
+    def try_acquire(self, key: str, limit: Optional[int]) -> bool:
+        """Take a slot if one is free and nobody is waiting for it, without queueing."""
+        if not limit:
+            return True
+        with self._lock:
+            if self._running.get(key, 0) < limit and not self._waiters.get(key):
+                self._running[key] = self._running.get(key, 0) + 1
+                return True
+            self.skipped[key] += 1
+            return False
+
+    async def acquire_async(self, key: str, limit: Optional[int]):
+        if not limit:
+            return
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        if self._try_acquire(key, limit, waiter):
+            return
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queue = self._waiters.get(key)
+                if queue is not None and waiter in queue:
+                    queue.remove(waiter)
+                    raise
+            # the slot was handed over already, give it back
+            self.release(key, limit)
+            raise
+
+    def release(self, key: str, limit: Optional[int]):
+        if not limit:
+            return
+        with self._lock:
+            queue = self._waiters.get(key)
+            if not queue:
+                self._running[key] -= 1
+                if not self._running[key]:
+                    del self._running[key]
+                return
+            # the slot goes to the next waiter, the running count stays
+            waiter = queue.popleft()
+            if not queue:
+                del self._waiters[key]
+
+        loop, future = waiter
+        try:
+            loop.call_soon_threadsafe(_wake, future)
+        except RuntimeError:
+            # loop is closed, nobody is left to take the slot
+            self.release(key, limit)
+
+    def running(self, key: str) -> int:
+        return self._running.get(key, 0)
+
+    def waiting(self) -> Dict[str, int]:
+        """key -> runs currently waiting for a slot."""
+        with self._lock:
+            return {key: len(queue) for key, queue in self._waiters.items()}
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LimitedThreadExecutor(AsyncIOExecutor):
+    """
+    `AsyncIOExecutor` whose thread runs take a `limiter` slot for their plugin before they go
+    to the loop's thread pool, instead of holding a pool thread while they wait for one. A run
+    with no free slot is refused, and its tick skipped, with an `EVENT_JOB_RUN_LIMITED` event.
+
+    ``limit`` gives the cap of a package, the first argument of the jobs' run function.
+    """
+
+    def __init__(self, limiter: RunLimiter, limit: Callable[[str], Optional[int]]):
+        super().__init__()
+        self.limiter = limiter
+        self.limit = limit
+        # job id -> (package, limit) of each of its runs in flight
+        self._slots: Dict[str, Deque[Tuple[str, Optional[int]]]] = {}
+
+    def _do_submit_job(self, job, run_times):
+        package = str(job.args[0])
+        limit = self.limit(package)
+        if not self.limiter.try_acquire(package, limit):
+            _refuse_run(self, job, run_times)
+        slots = self._slots.setdefault(job.id, deque())
+        slots.append((package, limit))
+        try:
+            super()._do_submit_job(job, run_times)
+        except BaseException:
+            slots.pop()
+            if not slots:
+                del self._slots[job.id]
+            self.limiter.release(package, limit)
+            raise
+
+    def _release(self, job_id: str):
+        with self._lock:
+            slots = self._slots.get(job_id)
+            if not slots:
+                return
+            slot = slots.popleft()
+            if not slots:
+                del self._slots[job_id]
+        self.limiter.release(*slot)
+
+    def _run_job_success(self, job_id, events):
+        self._release(job_id)
+        super()._run_job_success(job_id, events)
+
+    def _run_job_error(self, job_id, exc, traceback=None):
+        self._release(job_id)
+        super()._run_job_error(job_id, exc, traceback)
+
+
+class RunBatcher:
+    """
+    Collects the runs of the same key (a plugin package) that arrive within `window` seconds
+    of the first one and executes them with a single `run(items)` call, which returns one
+    result per item in arrival order. Each caller gets its own result back, or has it raised
+    when it is an exception instance. A batch is flushed early once it holds `max_size` items.
+
+    Callers must all be on the same event loop (the scheduler's).
+    """
+
+    def __init__(self, window: float = 0.2):
+        self.window = window
+        # key -> (items, futures) of the batch being collected
+        self._pending: Dict[str, Tuple[List[Any], List[asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_runs = 0
+
+    async def submit(
+        self,
+        key: str,
+        item: Any,
+        run: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_size: Optional[int] = None,
+    ):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = ([], [])
+            loop.call_later(self.window, self._flush, key, batch, run)
+        batch[0].append(item)
+        batch[1].append(future)
+        if max_size and len(batch[0]) >= max_size:
+            self._flush(key, batch, run)
+        return await future
+
+    def _flush(self, key: str, batch, run):
+        if self._pending.get(key) is not batch:
+            # flushed already for being full
+            return
+        del self._pending[key]
+        self.batches += 1
+        self.batched_runs += len(batch[0])
+        task = asyncio.get_running_loop().create_task(self._execute(*batch, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _execute(items: List[Any], futures: List[asyncio.Future], run):
+        try:
+            results = await run(items)
+            if len(results) != len(items):
+                raise ValueError(f"Batch of {len(items)} runs returned {len(results)} results")
+        except BaseException as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        for future, result in zip(futures, results):
+            if future.done():
+                # caller was cancelled
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+# log queue of the current worker process, set by `_init_worker`
+_worker_log_queue = None
+# package -> plugin version the worker has imported
+_worker_versions: Dict[str, int] = {}
+# run state of the current worker process, a `plugin_runner.PluginRunner`
+_worker_runner: Any = None
+# barrier of the pool's workers, passed once each has started, see `_warm_up`
+_worker_ready = None
+
+
+def _init_worker(packages: List[str], log_queue, log_level: int, ready=None):
+    global _worker_log_queue, _worker_runner, _worker_ready
+    _worker_log_queue = log_queue
+    _worker_ready = ready
+    logging.getLogger().setLevel(log_level)
+
+    # sys.path and cwd are inherited from the parent, so plugins import the same way
+    from plugin_manager import PluginManager
+    from plugin_runner import PluginRunner
+
+    _worker_runner = PluginRunner(
+        PluginManager.manager,
+        swap_lock=PluginManager._swap_lock,
+        version_lookup=lambda package: _worker_versions.get(package, 0),
+    )
+    for package in packages:
+        try:
+            PluginManager.import_plugin(package)
+        except Exception as e:
+            logging.getLogger(__name__).error(e, exc_info=True)
+
+
+def _warm_up():
+    # one warm-up per worker: each waits until all are running one, so all have started
+    if _worker_ready is not None:
+        _worker_ready.wait(60)
+
+
+def run_in_worker(package: str, scheduler_job_id: str, runner: Optional[str] = None):
+    """Run function of the jobs placed in the process pool, called in a worker."""
+    return _worker_runner.run(package, scheduler_job_id)
+
+
+def _sync_plugin(package: str, version: int):
+    from plugin_manager import PluginManager
+
+    if PluginManager.manager.get_plugin(package) is None:
+        # plugin was added after the pool started
+        PluginManager.import_plugin(package)
+    elif _worker_versions.get(package, 0) != version:
+        # plugin was reloaded in the parent
+        PluginManager.reimport_plugin(package)
+    _worker_versions[package] = version
+
+
+def _sync_job(scheduler_job_id: str, config: Optional[str]):
+    from plugin_runner import ActiveConfig
+
+    # keep the worker's validated model while the parent's config is unchanged
+    active_configs = _worker_runner.active_configs
+    entry = active_configs.get(scheduler_job_id)
+    if config is None:
+        active_configs.pop(scheduler_job_id, None)
+    elif entry is None or entry.config != config:
+        active_configs[scheduler_job_id] = ActiveConfig(config)
+
+    logger = logging.getLogger(scheduler_job_id)
+    if _worker_log_queue is not None and not logger.handlers:
+        logger.addHandler(QueueHandler(_worker_log_queue))
+
+
+def _sync_interval(package: str, interval: Optional[float]):
+    # for plugins caching their results, which are shared per interval
+    if interval is not None:
+        _worker_runner.plugin_intervals[package] = interval
+
+
+def _run_in_worker(
+    job,
+    jobstore_alias,
+    run_times,
+    logger_name,
+    config: Optional[str],
+    version: int = 0,
+    interval: Optional[float] = None,
+):
+    _sync_plugin(job.args[0], version)
+    _sync_job(job.args[1], config)
+    _sync_interval(job.args[0], interval)
+    return run_job(job, jobstore_alias, run_times, logger_name)
+
+
+def _run_batch_in_worker(
+    package: str,
+    scheduler_job_ids: List[str],
+    configs: List[Optional[str]],
+    version: int = 0,
+    interval: Optional[float] = None,
+):
+    _sync_plugin(package, version)
+    _sync_interval(package, interval)
+    for scheduler_job_id, config in zip(scheduler_job_ids, configs):
+        _sync_job(scheduler_job_id, config)
+    return _worker_runner.run_batch(package, scheduler_job_ids)
+
+
+class PluginProcessExecutor(BaseExecutor):
+    """
+    Runs plugin jobs in a warm pool of worker processes, so CPU-bound plugins do not hold the
+    GIL of the server process.
+
+    Workers register `packages` with pluggy once at start-up and keep plugins imported between
+    runs. The job's active config (looked up with `config_lookup`) is shipped with every
+    submission, records of the job loggers come back over a queue to `log_handler`, and return
+    values are pickled back inside the job events. Each submission also carries the plugin's
+    reload count (`version_lookup`), a worker with an older copy re-imports it first, and its
+    interval (`interval_lookup`). `submit_batch` runs one `run_batch` call for several jobs of
+    a plugin the same way.
+
+    The workers are spawned, and have imported `packages`, when the executor is created. A
+    package placed later is imported by each worker on its first run there. With a `limiter`,
+    runs take a slot for their plugin (capped by `limit`, as for `LimitedThreadExecutor`)
+    before they are queued for a worker, and are refused the same way when none is free.
+    """
+
+    def __init__(
+        self,
+        config_lookup: Callable[[str], Optional[str]],
+        packages: Iterable[str] = (),
+        version_lookup: Optional[Callable[[str], int]] = None,
+        max_workers: Optional[int] = None,
+        log_handler: Optional[logging.Handler] = None,
+        mp_context: str = "spawn",
+        interval_lookup: Optional[Callable[[str], Optional[float]]] = None,
+        limiter: Optional[RunLimiter] = None,
+        limit: Optional[Callable[[str], Optional[int]]] = None,
+    ):
+        super().__init__()
+        self.config_lookup = config_lookup
+        self.version_lookup = version_lookup
+        self.interval_lookup = interval_lookup
+        self.limiter = limiter
+        self.limit = limit
+        self.packages = packages
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.log_handler = log_handler
+        self._context = multiprocessing.get_context(mp_context)
+        self._log_queue = self._context.Queue()
+        self._listener: Optional[QueueListener] = None
+        # submissions not finished yet, queued or running
+        self._pending: Set[Future] = set()
+        # warm before the jobs are scheduled, so their first ticks do not wait for the workers
+        self._pool: Optional[ProcessPoolExecutor] = self._create_pool()
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+
+        if self.log_handler:
+            self._listener = QueueListener(
+                self._log_queue, self.log_handler, respect_handler_level=True
+            )
+            self._listener.start()
+
+        if self._pool is None:
+            # restarted after a shutdown
+            self._pool = self._create_pool()
+
+    def shutdown(self, wait=True):
+        if self._pool:
+            self._pool.shutdown(wait)
+            self._pool = None
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        ready = self._context.Barrier(self.max_workers)
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(
+                list(self.packages),
+                self._log_queue,
+                logging.getLogger().getEffectiveLevel(),
+                ready,
+            ),
+        )
+        # spawn every worker now and wait for their imports, instead of on the first runs
+        wait([pool.submit(_warm_up) for _ in range(self.max_workers)])
+        return pool
+
+    def _do_submit_job(self, job, run_times):
+        package = str(job.args[0])
+        limit = self.limit(package) if self.limit else None
+        if self.limiter and not self.limiter.try_acquire(package, limit):
+            _refuse_run(self, job, run_times)
+
+        def callback(f):
+            if self.limiter:
+                self.limiter.release(package, limit)
+            exc = f.exception()
+            if exc:
+                self._run_job_error(job.id, exc, exc.__traceback__)
+            else:
+                self._run_job_success(job.id, f.result())
+
+        try:
+            f = self._submit(
+                _run_in_worker,
+                job,
+                job._jobstore_alias,
+                run_times,
+                self._logger.name,
+                self.config_lookup(job.id),
+                self._version(package),
+                self._interval(package),
+            )
+        except BaseException:
+            if self.limiter:
+                self.limiter.release(package, limit)
+            raise
+        f.add_done_callback(callback)
+
+    def submit_batch(self, package: str, scheduler_job_ids: List[str]) -> Future:
+        """`PluginRunner.run_batch` for these jobs in a worker, with their configs."""
+        return self._submit(
+            _run_batch_in_worker,
+            package,
+            list(scheduler_job_ids),
+            [self.config_lookup(scheduler_job_id) for scheduler_job_id in scheduler_job_ids],
+            self._version(package),
+            self._interval(package),
+        )
+
+    def _version(self, package: str) -> int:
+        return self.version_lookup(package) if self.version_lookup else 0
+
+    def _interval(self, package: str) -> Optional[float]:
+        return self.interval_lookup(package) if self.interval_lookup else None
+
+    def queued(self) -> int:
+        """Submissions waiting for a free worker."""
+        return max(0, len(self._pending) - self.max_workers)
+
+    def _submit(self, *args) -> Future:
+        try:
+            future = self._pool.submit(*args)
+        except BrokenProcessPool:
+            self._logger.warning("Process pool is broken; replacing it with a fresh one")
+            self._pool.shutdown(False)
+            self._pool = self._create_pool()
+            future = self._pool.submit(*args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
@@ -83,43 +83,63 @@ export default function LogViewer({
 
   useEffect(() => {
     if (!jobInstanceId) return;
-    const url = `${API_BASE_URL.replace(
-      /^http/,
-      'ws'
-    )}/ws/logs/${jobInstanceId}`;
-    ws.current = new WebSocket(url);
-
-    ws.current.onopen = () => {
-      console.log('WebSocket connected');
-    };
+    // last seq received, so a reconnect resumes without duplicates
+    let lastSeq = null;
+    let closed = false;
+    let retryTimer = null;
+
+    const connect = () => {
+      const since = lastSeq === null ? '' : `?since=${lastSeq}`;
+      const url = `${API_BASE_URL.replace(
+        /^http/,
+        'ws'
+      )}/ws/logs/${jobInstanceId}${since}`;
+      ws.current = new WebSocket(url);
+
+      ws.current.onopen = () => {
+        console.log('WebSocket connected');
+      };
+
+      ws.current.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        const items = (Array.isArray(data) ? data : [data]).filter(
+          (item) => item.seq === undefined || lastSeq === null || item.seq > lastSeq
+        );
+        items.forEach((item) => {
+          if (item.seq !== undefined) lastSeq = item.seq;
+        });
+        // 🔑 Assign stable, monotonic indices
+        const withIdx = items.map((item) => ({
+          ...item,
+          id: logIdRef.current++,
+        }));
+        // Always use latest jobInstanceId
+        setLogs((prevLogs) => {
+          const next = [...prevLogs, ...withIdx];
+          if (next.length > maxMessagesRef.current) {
+            return next.slice(next.length - maxMessagesRef.current);
+          }
+          return next;
+        });
+      };
 
-    ws.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      const items = Array.isArray(data) ? data : [data];
-      // 🔑 Assign stable, monotonic indices
-      const withIdx = items.map((item) => ({
-        ...item,
-        id: logIdRef.current++,
-      }));
-      // Always use latest jobInstanceId
-      setLogs((prevLogs) => {
-        const next = [...prevLogs, ...withIdx];
-        if (next.length > maxMessagesRef.current) {
-          return next.slice(next.length - maxMessagesRef.current);
+      ws.current.onclose = () => {
+        console.log('WebSocket disconnected');
+        if (!closed) {
+          retryTimer = setTimeout(connect, 1000);
         }
-        return next;
-      });
-    };
+      };
 
-    ws.current.onclose = () => {
-      console.log('WebSocket disconnected');
+      ws.current.onerror = (error) => {
+        console.error('WebSocket error:', error);
+      };
     };
 
-    ws.current.onerror = (error) => {
-      console.error('WebSocket error:', error);
-    };
+    connect();
 
     return () => {
+      closed = true;
+      clearTimeout(retryTimer);
       if (ws.current) {
         ws.current.close();
         handleClearLogs();
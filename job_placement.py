@@ -0,0 +1,187 @@
+import random
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from math import ceil, floor
+from typing import TYPE_CHECKING, Any, Dict
+
+from apscheduler.triggers.interval import IntervalTrigger
+
+from executors import (
+    AsyncLoopExecutor,
+    LimitedThreadExecutor,
+    PluginProcessExecutor,
+    run_in_worker,
+)
+from models import Plugin
+from plugin_runner import declared, run_job, run_job_async, run_job_batched
+
+if TYPE_CHECKING:
+    from plugin_manager import PluginManager
+
+# where a plugin's runs execute, see `JobPlacement.placement`
+EXECUTION_MODES = ("thread", "async", "process")
+
+# phase offsets count from here, so a job keeps its phase across restarts and nodes
+PHASE_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+class PhasedIntervalTrigger(IntervalTrigger):
+    """
+    Interval trigger that fires at `start_date + k * interval` plus a fresh random jitter each
+    time. APScheduler's own jitter is added to the previous, already jittered, fire time, so
+    the ticks drift later and later; here they always come back to the job's phase.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.jitter:
+            # a tick may not be pushed past the next one
+            self.jitter = min(self.jitter, self.interval_length * 0.99)
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        start = self.start_date.timestamp()
+        if previous_fire_time:
+            # whatever jitter the previous tick got, the next one is on the following boundary
+            # (datetimes round to microseconds, an on-time tick may read as just before it)
+            elapsed = previous_fire_time.timestamp() - start + 1e-3
+            next_interval_num = floor(elapsed / self.interval_length) + 1
+        elif self.start_date > now:
+            next_interval_num = 0
+        else:
+            next_interval_num = ceil((now.timestamp() - start) / self.interval_length)
+
+        next_fire_time = start + self.interval_length * next_interval_num
+        if self.jitter:
+            next_fire_time += random.uniform(0, self.jitter)
+
+        if not self.end_date or next_fire_time <= self.end_date.timestamp():
+            return datetime.fromtimestamp(next_fire_time, tz=self.timezone)
+
+
+def phase_start(scheduler_job_id: str, interval: float) -> datetime:
+    """Start date that puts the job's ticks at a stable offset within its interval."""
+    period_ms = max(1, int(interval * 1000))
+    offset_ms = zlib.crc32(scheduler_job_id.encode()) % period_ms
+    return PHASE_EPOCH + timedelta(milliseconds=offset_ms)
+
+
+class JobPlacement:
+    """Executors and triggers of a manager's jobs, added to its scheduler on first use."""
+
+    def __init__(self, plugin_manager: "PluginManager", default_executor: bool = True):
+        self.plugin_manager = plugin_manager
+        # executor aliases added to the scheduler so far, besides "default"
+        self.executors: set[str] = set()
+        # packages placed in the process pool, replicated into every worker
+        self.process_packages: list[str] = []
+        self.lock = threading.RLock()
+        if default_executor:
+            # thread runs over their plugin's run limit are skipped before they take a thread
+            runner = plugin_manager.runner
+            plugin_manager.scheduler.add_executor(
+                LimitedThreadExecutor(runner.limiter, runner.run_limit), "default"
+            )
+
+    def placement(self, plugin: Plugin) -> str:
+        """
+        Where runs of `plugin` execute: the `executor` column of the plugin row, else an
+        `executor` attribute declared by the plugin class, else the manager's execution mode.
+        """
+        # a lazy plugin not imported yet is placed again by `replace` once it is
+        placement = plugin.executor or declared(
+            self.plugin_manager.manager.get_plugin(str(plugin.package)), "executor"
+        )
+        if placement is None:
+            return self.plugin_manager.execution_mode
+        if placement not in EXECUTION_MODES:
+            raise ValueError(f"Unknown executor {placement} for plugin {plugin.package}")
+        return placement
+
+    def is_batched(self, plugin: Plugin) -> bool:
+        """Whether the plugin class implements `run_batch`, as far as is known yet."""
+        manager = self.plugin_manager.manager
+        return declared(manager.get_plugin(str(plugin.package)), "run_batch") is not None
+
+    def executor(self, placement: str) -> str:
+        """Alias of the executor backing `placement` (or "batch"), added on first use."""
+        if placement == "thread":
+            return "default"
+
+        plugin_manager = self.plugin_manager
+        if placement not in self.executors:
+            if placement == "process":
+                executor = PluginProcessExecutor(
+                    plugin_manager.runner.active_config_json,
+                    version_lookup=plugin_manager.plugin_version,
+                    packages=self.process_packages,
+                    max_workers=plugin_manager.process_workers,
+                    log_handler=plugin_manager.log_handler,
+                    interval_lookup=plugin_manager.runner.plugin_intervals.get,
+                    limiter=plugin_manager.runner.limiter,
+                    limit=plugin_manager.runner.run_limit,
+                )
+                plugin_manager.runner.process_executor = executor
+            elif placement == "batch":
+                # batched runs only wait on the scheduler's loop, the batch itself is placed
+                executor = AsyncLoopExecutor()
+            else:
+                executor = AsyncLoopExecutor(
+                    plugin_manager.worker_loops, plugin_manager.max_runs_per_loop
+                )
+            plugin_manager.scheduler.add_executor(executor, placement)
+            self.executors.add(placement)
+
+        return placement
+
+    def target(self, plugin: Plugin):
+        """Run function and executor alias for the jobs of `plugin`."""
+        placement = self.placement(plugin)
+        if placement == "process" and plugin.package not in self.process_packages:
+            # before the pool is created with the first one, which its workers import
+            self.process_packages.append(str(plugin.package))
+        executor = self.executor(placement)
+        if self.is_batched(plugin):
+            self.plugin_manager.runner.batch_placements[str(plugin.package)] = placement
+            return run_job_batched, self.executor("batch")
+        if placement == "async":
+            return run_job_async, executor
+        if placement == "process":
+            # called in a worker, on the worker's run state
+            return run_in_worker, executor
+        return run_job, executor
+
+    def trigger(
+        self, scheduler_job_id: str, interval: float, batched: bool = False
+    ) -> IntervalTrigger:
+        """Every `interval` seconds, at the job's phase with `phase_offsets`, plus `jitter`."""
+        if batched:
+            # every job of the plugin on the same tick, to be run together
+            return PhasedIntervalTrigger(seconds=interval, start_date=PHASE_EPOCH)
+        jitter = self.plugin_manager.jitter
+        if not self.plugin_manager.phase_offsets:
+            return IntervalTrigger(seconds=interval, jitter=jitter)
+        return PhasedIntervalTrigger(
+            seconds=interval, start_date=phase_start(scheduler_job_id, interval), jitter=jitter
+        )
+
+    def replace(self, plugin: Plugin):
+        """Move the scheduled jobs of `plugin` to the executor its class declares now."""
+        scheduler = self.plugin_manager.scheduler
+        with self.lock:
+            func, executor = self.target(plugin)
+            for job in scheduler.get_jobs():
+                if not job.args or job.args[0] != plugin.package or job.executor == executor:
+                    continue
+                changes: Dict[str, Any] = {"func": func, "executor": executor}
+                if "batch" in (job.executor, executor):
+                    # batched jobs share one phase, the others get their own again
+                    trigger = self.trigger(
+                        job.id, plugin.interval, batched=executor == "batch"  # type: ignore
+                    )
+                    changes["trigger"] = trigger
+                    if job.next_run_time is not None:
+                        changes["next_run_time"] = trigger.get_next_fire_time(
+                            None, datetime.now(timezone.utc)
+                        )
+                scheduler.modify_job(job.id, **changes)
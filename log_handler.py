@@ -1,44 +1,141 @@
 import asyncio
 import logging
-from typing import Any, Callable
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List
 
 
 class JobLogHandler(logging.Handler):
+    """
+    Collects job log records from worker threads and delivers them to `log_callback` in
+    per-job batches, `log_callback(job_id, lines)`, every `flush_interval` seconds or as soon
+    as `flush_size` records are waiting.
+
+    `emit` only appends to a deque, so the event loop is woken at most once per batch instead
+    of once per record. At most `max_buffered` records are held: above `sample_watermark` of
+    that only every `sample_every`-th record below WARNING is kept, and at capacity new records
+    are dropped. Dropped lines are counted and reported to each job as a single warning line.
+    """
+
     def __init__(
         self,
-        log_callback: Callable[[Any], Any],
+        log_callback: Callable[[str, List[Dict[str, Any]]], Any],
         loop: asyncio.AbstractEventLoop,
+        flush_interval: float = 0.05,
+        flush_size: int = 500,
+        max_buffered: int = 50_000,
+        sample_watermark: float = 0.5,
+        sample_every: int = 10,
     ):
         super().__init__()
         self.log_callback = log_callback
         self.loop = loop
-        self.queue: asyncio.Queue = asyncio.Queue()
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffered = max_buffered
+        self.sample_threshold = int(max_buffered * sample_watermark)
+        self.sample_every = sample_every
+
+        # (job_id, level, message, created); deque appends/pops are thread-safe
+        self._buffer: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._wakeup_pending = False
+        self._sampled = 0
+
+        # drop accounting only takes the lock on the (rare) drop path
+        self._drop_lock = threading.Lock()
+        self.dropped = 0
+        self.dropped_by_job: Counter = Counter()
+        self._unreported_drops: Counter = Counter()
+
+        # cached "%Y-%m-%d %H:%M:%S" of the last second seen
+        self._time_second = -1
+        self._time_text = ""
 
-        # single drain task → preserves order
+        # single flush task → preserves order
         self.loop.create_task(self._drain())
 
+    def _drop(self, job_id: str):
+        with self._drop_lock:
+            self.dropped += 1
+            self.dropped_by_job[job_id] += 1
+            self._unreported_drops[job_id] += 1
+
+    def emit(self, record: logging.LogRecord):
+        buffered = len(self._buffer)
+        if buffered >= self.max_buffered:
+            self._drop(record.name)
+            return
+        if buffered >= self.sample_threshold and record.levelno < logging.WARNING:
+            self._sampled += 1
+            if self._sampled % self.sample_every:
+                self._drop(record.name)
+                return
+
+        log_entry = self.format(record)
+        self._buffer.append((record.name, record.levelname, log_entry, record.created))
+
+        # wake the flush task early once a full batch is waiting
+        if buffered + 1 >= self.flush_size and not self._wakeup_pending:
+            self._wakeup_pending = True
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _format_time(self, created: float) -> str:
+        second = int(created)
+        if second != self._time_second:
+            self._time_second = second
+            self._time_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return self._time_text
+
     async def _drain(self):
         while True:
-            log_event = await self.queue.get()
             try:
-                await self.log_callback(log_event)
-            except Exception:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
                 pass
-            finally:
-                self.queue.task_done()
+            self._wakeup.clear()
+            self._wakeup_pending = False
+            await self.flush_batches()
 
-    def emit(self, record: logging.LogRecord):
+    async def flush_batches(self):
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        popleft = self._buffer.popleft
+        for _ in range(len(self._buffer)):
+            job_id, level, message, created = popleft()
+            batch = batches.get(job_id)
+            if batch is None:
+                batch = batches[job_id] = []
+            batch.append(
+                {
+                    "level": level,
+                    "message": message,
+                    "time": self._format_time(created),
+                }
+            )
 
-        log_entry = self.format(record)
+        if self._unreported_drops:
+            with self._drop_lock:
+                drops, self._unreported_drops = self._unreported_drops, Counter()
+            now = self._format_time(time.time())
+            for job_id, count in drops.items():
+                batches.setdefault(job_id, []).append(
+                    {
+                        "level": "WARNING",
+                        "message": f"{count} log lines dropped (log buffer full)",
+                        "time": now,
+                    }
+                )
 
-        log_event = {
-            "job_id": record.name,
-            "level": record.levelname,
-            "message": log_entry,
-        }
+        for job_id, lines in batches.items():
+            try:
+                await self.log_callback(job_id, lines)
+            except Exception:
+                pass
 
-        # thread-safe enqueue, non-blocking
-        self.loop.call_soon_threadsafe(
-            self.queue.put_nowait,
-            log_event,
-        )
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "dropped_by_job": dict(self.dropped_by_job),
+        }
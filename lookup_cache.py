@@ -0,0 +1,285 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import Engine, delete, func, or_, select
+from sqlalchemy.orm import Session
+
+from models import CacheInvalidation, Job, Plugin
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    """
+    Read-through cache of the plugin and job rows behind the endpoints' lookups.
+
+    The plugins table is small and cached whole. Job lists are cached per scheduler job id
+    ("{plugin_id}/{session_id}") and single jobs per id, both LRU bounded. `PluginManager`
+    drops entries after each of its own writes. Every invalidation bumps a generation, and a
+    read that started before it does not store its (possibly stale) rows.
+
+    With `poll_interval`, writes are also published to `cache_invalidations` in the writer's
+    transaction, and a background thread applies the other nodes' entries every
+    `poll_interval` seconds. Entries older than `retention_seconds` are deleted. Each poll also
+    re-reads the last `lookback_seconds`, since a transaction may commit after a later id.
+    """
+
+    def __init__(
+        self,
+        max_job_lists: int = 10_000,
+        max_jobs: int = 10_000,
+        db_engine: Optional[Engine] = None,
+        poll_interval: Optional[float] = None,
+        retention_seconds: float = 3600,
+        lookback_seconds: float = 30,
+    ):
+        self.max_job_lists = max_job_lists
+        self.max_jobs = max_jobs
+        self.db_engine = db_engine
+        self.poll_interval = poll_interval if db_engine is not None else None
+        self.retention_seconds = retention_seconds
+        self.lookback_seconds = lookback_seconds
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._plugins: Optional[List[Plugin]] = None
+        self._plugins_by_id: Dict[int, Plugin] = {}
+        self._job_lists: OrderedDict[str, List[Job]] = OrderedDict()
+        self._jobs: OrderedDict[int, Job] = OrderedDict()
+        # scheduler job id -> ids of its cached jobs, to drop them with the list
+        self._jobs_by_owner: Dict[str, Set[int]] = {}
+
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+        self._last_seen = 0
+        # ids applied within the lookback window -> created_at
+        self._applied: Dict[int, datetime] = {}
+        # called with (kind, key) of every polled invalidation
+        self._listeners: List[Callable[[str, Optional[str]], Any]] = []
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def generation(self) -> int:
+        """Pass to the `set_*` call of a read started now."""
+        return self._generation
+
+    # ---- reads ----
+
+    def get_plugins(self) -> Optional[List[Plugin]]:
+        plugins = self._plugins
+        self._count("plugins", plugins is not None)
+        return None if plugins is None else list(plugins)
+
+    def get_plugin(self, plugin_id: int) -> Optional[Plugin]:
+        """The cached plugin row, or None on a miss (the whole table is then reloaded)."""
+        plugins = self._plugins
+        self._count("plugin", plugins is not None)
+        return None if plugins is None else self._plugins_by_id.get(plugin_id)
+
+    def get_jobs(self, scheduler_job_id: str) -> Optional[List[Job]]:
+        with self._lock:
+            jobs = self._job_lists.get(scheduler_job_id)
+            if jobs is not None:
+                self._job_lists.move_to_end(scheduler_job_id)
+        self._count("jobs", jobs is not None)
+        return None if jobs is None else list(jobs)
+
+    def get_job(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+        self._count("job", job is not None)
+        return job
+
+    def _count(self, kind: str, hit: bool):
+        if hit:
+            self.hits[kind] += 1
+        else:
+            self.misses[kind] += 1
+
+    # ---- fills, ignored when an invalidation happened since `generation` ----
+
+    def set_plugins(self, plugins: List[Plugin], generation: int):
+        with self._lock:
+            if generation == self._generation:
+                self._plugins = list(plugins)
+                self._plugins_by_id = {int(plugin.id): plugin for plugin in plugins}  # type: ignore
+
+    def set_jobs(self, scheduler_job_id: str, jobs: List[Job], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._job_lists[scheduler_job_id] = list(jobs)
+            self._job_lists.move_to_end(scheduler_job_id)
+            if len(self._job_lists) > self.max_job_lists:
+                self._drop_owner(next(iter(self._job_lists)))
+
+    def set_job(self, job: Job, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            job_id = int(job.id)  # type: ignore
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._jobs_by_owner.setdefault(f"{job.plugin_id}/{job.session_id}", set()).add(job_id)
+            if len(self._jobs) > self.max_jobs:
+                _, oldest = self._jobs.popitem(last=False)
+                owned = self._jobs_by_owner.get(f"{oldest.plugin_id}/{oldest.session_id}")
+                if owned:
+                    owned.discard(int(oldest.id))  # type: ignore
+
+    # ---- invalidation ----
+
+    def invalidate_plugins(self):
+        with self._lock:
+            self._generation += 1
+            self._plugins = None
+            self._plugins_by_id = {}
+        self.invalidations += 1
+
+    def invalidate_jobs(self, scheduler_job_id: str):
+        """Drop the job list of `scheduler_job_id` and every cached job of it."""
+        with self._lock:
+            self._generation += 1
+            self._drop_owner(scheduler_job_id)
+        self.invalidations += 1
+
+    def invalidate_all_jobs(self):
+        """Drop every cached job list and job, after a bulk write touching many owners."""
+        with self._lock:
+            self._generation += 1
+            self._job_lists.clear()
+            self._jobs.clear()
+            self._jobs_by_owner.clear()
+        self.invalidations += 1
+
+    def _drop_owner(self, scheduler_job_id: str):
+        self._job_lists.pop(scheduler_job_id, None)
+        for job_id in self._jobs_by_owner.pop(scheduler_job_id, ()):
+            self._jobs.pop(job_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._plugins = None
+            self._plugins_by_id = {}
+            self._job_lists.clear()
+            self._jobs.clear()
+            self._jobs_by_owner.clear()
+        self.invalidations += 1
+
+    def publish(self, session: Any, kind: str, key: Optional[str] = None):
+        """
+        Record an invalidation for the other nodes in `session`, committed with the write. A
+        "jobs" one without `key` drops all their cached jobs.
+        """
+        if self.poll_interval is not None:
+            session.add(
+                CacheInvalidation(kind=kind, key=key, created_at=datetime.now(timezone.utc))
+            )
+
+    # ---- cross-node polling ----
+
+    def add_listener(self, callback: Callable[[str, Optional[str]], Any]):
+        """Call `callback(kind, key)` for each invalidation polled, this node's own included."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self.poll_interval is None or self._thread is not None:
+            return
+        with Session(self.db_engine) as session:
+            self._last_seen = session.scalar(select(func.max(CacheInvalidation.id))) or 0
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="lookup-cache-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_purge = time.monotonic()
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + self.retention_seconds / 4
+                    self.purge()
+            except Exception as e:
+                # cannot tell what changed, start over
+                logger.error(e, exc_info=True)
+                self.clear()
+
+    def poll(self):
+        """Apply invalidations written since the last poll, by any node."""
+        window = datetime.now(timezone.utc) - timedelta(seconds=self.lookback_seconds)
+        with Session(self.db_engine) as session:
+            rows = session.execute(
+                select(
+                    CacheInvalidation.id,
+                    CacheInvalidation.kind,
+                    CacheInvalidation.key,
+                    CacheInvalidation.created_at,
+                )
+                .where(
+                    or_(
+                        CacheInvalidation.id > self._last_seen,
+                        CacheInvalidation.created_at >= window,
+                    )
+                )
+                .order_by(CacheInvalidation.id)
+            ).all()
+
+        for row_id, kind, key, created_at in rows:
+            if row_id in self._applied:
+                continue
+            if kind == "jobs" and key:
+                self.invalidate_jobs(key)
+            elif kind == "jobs":
+                self.invalidate_all_jobs()
+            else:
+                self.invalidate_plugins()
+            self._applied[row_id] = created_at
+            self._last_seen = max(self._last_seen, row_id)
+            self.remote_invalidations += 1
+            for callback in self._listeners:
+                try:
+                    callback(kind, key)
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+
+        # SQLite hands back naive datetimes
+        window = window.replace(tzinfo=None)
+        self._applied = {
+            row_id: created_at
+            for row_id, created_at in self._applied.items()
+            if created_at.replace(tzinfo=None) >= window
+        }
+
+    def purge(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        with Session(self.db_engine) as session:
+            session.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < cutoff))
+            session.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "plugins_cached": self._plugins is not None,
+            "job_lists": len(self._job_lists),
+            "jobs": len(self._jobs),
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+        }
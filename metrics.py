@@ -0,0 +1,294 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# seconds between a tick's scheduled time and its run starting
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# seconds a run took
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# per-job and per-plugin counters
+EVENTS = ("runs", "errors", "missed", "max_instances", "run_limited", "coalesced")
+# jobs with histograms of their own, the first ones seen, to bound the series exported
+MAX_JOB_HISTOGRAMS = 1000
+
+
+class Histogram:
+    """
+    Counts of observations per fixed bucket (upper bounds, plus one for anything above), with
+    their sum. Recording is a bisect and two additions, no samples are kept.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add(self, other: "Histogram"):
+        """Add the observations of `other`, which has the same buckets."""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= it), ending with +inf, as Prometheus exposes them."""
+        result, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate, interpolated linearly within the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, seen = 0.0, 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        # above the last bucket, its bound is all we know
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _JobStats:
+    __slots__ = (
+        "events",
+        "last_lag",
+        "last_duration",
+        "max_duration",
+        "last_scheduled",
+        "lag",
+        "duration",
+    )
+
+    def __init__(self, histograms: bool = False):
+        self.events: Counter = Counter()
+        self.last_lag: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.max_duration = 0.0
+        # scheduled time of the job's last tick, to count the ticks coalesced since
+        self.last_scheduled: Optional[float] = None
+        self.lag = Histogram(LAG_BUCKETS) if histograms else None
+        self.duration = Histogram(DURATION_BUCKETS) if histograms else None
+
+
+class _PluginStats:
+    __slots__ = ("events", "lag", "duration")
+
+    def __init__(self):
+        self.events: Counter = Counter()
+        self.lag = Histogram(LAG_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+
+
+class SchedulerMetrics:
+    """
+    Run metrics per scheduler job and per plugin, fed by `PluginManager.job_listener`: start
+    lag and duration histograms per plugin, and per job for the first `max_job_histograms`
+    jobs, and run, error, missed, max-instances, run-limited and coalesced tick counts per job
+    and plugin.
+    Jobs are keyed by their scheduler job id (`"{plugin_id}/{session_id}"`), plugins by the id
+    in front of it.
+    """
+
+    def __init__(self, max_job_histograms: int = MAX_JOB_HISTOGRAMS):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _JobStats] = {}
+        self._plugins: Dict[str, _PluginStats] = {}
+        self.max_job_histograms = max_job_histograms
+        self._job_histograms = 0
+
+    def _stats(self, scheduler_job_id: str) -> Tuple[_JobStats, _PluginStats]:
+        job = self._jobs.get(scheduler_job_id)
+        if job is None:
+            histograms = self._job_histograms < self.max_job_histograms
+            self._job_histograms += histograms
+            job = self._jobs[scheduler_job_id] = _JobStats(histograms)
+        plugin_id = scheduler_job_id.partition("/")[0]
+        plugin = self._plugins.get(plugin_id)
+        if plugin is None:
+            plugin = self._plugins[plugin_id] = _PluginStats()
+        return job, plugin
+
+    def _count(self, scheduler_job_id: str, event: str, n: int = 1):
+        job, plugin = self._stats(scheduler_job_id)
+        job.events[event] += n
+        plugin.events[event] += n
+
+    def scheduled(
+        self, scheduler_job_id: str, scheduled_at: float, interval: Optional[float] = None
+    ):
+        """
+        A tick came due, submitted or not. Ticks of `interval` skipped since the previous one
+        were coalesced into it.
+        """
+        with self._lock:
+            job, _ = self._stats(scheduler_job_id)
+            previous, job.last_scheduled = job.last_scheduled, scheduled_at
+            if previous is not None and interval:
+                skipped = int((scheduled_at - previous) / interval + 0.5) - 1
+                if skipped > 0:
+                    self._count(scheduler_job_id, "coalesced", skipped)
+
+    def finished(
+        self, scheduler_job_id: str, lag: Optional[float], duration: Optional[float], error: bool
+    ):
+        with self._lock:
+            job, plugin = self._stats(scheduler_job_id)
+            self._count(scheduler_job_id, "runs")
+            if error:
+                self._count(scheduler_job_id, "errors")
+            if lag is not None:
+                lag = max(lag, 0.0)
+                job.last_lag = lag
+                plugin.lag.observe(lag)
+                if job.lag is not None:
+                    job.lag.observe(lag)
+            if duration is not None:
+                job.last_duration = duration
+                job.max_duration = max(job.max_duration, duration)
+                plugin.duration.observe(duration)
+                if job.duration is not None:
+                    job.duration.observe(duration)
+
+    def missed(self, scheduler_job_id: str):
+        """A tick was dropped for starting later than the misfire grace time."""
+        with self._lock:
+            self._count(scheduler_job_id, "missed")
+
+    def max_instances(self, scheduler_job_id: str):
+        """A tick was skipped because the job's previous runs were still going."""
+        with self._lock:
+            self._count(scheduler_job_id, "max_instances")
+
+    def run_limited(self, scheduler_job_id: str):
+        """A tick was skipped because its plugin was at its run limit."""
+        with self._lock:
+            self._count(scheduler_job_id, "run_limited")
+
+    def remove(self, scheduler_job_id: str):
+        with self._lock:
+            job = self._jobs.pop(scheduler_job_id, None)
+            if job is not None and job.lag is not None:
+                self._job_histograms -= 1
+
+    def merged(self, name: str) -> Histogram:
+        """The "lag" or "duration" histogram of all plugins together."""
+        merged = Histogram(LAG_BUCKETS if name == "lag" else DURATION_BUCKETS)
+        with self._lock:
+            for stats in self._plugins.values():
+                merged.add(getattr(stats, name))
+        return merged
+
+    def totals(self) -> Dict[str, int]:
+        """Counters of all plugins together."""
+        with self._lock:
+            return {
+                event: sum(stats.events[event] for stats in self._plugins.values())
+                for event in EVENTS
+            }
+
+    def summary(self, plugin_id: Optional[str] = None) -> Dict[str, Any]:
+        """Counts and histogram estimates per plugin, and per job of `plugin_id` if given."""
+        with self._lock:
+            plugins = {
+                key: {
+                    **{event: stats.events[event] for event in EVENTS},
+                    "lag": stats.lag.summary(),
+                    "duration": stats.duration.summary(),
+                }
+                for key, stats in self._plugins.items()
+            }
+            result: Dict[str, Any] = {"plugins": plugins}
+            if plugin_id is not None:
+                result["jobs"] = {
+                    key: {
+                        **{event: stats.events[event] for event in EVENTS},
+                        "last_lag": stats.last_lag,
+                        "last_duration": stats.last_duration,
+                        "max_duration": stats.max_duration,
+                        "lag": stats.lag.summary() if stats.lag else None,
+                        "duration": stats.duration.summary() if stats.duration else None,
+                    }
+                    for key, stats in self._jobs.items()
+                    if key.partition("/")[0] == plugin_id
+                }
+            return result
+
+    def prometheus(self, gauges: Optional[Dict[str, Dict[Tuple, float]]] = None) -> str:
+        """
+        The metrics in Prometheus text format, per plugin and, for the jobs that have them,
+        per job histograms, plus `gauges` given as name -> {((label, value), ...): value}.
+        """
+        lines: List[str] = []
+        with self._lock:
+            plugins = sorted(self._plugins.items())
+            jobs = sorted(
+                (key, stats) for key, stats in self._jobs.items() if stats.lag is not None
+            )
+            for event in EVENTS:
+                name = f"job_scheduler_{event}_total"
+                lines.append(f"# TYPE {name} counter")
+                for plugin_id, stats in plugins:
+                    lines.append(f'{name}{{plugin_id="{plugin_id}"}} {stats.events[event]}')
+
+            for name, attribute in (
+                ("job_scheduler_start_lag_seconds", "lag"),
+                ("job_scheduler_run_duration_seconds", "duration"),
+            ):
+                lines.append(f"# TYPE {name} histogram")
+                for plugin_id, stats in plugins:
+                    _histogram_lines(
+                        lines, name, f'plugin_id="{plugin_id}"', getattr(stats, attribute)
+                    )
+
+            for name, attribute in (
+                ("job_scheduler_job_start_lag_seconds", "lag"),
+                ("job_scheduler_job_run_duration_seconds", "duration"),
+            ):
+                lines.append(f"# TYPE {name} histogram")
+                for key, stats in jobs:
+                    plugin_id, _, session_id = key.partition("/")
+                    labels = f'plugin_id="{plugin_id}",session_id="{session_id}"'
+                    _histogram_lines(lines, name, labels, getattr(stats, attribute))
+
+            name = "job_scheduler_jobs_without_histograms"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {len(self._jobs) - self._job_histograms}")
+
+        for name, samples in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(samples.items()):
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(lines: List[str], name: str, labels: str, histogram: Histogram):
+    for bound, count in histogram.cumulative():
+        le = "+Inf" if bound == float("inf") else repr(float(bound))
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
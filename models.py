@@ -1,6 +1,14 @@
+import zlib
+
 from sqlalchemy import (
+    BigInteger,
     Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     Text,
     CheckConstraint,
     text,
@@ -11,6 +19,16 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 
+def job_shard_key(plugin_id, session_id) -> int:
+    """crc32 of the scheduler job id `"{plugin_id}/{session_id}"`, see `Cluster.shard_of`."""
+    return zlib.crc32(f"{plugin_id}/{session_id}".encode())
+
+
+def _shard_key_default(context) -> int:
+    row = context.get_current_parameters()
+    return job_shard_key(row["plugin_id"], row["session_id"])
+
+
 class Plugin(Base):
     __tablename__ = "plugins"
 
@@ -18,6 +36,8 @@ class Plugin(Base):
     package = Column(Text, nullable=False, unique=True)
     interval = Column(Integer, nullable=False)
     description = Column(Text)
+    # "thread" | "async" | "process", overrides the executor declared by the plugin class
+    executor = Column(Text, nullable=True)
 
     __table_args__ = (CheckConstraint("interval > 0", name="ck_plugins_interval_positive"),)
 
@@ -27,9 +47,99 @@ class Job(Base):
 
     id = Column(Integer, Sequence("jobs_id_seq"), primary_key=True)
     session_id = Column(Integer, nullable=False)
-    plugin_id = Column(Integer, nullable=False)
+    plugin_id = Column(Integer, ForeignKey("plugins.id", name="fk_jobs_plugin_id"), nullable=False)
     description = Column(Text)
     config = Column(Text, nullable=True)
     active = Column(Integer, nullable=False, server_default=text("1"))
+    # set on insert, the cluster shard of the job is this modulo the number of shards
+    shard_key = Column(BigInteger, nullable=False, default=_shard_key_default)
+
+    __table_args__ = (
+        CheckConstraint("active IN (0,1)", name="ck_jobs_active_bool"),
+        # every lookup of a user's configs filters on (plugin_id, session_id)
+        Index("ix_jobs_plugin_session", "plugin_id", "session_id"),
+        # at most one active config per (plugin, session)
+        Index(
+            "uq_jobs_plugin_session_active",
+            "plugin_id",
+            "session_id",
+            unique=True,
+            postgresql_where=text("active = 1"),
+            sqlite_where=text("active = 1"),
+        ),
+    )
+
+
+# BIGINT ids, but INTEGER on SQLite so the column stays a rowid alias
+RunId = BigInteger().with_variant(Integer(), "sqlite")
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(RunId, Sequence("job_runs_id_seq"), primary_key=True)
+    scheduler_job_id = Column(Text, nullable=False)
+    plugin_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False)
+    # active job (config) the run used, if known
+    job_id = Column(Integer, nullable=True)
+    scheduled_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=False)
+    duration = Column(Float, nullable=True)
+    status = Column(Text, nullable=False)
+    error = Column(Text, nullable=True)
+    # format of the row in job_run_results, NULL when the run returned nothing
+    result_format = Column(Text, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('success','error','missed')", name="ck_job_runs_status"),
+        # keyset pagination (newest first) per job, per status, and retention/since scans
+        Index("ix_job_runs_plugin_session_id", "plugin_id", "session_id", "id"),
+        Index("ix_job_runs_status_id", "status", "id"),
+        Index("ix_job_runs_finished_at", "finished_at"),
+    )
+
+
+class JobRunResult(Base):
+    __tablename__ = "job_run_results"
+
+    run_id = Column(RunId, ForeignKey("job_runs.id", ondelete="CASCADE"), primary_key=True)
+    # "parquet" for DataFrames, "json" otherwise
+    format = Column(Text, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class CacheInvalidation(Base):
+    """Lookup cache entries changed by one node, polled by the others to drop their copies."""
+
+    __tablename__ = "cache_invalidations"
+
+    # doubles as the version counter nodes poll past
+    id = Column(RunId, Sequence("cache_invalidations_id_seq"), primary_key=True)
+    # "plugins" | "jobs"
+    kind = Column(Text, nullable=False)
+    # scheduler job id ("{plugin_id}/{session_id}") for "jobs"
+    key = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ClusterNode(Base):
+    """A node of a `Cluster`, alive while its heartbeats keep `expires_at` ahead."""
+
+    __tablename__ = "cluster_nodes"
+
+    node_id = Column(Text, primary_key=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ShardLease(Base):
+    """The node scheduling the jobs of a shard, until `expires_at` unless renewed."""
+
+    __tablename__ = "shard_leases"
 
-    __table_args__ = (CheckConstraint("active IN (0,1)", name="ck_jobs_active_bool"),)
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    # NULL while no node holds it
+    node_id = Column(Text, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
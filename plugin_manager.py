@@ -1,9 +1,15 @@
 import asyncio
+import functools
 import importlib
-import json
+import importlib.util
 import logging
+import os
 import sys
-from typing import Any, Dict, Optional
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 import pluggy
 from pydantic import BaseModel
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -14,11 +20,34 @@ from apscheduler.events import (
     EVENT_JOB_SUBMITTED,
     EVENT_JOB_ADDED,
     EVENT_JOB_REMOVED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_MAX_INSTANCES,
 )
-from sqlalchemy import Engine, update
+from sqlalchemy import Engine, exists, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 from sqlalchemy.orm import Session
 
+from bulk_jobs import BulkJobs, BulkResults
+from cluster import Cluster
+from cluster_jobs import ClusterJobs
+from event_scheduler import EventScheduler
+from executors import EVENT_JOB_RUN_LIMITED
+from job_placement import EXECUTION_MODES, JobPlacement
+from lookup_cache import LookupCache
+from metrics import SchedulerMetrics
+from plugin_watcher import PluginWatcher
+from plugin_runner import ActiveConfig, LazyPlugin, PluginRunner
+from profiling import Capture
+from result_cache import ResultCache
 from models import Job, Plugin
+from run_tracker import RunTracker
+from run_store import (
+    ResultBlob,
+    RunRecorder,
+    open_run_result,
+    run_result_query,
+    runs_query,
+)
 
 PROJECT_NAME = "job-scheduler"
 
@@ -27,6 +56,9 @@ hookspec = pluggy.HookspecMarker(PROJECT_NAME)
 scheduler_logger = logging.getLogger(__name__)
 scheduler_logger.addHandler(logging.StreamHandler())
 
+# what keeps the schedule, see `PluginManager.__init__`
+SCHEDULER_ENGINES = ("apscheduler", "event")
+
 
 class PluginSpec:
     @hookspec
@@ -38,17 +70,51 @@ class PluginSpec:
     @hookspec
     async def run(cls, config: BaseModel, logger: logging.Logger) -> bool: ...
 
+    # optional: one call for the jobs of the plugin due in the same tick, returning a result
+    # (or an exception instance) per config, see `PluginRunner.run_batched`
+    @hookspec
+    async def run_batch(
+        cls, configs: list[BaseModel], loggers: list[logging.Logger]
+    ) -> list[Any]: ...
+
+
+def _async_db(sync_method: str, mutation: bool = False):
+    """
+    Mark an async DB method as the counterpart of `sync_method`, which runs in a worker thread
+    instead when the manager has no `async_db_engine`. Mutations hold the manager's job lock
+    from the DB write to the scheduler update, so the scheduler applies them in commit order.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self: "PluginManager", *args, **kwargs):
+            if self.async_session is None:
+                call = asyncio.to_thread(getattr(self, sync_method), *args, **kwargs)
+            else:
+                call = method(self, *args, **kwargs)
+
+            if not mutation:
+                return await call
+            async with self._job_lock:
+                return await call
+
+        return wrapper
+
+    return decorator
+
 
 class PluginManager:
     """
     Manages plugin loading/unloading, job scheduling, and execution
     """
 
-    # static cache of active job configs
-    _active_job_cache: Dict[str, str] = {}
     # static pluggy manager, so that all pluginmanager share the same plugins
     manager = pluggy.PluginManager(PROJECT_NAME)
     manager.add_hookspecs(PluginSpec)
+    # package -> times it was reloaded, process workers re-import when theirs is behind
+    _plugin_versions: Dict[str, int] = {}
+    # held while a reloaded plugin class replaces the registered one
+    _swap_lock = threading.Lock()
 
     def __init__(
         self,
@@ -56,41 +122,167 @@ class PluginManager:
         module_paths: Optional[list[str]] = None,
         log_handler: Optional[logging.Handler] = None,
         scheduler_kwargs: Optional[dict] = None,
+        execution_mode: str = "thread",
+        worker_loops: int = 0,
+        max_runs_per_loop: Optional[int] = None,
+        max_instances: int = 1,
+        process_workers: Optional[int] = None,
+        run_recorder: Optional[RunRecorder] = None,
+        async_db_engine: Optional[AsyncEngine] = None,
+        lookup_cache: Optional[LookupCache] = None,
+        lazy_plugins: bool = False,
+        prewarm_workers: int = 0,
+        watch: Optional[str] = None,
+        phase_offsets: bool = False,
+        jitter: Optional[float] = None,
+        max_runs_per_plugin: Optional[int] = None,
+        batch_window: float = 0.2,
+        result_cache: Optional[ResultCache] = None,
+        engine: str = "apscheduler",
+        cluster: Optional[Cluster] = None,
+        metrics: Optional[SchedulerMetrics] = None,
     ) -> None:
+        """
+        execution_mode: default placement for plugins that don't declare their own.
+            "thread" runs each tick in the default thread pool with its own `asyncio.run`,
+            "async" awaits async `run` hookimpls on long-lived loops (the scheduler's loop, or
+            `worker_loops` background loops) and offloads sync ones to threads,
+            "process" runs ticks in a warm pool of `process_workers` worker processes.
+        max_runs_per_loop: cap on the in-flight async runs of each loop, whichever jobs they
+            belong to ("async" placement only).
+        max_instances: how many runs of the same job may overlap.
+        run_recorder: stores every finished or missed run, and its result, in `job_runs`.
+        async_db_engine: engine for the `*_async` methods used by the endpoints, which fall
+            back to running the sync methods in threads without it.
+        lookup_cache: read-through cache of plugin and job lookups, a local-only one by default.
+        lazy_plugins: register a `LazyPlugin` per plugin row instead of importing it, so jobs
+            are scheduled right away. Until the class is imported its runs are placed by the
+            row's `executor` or `execution_mode`, then moved to the executor it declares.
+        prewarm_workers: import the plugins in a pool of this many threads, in the background
+            with `lazy_plugins`, else before scheduling. Import times are logged either way.
+        watch: reload plugins when their files under `module_paths` change, and load new
+            plugin versions deployed there ("auto", "watchfiles" or "poll", see `PluginWatcher`).
+        phase_offsets: spread each plugin's jobs over its interval, by a hash of the scheduler
+            job id, instead of firing all of them on the same tick.
+        jitter: up to this many extra seconds, drawn anew for every tick.
+        max_runs_per_plugin: how many runs of the same plugin may execute at once, across all
+            of its jobs. Thread- and process-placed ticks over it are skipped and counted as
+            run_limited, async ones wait their turn. A `max_concurrent_runs` class attribute
+            overrides it per plugin.
+        batch_window: seconds to collect the due ticks of a plugin implementing `run_batch`
+            before calling it. Such plugins' jobs all share one phase and get no jitter.
+        result_cache: where plugins with `cache_results` share the results of identical runs,
+            see `PluginRunner.result_key`.
+        engine: "apscheduler" keeps an APScheduler job per (plugin, session) in a jobstore,
+            "event" the compact per-plugin schedule of `EventScheduler`, for 100k+ jobs.
+        cluster: share the jobs with the other nodes of `cluster`. Only the plugins and jobs
+            of the shards this node holds are loaded, from `start` on, and jobs changed by
+            other nodes are picked up through `lookup_cache`'s polling.
+        metrics: where the run metrics go, with per-job histograms for up to 1000 jobs by default.
+        """
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        if engine not in SCHEDULER_ENGINES:
+            raise ValueError(f"Unknown scheduler engine: {engine}")
 
         # add module path to sys.path to load more plugins
-        if module_paths:
-            for path in module_paths:
-                if path and path not in sys.path:
-                    sys.path.insert(0, path)
+        self.module_paths = [path for path in module_paths or [] if path]
+        for path in self.module_paths:
+            if path not in sys.path:
+                sys.path.insert(0, path)
 
         self.db_engine = db_engine
+        self.async_db_engine = async_db_engine
+        self.async_session = (
+            async_sessionmaker(async_db_engine, expire_on_commit=False)
+            if async_db_engine is not None
+            else None
+        )
+        self.lookup_cache = lookup_cache or LookupCache()
+        # serializes job mutations from the async API, DB commit through scheduler update
+        self._job_lock = asyncio.Lock()
+        self.execution_mode = execution_mode
+        self.max_instances = max_instances
+        self.worker_loops = worker_loops
+        self.max_runs_per_loop = max_runs_per_loop
+        self.process_workers = process_workers
+        self.lazy_plugins = lazy_plugins
+        self.prewarm_workers = prewarm_workers
+        # package -> seconds its import took
+        self.import_times: Dict[str, float] = {}
+        self._reload_lock = threading.Lock()
+        self.phase_offsets = phase_offsets
+        self.jitter = jitter
+        # this node's run state: active configs, run limits, batches, shared results
+        self.runner = PluginRunner(
+            self.manager,
+            swap_lock=self._swap_lock,
+            version_lookup=self.plugin_version,
+            max_runs_per_plugin=max_runs_per_plugin,
+            batch_window=batch_window,
+            result_cache=result_cache,
+        )
+        self.result_cache = self.runner.result_cache
+        self.profiler = self.runner.profiler
+        self.watcher = (
+            PluginWatcher(self, self.module_paths or [os.getcwd()], backend=watch)
+            if watch
+            else None
+        )
+
+        self.run_recorder = run_recorder
+        self.metrics = metrics or SchedulerMetrics()
+        self.run_tracker = RunTracker(self)
+        self.bulk_jobs = BulkJobs(self)
 
         # Pass any additional user-provided args
-        self.scheduler = AsyncIOScheduler(**(scheduler_kwargs or {}))
+        self.engine = engine
+        scheduler_class = EventScheduler if engine == "event" else AsyncIOScheduler
+        self.scheduler = scheduler_class(**(scheduler_kwargs or {}))
+        self.placements = JobPlacement(
+            self, default_executor="default" not in (scheduler_kwargs or {}).get("executors", {})
+        )
         self.scheduler.add_listener(
             self.job_listener,
             EVENT_JOB_ADDED
             | EVENT_JOB_REMOVED
             | EVENT_JOB_SUBMITTED
             | EVENT_JOB_EXECUTED
-            | EVENT_JOB_ERROR,
+            | EVENT_JOB_ERROR
+            | EVENT_JOB_MISSED
+            | EVENT_JOB_MAX_INSTANCES
+            | EVENT_JOB_RUN_LIMITED,
         )
 
         self.log_handler = log_handler
 
+        self.cluster = cluster
+        # held while jobs are scheduled or dropped by shard, and by the job mutations
+        self.shard_lock = threading.RLock()
+        self.cluster_jobs = ClusterJobs(self, cluster) if cluster is not None else None
+        if cluster is not None:
+            return
+
         # Register all plugins from the database
         all_plugins = self.get_all_plugins()
         look_up = {}
         for plugin in all_plugins:
-            self.load_plugin(str(plugin.package))
+            self.register_plugin(str(plugin.package))
             look_up[plugin.id] = plugin
 
+        if prewarm_workers and not lazy_plugins:
+            self.prewarm_plugins(wait=True)
+
         all_jobs = self.get_all_jobs()
 
         for job in all_jobs:
             self.add_job_instance(job, look_up[job.plugin_id])  # type: ignore
 
+        if prewarm_workers and lazy_plugins:
+            self.prewarm_plugins(wait=False)
+        elif not (lazy_plugins or prewarm_workers):
+            self._report_import_times()
+
     def job_listener(self, event: JobExecutionEvent):
         level = logging.INFO
         message = ""
@@ -107,6 +299,25 @@ class PluginManager:
         elif event.code == EVENT_JOB_ERROR:
             level = logging.ERROR
             message = f"Job failed with exception: {event.exception}"
+        elif event.code == EVENT_JOB_MISSED:
+            level = logging.WARNING
+            message = f"Job run missed (scheduled: {event.scheduled_run_time})"
+        elif event.code == EVENT_JOB_RUN_LIMITED:
+            level = logging.WARNING
+            message = (
+                "Job run skipped, plugin at its run limit "
+                f"(scheduled: {getattr(event, 'scheduled_run_times')})"
+            )
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            if self.run_tracker.run_limited(event):
+                # logged already, as the executor's EVENT_JOB_RUN_LIMITED
+                self.run_tracker.listen(event)
+                return
+            level = logging.WARNING
+            message = (
+                "Job run skipped, previous runs still going "
+                f"(scheduled: {getattr(event, 'scheduled_run_times')})"
+            )
 
         log_event = logging.LogRecord(
             event.job_id,
@@ -120,80 +331,298 @@ class PluginManager:
 
         if self.log_handler:
             self.log_handler.emit(log_event)
-        # TODO: other logic ....
+
+        self.run_tracker.listen(event)
+
+    def metrics_text(self) -> str:
+        """`metrics` in Prometheus text format, with the executor queues as gauges."""
+        return self.run_tracker.prometheus()
+
+    def metrics_summary(self, plugin_id: Optional[int] = None) -> Dict[str, Any]:
+        return self.run_tracker.summary(plugin_id)
+
+    def scheduled_job_count(self) -> Tuple[int, int]:
+        """Jobs on this node's scheduler, scheduled and paused."""
+        if isinstance(self.scheduler, EventScheduler):
+            return self.scheduler.job_count()
+        jobs = self.scheduler.get_jobs()
+        paused = sum(job.next_run_time is None for job in jobs)
+        return len(jobs) - paused, paused
 
     def start(self):
+        self.lookup_cache.start()
+        if self.watcher:
+            self.watcher.start()
+        if self.run_recorder:
+            self.run_recorder.start()
+        if self.cluster:
+            # joins and schedules the jobs of this node's shards
+            self.cluster.start()
         self.scheduler.start()
 
     def stop(self):
         if self.scheduler.running:
             self.scheduler.shutdown()
+        elif self.runner.process_executor is not None:
+            # spawned when its first job was placed, the scheduler never got to shut it down
+            self.runner.process_executor.shutdown()
+        if self.cluster:
+            # once no job of its shards runs here anymore
+            self.cluster.stop()
+            self.cluster_jobs.shards.clear()
+        if self.run_recorder:
+            self.run_recorder.stop()
+        self.lookup_cache.stop()
+        if self.watcher:
+            self.watcher.stop()
 
-    def reload_module(self, module_path: str):
-        root, sep, _ = module_path.partition(".")
-        prefix = root + sep
+    @staticmethod
+    def plugin_modules(package: str) -> list[str]:
+        """
+        Loaded modules that belong to the plugin `package`: the module defining the class and,
+        when that is a package (`plugins.sample_plugin@v0_2_0`), every module below it.
+        """
+        module_path = package.rpartition(".")[0]
+        prefix = module_path + "."
+        return [
+            name for name in list(sys.modules) if name == module_path or name.startswith(prefix)
+        ]
 
-        # reload all sub modules, later import root module to make sure in right order
-        for name, module in list(sys.modules.items()):
-            if name.startswith(prefix):
-                importlib.reload(module)
+    @classmethod
+    def reimport_plugin(cls, package: str):
+        """
+        Import a fresh copy of the plugin's modules and swap the new class in for the
+        registered one.
 
-        root_module = sys.modules.get(root)
-        if root_module:
-            importlib.reload(root_module)
+        The old modules are dropped from `sys.modules` rather than reloaded in place, so the
+        import system re-runs them in dependency order while runs already executing keep the
+        old class and its module globals. If the import fails the old modules and class stay.
+        """
+        module_path, _, class_name = package.rpartition(".")
+        parent_path, _, child = module_path.rpartition(".")
+        old_modules = {name: sys.modules.pop(name) for name in cls.plugin_modules(package)}
 
-    def get_plugin_names(self):
-        return [name for name, _ in self.manager.list_name_plugin()]
+        try:
+            importlib.invalidate_caches()
+            plugin = getattr(importlib.import_module(module_path), class_name)
+        except BaseException:
+            for name in cls.plugin_modules(package):
+                sys.modules.pop(name, None)
+            sys.modules.update(old_modules)
+            parent = sys.modules.get(parent_path)
+            if parent is not None and module_path in old_modules:
+                setattr(parent, child, old_modules[module_path])
+            raise
 
-    def get_plugin_instance(self, package: str) -> Optional[PluginSpec]:
-        return self.manager.get_plugin(package)
+        with cls._swap_lock:
+            if cls.manager.get_plugin(package) is not None:
+                cls.manager.unregister(name=package)
+            cls.manager.register(plugin, package)
+        return plugin
 
-    @classmethod
-    def run_plugin_job(cls, package: str, scheduler_job_id: str):
+    def reload_plugin(self, package: str) -> float:
+        """Reload one plugin (see `reimport_plugin`), returns the seconds it took."""
+        start = time.perf_counter()
+        with self._reload_lock:
+            self.reimport_plugin(package)
+            self._plugin_versions[package] = self._plugin_versions.get(package, 0) + 1
+        # the reloaded class may declare another executor
+        self._plugin_imported(package)
+        return time.perf_counter() - start
+
+    def reload_plugins(self, packages: list[str]) -> Dict[str, Dict[str, Any]]:
+        """Reload each of `packages`, one failing does not stop the others."""
+        results: Dict[str, Dict[str, Any]] = {}
+        for package in packages:
+            try:
+                results[package] = {"success": True, "seconds": self.reload_plugin(package)}
+            except Exception as e:
+                scheduler_logger.error(e, exc_info=True)
+                results[package] = {"success": False, "error": str(e)}
+        return results
+
+    def load_missing_plugins(self) -> list[str]:
         """
-        Wrapper to run a plugin's 'run' method synchronously within asyncio event loop,
-        fetching config from the active job for the user/plugin.
+        Import the plugin rows that are not registered yet, e.g. because their versioned
+        folder was deployed after start-up. Returns the packages that could be loaded.
         """
-        plugin = cls.manager.get_plugin(package)
-        if plugin is None:
-            return None
+        loaded = []
+        for row in self.get_all_plugins():
+            package = str(row.package)
+            if self.manager.get_plugin(package) is not None:
+                continue
+            try:
+                if importlib.util.find_spec(package.rpartition(".")[0]) is None:
+                    continue
+            except ImportError:
+                continue
+            if self.load_plugin(package) is not None:
+                self._plugin_imported(package)
+                loaded.append(package)
+        return loaded
 
-        job_config = cls._active_job_cache.get(scheduler_job_id)
+    @classmethod
+    def plugin_version(cls, package: str) -> int:
+        return cls._plugin_versions.get(package, 0)
 
-        if job_config is None:
-            # No active job means no config to run this plugin instance for this user
-            return None
+    def get_plugin_names(self):
+        return [name for name, _ in self.manager.list_name_plugin()]
 
-        config = plugin.config(json.loads(job_config))
+    def get_plugin_instance(self, package: str) -> Optional[PluginSpec]:
+        """The plugin class, imported now if it was registered lazily."""
+        plugin = self.manager.get_plugin(package)
+        if isinstance(plugin, LazyPlugin):
+            return plugin.resolve()
+        return plugin
 
-        logger = logging.getLogger(scheduler_job_id)
+    async def get_plugin_instance_async(self, package: str) -> Optional[PluginSpec]:
+        plugin = self.manager.get_plugin(package)
+        if isinstance(plugin, LazyPlugin):
+            # importing blocks, keep it off the event loop
+            return plugin.plugin or await asyncio.to_thread(plugin.resolve)
+        return plugin
+
+    def register_run_hooks(self, hooks: Any, name: Optional[str] = None):
+        """Register an implementation of `RunSpec`'s `pre_run`/`post_run` hooks."""
+        self.runner.register_run_hooks(hooks, name)
+
+    def unregister_run_hooks(self, hooks: Any):
+        self.runner.unregister_run_hooks(hooks)
 
-        return asyncio.run(plugin.run(config, logger))
+    def profile_job(self, scheduler_job_id: str, runs: int = 1, **options) -> Capture:
+        """
+        Arm `profiler` for the next `runs` runs of a scheduler job, see `RunProfiler`. Raises
+        KeyError for unknown jobs and ValueError for jobs whose runs are not covered.
+        """
+        job = self.scheduler.get_job(scheduler_job_id)
+        if job is None:
+            raise KeyError(scheduler_job_id)
+        if job.executor in ("process", "batch"):
+            raise ValueError(
+                f"Runs of {scheduler_job_id} go to the {job.executor} executor, "
+                "which is not profiled"
+            )
+        return self.profiler.arm(scheduler_job_id, runs, **options)
 
     def unload_plugin(self, package: str):
         existing_plugin = self.manager.get_plugin(package)
         if existing_plugin:
             self.manager.unregister(existing_plugin, package)
+            self.runner.invalidate_config_models()
 
-    def load_plugin(self, package: str, override: bool = False):
+    @classmethod
+    def import_plugin(cls, package: str):
+        """Import the plugin class named by `package` and register it with pluggy."""
         module_path, _, class_name = package.rpartition(".")
+        module = importlib.import_module(module_path)
+        plugin = getattr(module, class_name)
+        cls.manager.register(plugin, package)
+        return plugin
 
-        if override:
-            self.unload_plugin(package)
-            self.reload_module(module_path)
+    def load_plugin(self, package: str, override: bool = False):
+        """
+        The registered plugin class, imported first if need be. With `override` a registered
+        one is reloaded (see `reload_plugin`), keeping the old class if that fails.
+        """
+        if override and self.manager.get_plugin(package) is not None:
+            try:
+                self.reload_plugin(package)
+            except Exception as e:
+                scheduler_logger.error(e, exc_info=True)
 
         plugin: PluginSpec | None = self.manager.get_plugin(package)
         if plugin is None:
             try:
-                module = importlib.import_module(module_path)
-                plugin = getattr(module, class_name)
-                self.manager.register(plugin, package)
+                start = time.perf_counter()
+                plugin = self.import_plugin(package)
+                self.import_times[package] = time.perf_counter() - start
             except Exception as e:
                 # show error to terminal to check but keep running
                 scheduler_logger.error(e, exc_info=True)
 
         return plugin
 
+    def register_plugin(self, package: str):
+        if self.lazy_plugins or self.prewarm_workers:
+            self.register_lazy_plugin(package)
+        else:
+            self.load_plugin(package)
+
+    def register_lazy_plugin(self, package: str) -> LazyPlugin:
+        plugin = self.manager.get_plugin(package)
+        if plugin is None:
+            plugin = LazyPlugin(package, on_import=self._plugin_imported)
+            self.manager.register(plugin, package)
+        return plugin
+
+    def _plugin_imported(self, package: str):
+        plugin = self.manager.get_plugin(package)
+        if isinstance(plugin, LazyPlugin) and plugin.import_seconds is not None:
+            self.import_times[package] = plugin.import_seconds
+
+        # move its jobs to the executor the class declares, if that differs
+        plugin_row = next((row for row in self.get_all_plugins() if row.package == package), None)
+        if plugin_row is not None:
+            self.placements.replace(plugin_row)
+
+    def prewarm_plugins(self, wait: bool = False):
+        """
+        Import every lazily registered plugin in a pool of `prewarm_workers` threads, then log
+        the import times. Blocks until done with `wait`.
+        """
+        lazy = [
+            plugin
+            for _, plugin in self.manager.list_name_plugin()
+            if isinstance(plugin, LazyPlugin) and not plugin.loaded
+        ]
+        if not lazy:
+            return
+
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, self.prewarm_workers), thread_name_prefix="plugin-prewarm"
+        )
+        start = time.perf_counter()
+        pending = [len(lazy)]
+        pending_lock = threading.Lock()
+
+        def done(future):
+            if future.exception() is not None:
+                scheduler_logger.error(future.exception(), exc_info=future.exception())
+            with pending_lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                self._report_import_times(time.perf_counter() - start)
+
+        for plugin in lazy:
+            pool.submit(plugin.resolve).add_done_callback(done)
+        pool.shutdown(wait=wait)
+
+    def _report_import_times(self, elapsed: Optional[float] = None):
+        if not self.import_times:
+            return
+        slowest = sorted(self.import_times.items(), key=lambda item: item[1], reverse=True)
+        summary = ", ".join(f"{package} {seconds:.3f}s" for package, seconds in slowest)
+        took = f" in {elapsed:.3f}s" if elapsed is not None else ""
+        scheduler_logger.info(f"Imported {len(self.import_times)} plugins{took}: {summary}")
+
+    def add_plugin(
+        self,
+        package: str,
+        interval: int,
+        description: Optional[str] = None,
+        executor: Optional[str] = None,
+    ) -> int:
+        with Session(self.db_engine) as session:
+            plugin = Plugin(
+                package=package, interval=interval, description=description, executor=executor
+            )
+            session.add(plugin)
+            self.lookup_cache.publish(session, "plugins")
+            session.commit()
+            self.lookup_cache.invalidate_plugins()
+            return int(plugin.id)  # type: ignore
+
     def add_job(
         self,
         session_id: int,
@@ -210,7 +639,9 @@ class PluginManager:
                 description=description,
             )
             session.add(job)
+            self.lookup_cache.publish(session, "jobs", f"{plugin_id}/{session_id}")
             session.commit()
+            self.lookup_cache.invalidate_jobs(f"{plugin_id}/{session_id}")
 
             plugin = session.get(Plugin, plugin_id)
             assert plugin is not None
@@ -218,19 +649,37 @@ class PluginManager:
 
     def add_job_instance(self, job: Job, plugin: Plugin):
         scheduler_job_id = f"{plugin.id}/{job.session_id}"
+        with self.shard_lock:
+            if self.owns(scheduler_job_id):
+                self._add_job_instance(scheduler_job_id, job, plugin)
+
+    def _add_job_instance(self, scheduler_job_id: str, job: Job, plugin: Plugin):
+        self.runner.plugin_intervals[str(plugin.package)] = plugin.interval  # type: ignore
+        self.run_tracker.intervals[str(plugin.id)] = plugin.interval  # type: ignore
+        args = [str(plugin.package), scheduler_job_id, self.runner.name]
+        scheduled = self.scheduler.get_job(scheduler_job_id)
+        if scheduled is not None and list(scheduled.args) != args:
+            # restored by a persistent jobstore, runs go to this manager's runner now
+            self.scheduler.modify_job(scheduler_job_id, args=args)
+        elif scheduled is None:
+            with self.placements.lock:
+                func, executor = self.placements.target(plugin)
 
-        if self.scheduler.get_job(scheduler_job_id) is None:
             # make sure job run 1 time
             self.scheduler.add_job(
-                self.run_plugin_job,
-                "interval",
-                seconds=plugin.interval,
-                args=[plugin.package, scheduler_job_id],
+                func,
+                self.placements.trigger(
+                    scheduler_job_id,
+                    plugin.interval,  # type: ignore
+                    batched=executor == "batch",
+                ),
+                args=args,
                 next_run_time=None,
                 id=scheduler_job_id,
                 name=scheduler_job_id,
+                executor=executor,
                 coalesce=True,
-                max_instances=1,
+                max_instances=self.max_instances,
                 replace_existing=True,
             )
 
@@ -241,9 +690,88 @@ class PluginManager:
 
         # active job
         if bool(job.active):
-            self._active_job_cache[scheduler_job_id] = str(job.config)
+            self.job_activated(job)
+
+    # scheduler side of the job mutations, applied once the DB write is committed
+
+    def publish_jobs(self, session, job: Job):
+        # other nodes drop their cached jobs of this user/plugin once the write commits
+        self.lookup_cache.publish(session, "jobs", f"{job.plugin_id}/{job.session_id}")
+
+    def job_activated(self, job: Job):
+        scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
+        self.lookup_cache.invalidate_jobs(scheduler_job_id)
+        with self.shard_lock:
+            if not self.owns(scheduler_job_id):
+                return
+            self.runner.active_configs[scheduler_job_id] = ActiveConfig(str(job.config), job.id)
             self.scheduler.resume_job(scheduler_job_id)
 
+    def job_deactivated(self, job: Job):
+        scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
+        self.lookup_cache.invalidate_jobs(scheduler_job_id)
+        with self.shard_lock:
+            if not self.owns(scheduler_job_id):
+                return
+            self.runner.active_configs.pop(scheduler_job_id, None)
+            self.scheduler.pause_job(scheduler_job_id)
+
+    def job_config_updated(self, job: Job):
+        scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
+        self.lookup_cache.invalidate_jobs(scheduler_job_id)
+        # update the active config
+        with self.shard_lock:
+            if bool(job.active) and self.owns(scheduler_job_id):
+                self.runner.active_configs[scheduler_job_id] = ActiveConfig(str(job.config), job.id)
+
+    def last_job_removed(self, scheduler_job_id: str):
+        with self.shard_lock:
+            if not self.owns(scheduler_job_id):
+                return
+            self.scheduler.remove_job(scheduler_job_id)
+            self.runner.active_configs.pop(scheduler_job_id, None)
+
+        # remove handler for this logger
+        logger = logging.getLogger(scheduler_job_id)
+        if self.log_handler:
+            logger.removeHandler(self.log_handler)
+
+    def owns(self, scheduler_job_id: str) -> bool:
+        """Whether this node schedules the job, always without a cluster."""
+        return self.cluster_jobs is None or self.cluster_jobs.owns(scheduler_job_id)
+
+    @staticmethod
+    def _deactivate_others(job: Job):
+        # Deactivate other active jobs for the same user/plugin, there is at most one
+        # (uq_jobs_plugin_session_active), so this touches a single index entry
+        return (
+            update(Job)
+            .where(
+                Job.active == 1,
+                Job.plugin_id == job.plugin_id,
+                Job.session_id == job.session_id,
+                Job.id != job.id,
+            )
+            .values(active=0)
+        )
+
+    @staticmethod
+    def _has_jobs(plugin_id: int, session_id: int):
+        # stops at the first match on ix_jobs_plugin_session instead of counting
+        return select(
+            exists().where(
+                Job.plugin_id == plugin_id,
+                Job.session_id == session_id,
+            )
+        )
+
+    @staticmethod
+    def _jobs_for_plugin_and_user(plugin_id: int, session_id: int):
+        return select(Job).where(
+            Job.plugin_id == plugin_id,
+            Job.session_id == session_id,
+        )
+
     def update_job(self, id: int, config: str, description: Optional[str] = None):
         with Session(self.db_engine) as session:
             job = session.get(Job, id)
@@ -251,11 +779,9 @@ class PluginManager:
                 job.config = config  # type: ignore
                 if description:
                     job.description = description  # type: ignore
-                # update the active config
-                if bool(job.active):
-                    scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
-                    self._active_job_cache[scheduler_job_id] = str(job.config)
+                self.publish_jobs(session, job)
                 session.commit()
+                self.job_config_updated(job)
 
     def remove_job(self, job_id: int):
         with Session(self.db_engine) as session:
@@ -264,27 +790,18 @@ class PluginManager:
                 return
             plugin_id = job.plugin_id
             session_id = job.session_id
-            scheduler_job_id = f"{plugin_id}/{session_id}"
+            self.publish_jobs(session, job)
             session.delete(job)
-            session.commit()
+            session.flush()
 
             # If no other jobs remain for this user/plugin, remove scheduled job
-            remaining_jobs = (
-                session.query(Job)
-                .filter(
-                    Job.plugin_id == plugin_id,
-                    Job.session_id == session_id,
-                )
-                .count()
+            has_remaining_jobs = session.scalar(
+                self._has_jobs(plugin_id, session_id)  # type: ignore
             )
-            if remaining_jobs == 0:
-                self.scheduler.remove_job(scheduler_job_id)
-                self._active_job_cache.pop(scheduler_job_id)
-
-                # remove handler for this logger
-                logger = logging.getLogger(scheduler_job_id)
-                if self.log_handler:
-                    logger.removeHandler(self.log_handler)
+            session.commit()
+            self.lookup_cache.invalidate_jobs(f"{plugin_id}/{session_id}")
+            if not has_remaining_jobs:
+                self.last_job_removed(f"{plugin_id}/{session_id}")
 
     def activate_job(self, job_id: int):
         with Session(self.db_engine) as session:
@@ -292,24 +809,13 @@ class PluginManager:
             if not job:
                 return
 
-            # Deactivate other active jobs for the same user/plugin
-            session.execute(
-                update(Job)
-                .where(
-                    Job.active == 1,
-                    Job.plugin_id == job.plugin_id,
-                    Job.session_id == job.session_id,
-                )
-                .values(active=0)
-            )
-
+            session.execute(self._deactivate_others(job))
             job.active = 1  # type: ignore
+            self.publish_jobs(session, job)
             session.commit()
 
             # this is active config
-            scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
-            self._active_job_cache[scheduler_job_id] = str(job.config)
-            self.scheduler.resume_job(scheduler_job_id)
+            self.job_activated(job)
 
     def deactivate_job(self, job_id: int):
         with Session(self.db_engine) as session:
@@ -317,41 +823,290 @@ class PluginManager:
             if not job:
                 return
 
-            # so no config is active
-            if bool(job.active):
-                scheduler_job_id = f"{job.plugin_id}/{job.session_id}"
-                self._active_job_cache.pop(scheduler_job_id)
-                self.scheduler.pause_job(scheduler_job_id)
-
+            was_active = bool(job.active)
             job.active = 0  # type: ignore
+            self.publish_jobs(session, job)
             session.commit()
 
+            # so no config is active
+            if was_active:
+                self.job_deactivated(job)
+
+    # bulk mutations for many sessions of one plugin, see `BulkJobs`
+
+    def add_jobs(
+        self,
+        plugin_id: int,
+        configs: Dict[int, str],
+        description: Optional[str] = None,
+        active: bool = True,
+    ) -> BulkResults:
+        """A new job per session id with its config JSON, the active one if `active`."""
+        return self.bulk_jobs.add(plugin_id, configs, description, active)
+
+    def update_jobs(
+        self, plugin_id: int, configs: Dict[int, str], description: Optional[str] = None
+    ) -> BulkResults:
+        """Set the config of the active job of each session id."""
+        return self.bulk_jobs.update(plugin_id, configs, description)
+
+    def set_jobs_active(self, plugin_id: int, session_ids: List[int], active: bool) -> BulkResults:
+        """
+        Activate a config of each session id (the newest, unless one is active already), or
+        deactivate the active one.
+        """
+        return self.bulk_jobs.set_active(plugin_id, session_ids, active)
+
+    # lookups read through `lookup_cache`
+
     def get_jobs_for_plugin_and_user(self, plugin_id: int, session_id: int):
-        with Session(self.db_engine) as session:
-            jobs = (
-                session.query(Job)
-                .filter(
-                    Job.plugin_id == plugin_id,
-                    Job.session_id == session_id,
-                )
-                .all()
-            )
-            return jobs
+        scheduler_job_id = f"{plugin_id}/{session_id}"
+        jobs = self.lookup_cache.get_jobs(scheduler_job_id)
+        if jobs is None:
+            generation = self.lookup_cache.generation
+            with Session(self.db_engine) as session:
+                jobs = list(session.scalars(self._jobs_for_plugin_and_user(plugin_id, session_id)))
+            self.lookup_cache.set_jobs(scheduler_job_id, jobs, generation)
+        return jobs
 
     def get_plugin_by_id(self, id: int):
-        with Session(self.db_engine) as session:
-            return session.get(Plugin, id)
+        plugin = self.lookup_cache.get_plugin(id)
+        if plugin is None:
+            # the plugins table is small, (re)load all of it
+            plugin = next((plugin for plugin in self.get_all_plugins() if plugin.id == id), None)
+        return plugin
 
     def get_job_by_id(self, id: int):
-        with Session(self.db_engine) as session:
-            return session.get(Job, id)
+        job = self.lookup_cache.get_job(id)
+        if job is None:
+            generation = self.lookup_cache.generation
+            with Session(self.db_engine) as session:
+                job = session.get(Job, id)
+            if job is not None:
+                self.lookup_cache.set_job(job, generation)
+        return job
 
     def get_all_plugins(self):
-        with Session(self.db_engine) as session:
-            plugins = session.query(Plugin).all()
-            return plugins
+        plugins = self.lookup_cache.get_plugins()
+        if plugins is None:
+            generation = self.lookup_cache.generation
+            with Session(self.db_engine) as session:
+                plugins = list(session.scalars(select(Plugin)))
+            self.lookup_cache.set_plugins(plugins, generation)
+        return plugins
 
     def get_all_jobs(self):
         with Session(self.db_engine) as session:
             jobs = session.query(Job).all()
             return jobs
+
+    def get_runs(
+        self,
+        plugin_id: Optional[int] = None,
+        session_id: Optional[int] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        limit: int = 100,
+    ):
+        """
+        Runs newest first. Keyset paginated: pass the id of the last run of a page as `cursor`
+        to get the next one.
+        """
+        query = runs_query(plugin_id, session_id, status, since, cursor, limit)
+        with Session(self.db_engine) as session:
+            return session.scalars(query).all()
+
+    def get_run_result(self, run_id: int) -> Optional[Tuple[str, ResultBlob]]:
+        """Format of a run's stored result and a file reading it in chunks, None if none."""
+        with Session(self.db_engine) as session:
+            row = session.execute(run_result_query(run_id)).first()
+        return open_run_result(self.db_engine, run_id, row)
+
+    # ---- async API for the endpoints, on `async_db_engine` ----
+
+    @_async_db("add_plugin")
+    async def add_plugin_async(
+        self,
+        package: str,
+        interval: int,
+        description: Optional[str] = None,
+        executor: Optional[str] = None,
+    ) -> int:
+        async with self.async_session() as session:
+            plugin = Plugin(
+                package=package, interval=interval, description=description, executor=executor
+            )
+            session.add(plugin)
+            self.lookup_cache.publish(session, "plugins")
+            await session.commit()
+            self.lookup_cache.invalidate_plugins()
+            return int(plugin.id)  # type: ignore
+
+    @_async_db("add_job", mutation=True)
+    async def add_job_async(
+        self,
+        session_id: int,
+        plugin_id: int,
+        config: str,
+        description: Optional[str] = None,
+    ):
+        async with self.async_session() as session:
+            job = Job(
+                session_id=session_id,
+                plugin_id=plugin_id,
+                config=config,
+                active=0,
+                description=description,
+            )
+            session.add(job)
+            self.lookup_cache.publish(session, "jobs", f"{plugin_id}/{session_id}")
+            await session.commit()
+            self.lookup_cache.invalidate_jobs(f"{plugin_id}/{session_id}")
+
+            plugin = await session.get(Plugin, plugin_id)
+            assert plugin is not None
+            self.add_job_instance(job, plugin)
+
+    @_async_db("update_job", mutation=True)
+    async def update_job_async(self, id: int, config: str, description: Optional[str] = None):
+        async with self.async_session() as session:
+            job = await session.get(Job, id)
+            if job:
+                job.config = config  # type: ignore
+                if description:
+                    job.description = description  # type: ignore
+                self.publish_jobs(session, job)
+                await session.commit()
+                self.job_config_updated(job)
+
+    @_async_db("remove_job", mutation=True)
+    async def remove_job_async(self, job_id: int):
+        async with self.async_session() as session:
+            job = await session.get(Job, job_id)
+            if not job:
+                return
+            plugin_id = job.plugin_id
+            session_id = job.session_id
+            self.publish_jobs(session, job)
+            await session.delete(job)
+            await session.flush()
+
+            has_remaining_jobs = await session.scalar(
+                self._has_jobs(plugin_id, session_id)  # type: ignore
+            )
+            await session.commit()
+            self.lookup_cache.invalidate_jobs(f"{plugin_id}/{session_id}")
+            if not has_remaining_jobs:
+                self.last_job_removed(f"{plugin_id}/{session_id}")
+
+    @_async_db("activate_job", mutation=True)
+    async def activate_job_async(self, job_id: int):
+        async with self.async_session() as session:
+            job = await session.get(Job, job_id)
+            if not job:
+                return
+
+            await session.execute(self._deactivate_others(job))
+            job.active = 1  # type: ignore
+            self.publish_jobs(session, job)
+            await session.commit()
+            self.job_activated(job)
+
+    @_async_db("deactivate_job", mutation=True)
+    async def deactivate_job_async(self, job_id: int):
+        async with self.async_session() as session:
+            job = await session.get(Job, job_id)
+            if not job:
+                return
+
+            was_active = bool(job.active)
+            job.active = 0  # type: ignore
+            self.publish_jobs(session, job)
+            await session.commit()
+            if was_active:
+                self.job_deactivated(job)
+
+    @_async_db("add_jobs", mutation=True)
+    async def add_jobs_async(
+        self,
+        plugin_id: int,
+        configs: Dict[int, str],
+        description: Optional[str] = None,
+        active: bool = True,
+    ) -> BulkResults:
+        return await self.bulk_jobs.add_async(plugin_id, configs, description, active)
+
+    @_async_db("update_jobs", mutation=True)
+    async def update_jobs_async(
+        self, plugin_id: int, configs: Dict[int, str], description: Optional[str] = None
+    ) -> BulkResults:
+        return await self.bulk_jobs.update_async(plugin_id, configs, description)
+
+    @_async_db("set_jobs_active", mutation=True)
+    async def set_jobs_active_async(
+        self, plugin_id: int, session_ids: List[int], active: bool
+    ) -> BulkResults:
+        return await self.bulk_jobs.set_active_async(plugin_id, session_ids, active)
+
+    @_async_db("get_jobs_for_plugin_and_user")
+    async def get_jobs_for_plugin_and_user_async(self, plugin_id: int, session_id: int):
+        scheduler_job_id = f"{plugin_id}/{session_id}"
+        jobs = self.lookup_cache.get_jobs(scheduler_job_id)
+        if jobs is None:
+            generation = self.lookup_cache.generation
+            async with self.async_session() as session:
+                jobs = list(
+                    await session.scalars(self._jobs_for_plugin_and_user(plugin_id, session_id))
+                )
+            self.lookup_cache.set_jobs(scheduler_job_id, jobs, generation)
+        return jobs
+
+    @_async_db("get_plugin_by_id")
+    async def get_plugin_by_id_async(self, id: int):
+        plugin = self.lookup_cache.get_plugin(id)
+        if plugin is None:
+            plugins = await self.get_all_plugins_async()
+            plugin = next((plugin for plugin in plugins if plugin.id == id), None)
+        return plugin
+
+    @_async_db("get_job_by_id")
+    async def get_job_by_id_async(self, id: int):
+        job = self.lookup_cache.get_job(id)
+        if job is None:
+            generation = self.lookup_cache.generation
+            async with self.async_session() as session:
+                job = await session.get(Job, id)
+            if job is not None:
+                self.lookup_cache.set_job(job, generation)
+        return job
+
+    @_async_db("get_all_plugins")
+    async def get_all_plugins_async(self):
+        plugins = self.lookup_cache.get_plugins()
+        if plugins is None:
+            generation = self.lookup_cache.generation
+            async with self.async_session() as session:
+                plugins = list(await session.scalars(select(Plugin)))
+            self.lookup_cache.set_plugins(plugins, generation)
+        return plugins
+
+    @_async_db("get_runs")
+    async def get_runs_async(
+        self,
+        plugin_id: Optional[int] = None,
+        session_id: Optional[int] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        limit: int = 100,
+    ):
+        query = runs_query(plugin_id, session_id, status, since, cursor, limit)
+        async with self.async_session() as session:
+            return list(await session.scalars(query))
+
+    @_async_db("get_run_result")
+    async def get_run_result_async(self, run_id: int) -> Optional[Tuple[str, ResultBlob]]:
+        async with self.async_session() as session:
+            row = (await session.execute(run_result_query(run_id))).first()
+        return open_run_result(self.db_engine, run_id, row)
@@ -0,0 +1,470 @@
+import asyncio
+import enum
+import functools
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pluggy
+from pydantic import BaseModel
+
+from executors import RunBatcher, RunLimiter
+from profiling import RunHooks, RunProfiler, RunStats
+from result_cache import ResultCache
+
+# same project name as the plugin hookspecs of `plugin_manager`
+hookspec = pluggy.HookspecMarker("job-scheduler")
+
+
+class RunSpec:
+    """
+    Hooks around every run, for instrumentation rather than plugins: register implementations
+    with `PluginRunner.register_run_hooks`. They are called in the thread (or on the loop) of
+    the run. Runs in the process pool and `run_batch` calls are not covered.
+    """
+
+    @hookspec
+    def pre_run(self, scheduler_job_id: str, package: str) -> None: ...
+
+    # stats: the run's `profiling.RunStats`, error: the exception it raised or None
+    @hookspec
+    def post_run(
+        self,
+        scheduler_job_id: str,
+        package: str,
+        stats: RunStats,
+        error: Optional[BaseException],
+    ) -> None: ...
+
+
+# field values that a shallow model copy can safely share between runs
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None), tuple, frozenset, enum.Enum)
+
+
+@functools.lru_cache(maxsize=None)
+def _frozen_model_class(model_class: type[BaseModel]) -> type[BaseModel]:
+    return type(
+        model_class.__name__,
+        (model_class,),
+        {
+            "__module__": model_class.__module__,
+            "model_config": {**model_class.model_config, "frozen": True},
+        },
+    )
+
+
+class ActiveConfig:
+    """
+    Active config of a scheduler job. The JSON is parsed and validated once per version
+    and plugin class, then every run gets a cheap copy of the validated model.
+    """
+
+    __slots__ = (
+        "config",
+        "job_id",
+        "version",
+        "model",
+        "owner",
+        "shallow_copy",
+        "frozen",
+        "digest",
+    )
+
+    _versions = itertools.count(1)
+
+    def __init__(self, config: str, job_id: Optional[int] = None):
+        self.config = config
+        self.job_id = job_id
+        self.version = next(self._versions)
+        self.model: Optional[BaseModel] = None
+        # plugin class the model was validated with, a reloaded class validates again
+        self.owner: Any = None
+        self.shallow_copy = False
+        self.frozen: Optional[BaseModel] = None
+        self.digest: Optional[str] = None
+
+    def invalidate(self):
+        self.model = None
+        self.owner = None
+        self.frozen = None
+        self.digest = None
+
+    def validated(self, plugin) -> BaseModel:
+        """
+        Config model for a run of `plugin`: a fresh copy by default, or one shared frozen
+        instance when the plugin sets `shared_config = True`.
+        """
+        model = self.model
+        if model is None or self.owner is not plugin:
+            model = plugin.config(json.loads(self.config))
+            self.shallow_copy = all(
+                isinstance(value, _IMMUTABLE_TYPES) for value in model.__dict__.values()
+            )
+            self.frozen = None
+            self.digest = None
+            self.model, self.owner = model, plugin
+
+        if getattr(plugin, "shared_config", False):
+            if self.frozen is None:
+                values = model.model_copy(deep=True).__dict__
+                self.frozen = _frozen_model_class(type(model)).model_construct(
+                    model.model_fields_set, **values
+                )
+            return self.frozen
+
+        return model.model_copy(deep=not self.shallow_copy)
+
+    def fingerprint(self, plugin) -> str:
+        """Hash of the validated config, equal for configs that validate to the same values."""
+        if self.model is None or self.owner is not plugin:
+            self.validated(plugin)
+        if self.digest is None:
+            canonical = self.model.model_dump_json().encode()  # type: ignore
+            self.digest = hashlib.blake2b(canonical, digest_size=16).hexdigest()
+        return self.digest
+
+
+class LazyPlugin:
+    """
+    Registered in place of a plugin class that has not been imported yet. The class is
+    imported on first attribute access (`schema`, `config`, `run`, ...) or `resolve()`, and
+    `on_import(package)` is called once it is.
+    """
+
+    def __init__(self, package: str, on_import: Optional[Callable[[str], Any]] = None):
+        self.package = package
+        self.plugin: Any = None
+        self.import_seconds: Optional[float] = None
+        self._on_import = on_import
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.plugin is not None
+
+    def resolve(self):
+        if self.plugin is None:
+            with self._lock:
+                if self.plugin is None:
+                    start = time.perf_counter()
+                    module_path, _, class_name = self.package.rpartition(".")
+                    module = importlib.import_module(module_path)
+                    self.plugin = getattr(module, class_name)
+                    self.import_seconds = time.perf_counter() - start
+                    if self._on_import:
+                        self._on_import(self.package)
+        return self.plugin
+
+    def peek(self, name: str, default: Any = None) -> Any:
+        """Attribute of the plugin class if it is imported already, else `default`."""
+        return getattr(self.plugin, name, default) if self.plugin is not None else default
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+
+def declared(plugin, name: str) -> Any:
+    """Class attribute `name` of a registered plugin, None while a lazy one is not imported."""
+    if isinstance(plugin, LazyPlugin):
+        return plugin.peek(name)
+    return getattr(plugin, name, None)
+
+
+class PluginRunner:
+    """
+    Runs the ticks of one node's jobs, with the active config of each job, the per-plugin run
+    limits, `run_batch` batches and shared results. Each `PluginManager` has its own, and so
+    does each process pool worker. Scheduler jobs reach it through `run_job` and friends,
+    by `name`, so they keep a textual reference that persistent jobstores can store.
+    """
+
+    def __init__(
+        self,
+        plugins: pluggy.PluginManager,
+        name: Optional[str] = None,
+        swap_lock: Optional[threading.Lock] = None,
+        version_lookup: Optional[Callable[[str], int]] = None,
+        max_runs_per_plugin: Optional[int] = None,
+        batch_window: float = 0.2,
+        result_cache: Optional[ResultCache] = None,
+    ):
+        # the registered plugin classes, shared by every runner of the process
+        self.plugins = plugins
+        self.name = name or uuid.uuid4().hex
+        _runners[self.name] = self
+        # held while a reloaded plugin class replaces the registered one
+        self.swap_lock = swap_lock or threading.Lock()
+        self.version_lookup = version_lookup
+        # active configs, keyed by scheduler job id
+        self.active_configs: Dict[str, ActiveConfig] = {}
+        # when the current run of each scheduler job started
+        self.run_started: Dict[str, float] = {}
+        # package -> interval of its jobs, the lifetime of its cached results
+        self.plugin_intervals: Dict[str, float] = {}
+        # bounds concurrent runs per plugin, `max_concurrent_runs` overrides it per plugin
+        self.limiter = RunLimiter()
+        self.max_runs_per_plugin = max_runs_per_plugin
+        # groups the ticks of plugins that implement `run_batch`
+        self.batcher = RunBatcher(batch_window)
+        # package -> placement of its `run_batch` calls
+        self.batch_placements: Dict[str, str] = {}
+        # set once a job is placed in the process pool
+        self.process_executor: Any = None
+        # results shared by identical runs of plugins declaring `cache_results`
+        self.result_cache = result_cache or ResultCache()
+        # pre_run/post_run hooks, only called while one is registered or a profile is armed
+        self.run_hooks = pluggy.PluginManager("job-scheduler")
+        self.run_hooks.add_hookspecs(RunSpec)
+        self.profiler = RunProfiler()
+        self.run_hooks.register(self.profiler, "profiler")
+        self._run_hook_count = 0
+
+    def active_config_json(self, scheduler_job_id: str) -> Optional[str]:
+        entry = self.active_configs.get(scheduler_job_id)
+        return entry.config if entry else None
+
+    def invalidate_config_models(self):
+        """Drop validated config models, they are rebuilt lazily on the next run."""
+        for entry in list(self.active_configs.values()):
+            entry.invalidate()
+
+    def register_run_hooks(self, hooks: Any, name: Optional[str] = None):
+        """Register an implementation of `RunSpec`'s `pre_run`/`post_run` hooks."""
+        self.run_hooks.register(hooks, name)
+        self._run_hook_count += 1
+
+    def unregister_run_hooks(self, hooks: Any):
+        if self.run_hooks.unregister(hooks) is not None:
+            self._run_hook_count -= 1
+
+    def _hooked(self) -> bool:
+        return bool(self._run_hook_count or self.profiler.armed)
+
+    def run_limit(self, package: str) -> Optional[int]:
+        limit = declared(self.plugins.get_plugin(package), "max_concurrent_runs")
+        return limit or self.max_runs_per_plugin
+
+    def prepare_run(self, package: str, scheduler_job_id: str):
+        plugin = self.plugins.get_plugin(package)
+        if plugin is None:
+            # may be mid-swap by a reload
+            with self.swap_lock:
+                plugin = self.plugins.get_plugin(package)
+        if plugin is None:
+            return None
+        if isinstance(plugin, LazyPlugin):
+            plugin = plugin.resolve()
+
+        job_config = self.active_configs.get(scheduler_job_id)
+
+        if job_config is None:
+            # No active job means no config to run this plugin instance for this user
+            return None
+
+        config = job_config.validated(plugin)
+
+        logger = logging.getLogger(scheduler_job_id)
+
+        return plugin, config, logger
+
+    def run(self, package: str, scheduler_job_id: str):
+        """
+        Run function of the scheduler jobs: runs a plugin's 'run' method synchronously, with
+        the config of the job's active config.
+        """
+        prepared = self.prepare_run(package, scheduler_job_id)
+        if prepared is None:
+            return None
+
+        run = functools.partial(self._run_sync, package, scheduler_job_id, *prepared)
+        cached = self.result_key(package, scheduler_job_id, prepared[0])
+        if cached is None:
+            return run()
+        return self.result_cache.get_or_run(*cached, run)
+
+    def _run_sync(self, package: str, scheduler_job_id: str, plugin, config, logger):
+        # the run limit was checked before the run got a thread, see `LimitedThreadExecutor`
+        self.run_started[scheduler_job_id] = time.time()
+        if self._hooked():
+            with RunHooks(self.run_hooks.hook, scheduler_job_id, package):
+                return self._call_run(plugin, config, logger)
+        return self._call_run(plugin, config, logger)
+
+    @staticmethod
+    def _call_run(plugin, config, logger):
+        result = plugin.run(config, logger)
+        if inspect.iscoroutine(result):
+            return asyncio.run(result)
+        return result
+
+    async def run_async(self, package: str, scheduler_job_id: str):
+        """
+        Native coroutine version of `run`, awaited on a long-lived event loop. Sync 'run'
+        methods are offloaded to the loop's default thread pool.
+        """
+        plugin = self.plugins.get_plugin(package)
+        if isinstance(plugin, LazyPlugin) and not plugin.loaded:
+            # first run imports the plugin, not on the event loop
+            await asyncio.to_thread(plugin.resolve)
+
+        prepared = self.prepare_run(package, scheduler_job_id)
+        if prepared is None:
+            return None
+
+        run = functools.partial(self._run_limited_async, package, scheduler_job_id, *prepared)
+        cached = self.result_key(package, scheduler_job_id, prepared[0])
+        if cached is None:
+            return await run()
+        return await self.result_cache.get_or_run_async(*cached, run)
+
+    async def _run_limited_async(self, package: str, scheduler_job_id: str, plugin, config, logger):
+        limit = self.run_limit(package)
+        await self.limiter.acquire_async(package, limit)
+        try:
+            self.run_started[scheduler_job_id] = time.time()
+            if not inspect.iscoroutinefunction(plugin.run):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    None, self._call_run_hooked, package, scheduler_job_id, plugin, config, logger
+                )
+            if self._hooked():
+                with RunHooks(self.run_hooks.hook, scheduler_job_id, package):
+                    return await plugin.run(config, logger)
+            return await plugin.run(config, logger)
+        finally:
+            self.limiter.release(package, limit)
+
+    def _call_run_hooked(self, package: str, scheduler_job_id: str, plugin, config, logger):
+        # sync `run` offloaded from a loop, the hooks run in its thread
+        if self._hooked():
+            with RunHooks(self.run_hooks.hook, scheduler_job_id, package):
+                return plugin.run(config, logger)
+        return plugin.run(config, logger)
+
+    def result_key(self, package: str, scheduler_job_id: str, plugin) -> Optional[Tuple]:
+        """
+        Cache key and expiry of the current run's result, or None when the plugin does not
+        declare `cache_results`. Runs of the same plugin version with configs that validate
+        to the same values share a result within each interval of the plugin's jobs (or of
+        `cache_results` seconds, when it is a number).
+        """
+        setting = getattr(plugin, "cache_results", None)
+        if not setting:
+            return None
+        period = self.plugin_intervals.get(package) if setting is True else float(setting)
+        entry = self.active_configs.get(scheduler_job_id)
+        if not period or entry is None:
+            return None
+
+        bucket = int(time.time() // period)
+        version = self.version_lookup(package) if self.version_lookup else 0
+        key = (package, version, entry.fingerprint(plugin), bucket)
+        return key, (bucket + 1) * period
+
+    async def run_batched(self, package: str, scheduler_job_id: str):
+        """
+        Run function of the jobs of plugins implementing `run_batch`. The ticks of the plugin
+        that come due within the batch window share one `run_batch` call, placed where the
+        plugin's runs would be, and each job gets its own result (or error) back.
+        """
+        max_size = declared(self.plugins.get_plugin(package), "max_batch_size")
+        return await self.batcher.submit(
+            package, scheduler_job_id, functools.partial(self._run_batch, package), max_size
+        )
+
+    async def _run_batch(self, package: str, scheduler_job_ids: list[str]) -> list[Any]:
+        placement = self.batch_placements.get(package, "thread")
+        if placement == "process" and self.process_executor is not None:
+            future = self.process_executor.submit_batch(package, scheduler_job_ids)
+            return await asyncio.wrap_future(future)
+        if placement == "async":
+            return await self.run_batch_async(package, scheduler_job_ids)
+        return await asyncio.to_thread(self.run_batch, package, scheduler_job_ids)
+
+    def _prepare_batch(self, package: str, scheduler_job_ids: list[str]):
+        """
+        Results to fill in, initially None for jobs without an active config and the error
+        for jobs whose config does not validate, plus the plugin, the indexes of the jobs to
+        run, and their configs and loggers.
+        """
+        results: list[Any] = [None] * len(scheduler_job_ids)
+        plugin = None
+        members, configs, loggers = [], [], []
+        for i, scheduler_job_id in enumerate(scheduler_job_ids):
+            try:
+                prepared = self.prepare_run(package, scheduler_job_id)
+            except Exception as e:
+                results[i] = e
+                continue
+            if prepared is not None:
+                self.run_started[scheduler_job_id] = time.time()
+                plugin = prepared[0]
+                members.append(i)
+                configs.append(prepared[1])
+                loggers.append(prepared[2])
+        return results, plugin, members, configs, loggers
+
+    @staticmethod
+    def _fan_out(package: str, results: list[Any], members: list[int], batch) -> list[Any]:
+        batch = list(batch)
+        if len(batch) != len(members):
+            raise ValueError(
+                f"run_batch of {package} returned {len(batch)} results for {len(members)} configs"
+            )
+        for i, result in zip(members, batch):
+            results[i] = result
+        return results
+
+    def run_batch(self, package: str, scheduler_job_ids: list[str]) -> list[Any]:
+        """One `run_batch` call for the jobs `scheduler_job_ids`, returning a result per job."""
+        results, plugin, members, configs, loggers = self._prepare_batch(package, scheduler_job_ids)
+        if not members:
+            return results
+
+        batch = plugin.run_batch(configs, loggers)
+        if inspect.iscoroutine(batch):
+            batch = asyncio.run(batch)
+        return self._fan_out(package, results, members, batch)
+
+    async def run_batch_async(self, package: str, scheduler_job_ids: list[str]) -> list[Any]:
+        plugin = self.plugins.get_plugin(package)
+        if isinstance(plugin, LazyPlugin) and not plugin.loaded:
+            await asyncio.to_thread(plugin.resolve)
+
+        results, plugin, members, configs, loggers = self._prepare_batch(package, scheduler_job_ids)
+        if not members:
+            return results
+
+        if inspect.iscoroutinefunction(plugin.run_batch):
+            batch = await plugin.run_batch(configs, loggers)
+        else:
+            loop = asyncio.get_running_loop()
+            batch = await loop.run_in_executor(None, plugin.run_batch, configs, loggers)
+        return self._fan_out(package, results, members, batch)
+
+
+# runner name -> runner, for the run functions below
+_runners: "weakref.WeakValueDictionary[str, PluginRunner]" = weakref.WeakValueDictionary()
+
+
+def run_job(package: str, scheduler_job_id: str, runner: str):
+    """Run function of the jobs in the thread pool, on the run state of runner `runner`."""
+    return _runners[runner].run(package, scheduler_job_id)
+
+
+async def run_job_async(package: str, scheduler_job_id: str, runner: str):
+    return await _runners[runner].run_async(package, scheduler_job_id)
+
+
+async def run_job_batched(package: str, scheduler_job_id: str, runner: str):
+    return await _runners[runner].run_batched(package, scheduler_job_id)
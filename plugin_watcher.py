@@ -0,0 +1,184 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+if TYPE_CHECKING:
+    from plugin_manager import PluginManager
+
+try:
+    import watchfiles
+except ImportError:  # mtime polling only
+    watchfiles = None
+
+logger = logging.getLogger(__name__)
+
+WATCH_BACKENDS = ("auto", "watchfiles", "poll")
+
+
+def _python_filter(change, path: str) -> bool:
+    return path.endswith(".py")
+
+
+class PluginWatcher:
+    """
+    Watches plugin sources under `paths` and reloads the plugins whose files changed (see
+    `PluginManager.reload_plugin`). New folders are checked against the `plugins` rows, so a
+    deployed `name@vX_Y_Z` folder whose row could not be imported so far is loaded.
+
+    With watchfiles installed (inotify on Linux) the thread sleeps until the kernel reports a
+    change. The "poll" backend only stats what can matter every `poll_interval` seconds: the
+    files of loaded plugin modules, their package directories, and the directories holding
+    them. A new or removed file shows up in its directory's mtime, so large directories are
+    never listed. Bursts of changes are handled together once quiet for `debounce` seconds.
+    """
+
+    def __init__(
+        self,
+        plugin_manager: "PluginManager",
+        paths: Iterable[str],
+        backend: str = "auto",
+        debounce: float = 0.5,
+        poll_interval: float = 1.0,
+    ):
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"Unknown watch backend: {backend}")
+        if backend == "watchfiles" and watchfiles is None:
+            raise ValueError("watchfiles is not installed")
+
+        self.plugin_manager = plugin_manager
+        self.paths = [os.path.abspath(path) for path in paths if path]
+        self.backend = "poll" if backend == "auto" and watchfiles is None else backend
+        if self.backend == "auto":
+            self.backend = "watchfiles"
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+        # path -> st_mtime_ns when last seen ("poll" backend)
+        self._mtimes: Dict[str, int] = {}
+        self.reloads = 0
+        self.registered = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            target = self._run_watchfiles if self.backend == "watchfiles" else self._run_polling
+            self._thread = threading.Thread(target=target, name="plugin-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    # ---- backends ----
+
+    def _run_watchfiles(self):
+        paths = [path for path in self.paths if os.path.isdir(path)]
+        if not paths:
+            return
+        for changes in watchfiles.watch(  # type: ignore
+            *paths,
+            watch_filter=_python_filter,
+            debounce=int(self.debounce * 1000),
+            stop_event=self._stopping,
+        ):
+            self._handle({path for _, path in changes})
+
+    def _run_polling(self):
+        self._snapshot()
+        pending: Set[str] = set()
+        quiet_since = 0.0
+        while not self._stopping.wait(self.poll_interval):
+            changed = self._scan()
+            now = time.monotonic()
+            if changed:
+                pending |= changed
+                quiet_since = now
+            elif pending and now - quiet_since >= self.debounce:
+                self._handle(pending)
+                pending = set()
+
+    # ---- what to stat ----
+
+    def _plugin_roots(self) -> Dict[str, List[str]]:
+        """Package -> source files, or package directories, of every imported plugin."""
+        roots: Dict[str, List[str]] = {}
+        for package in self.plugin_manager.get_plugin_names():
+            module = sys.modules.get(package.rpartition(".")[0])
+            if module is None:
+                continue
+            if hasattr(module, "__path__"):
+                roots[package] = [os.path.abspath(path) for path in module.__path__]
+            elif getattr(module, "__file__", None):
+                roots[package] = [os.path.abspath(module.__file__)]  # type: ignore
+        return roots
+
+    def _watched(self) -> Set[str]:
+        watched: Set[str] = set(self.paths)
+        for package, roots in self._plugin_roots().items():
+            for root in roots:
+                # new versions appear next to the current one
+                watched.add(os.path.dirname(root))
+                watched.add(root)
+            for name in self.plugin_manager.plugin_modules(package):
+                path = getattr(sys.modules.get(name), "__file__", None)
+                if path:
+                    watched.add(os.path.abspath(path))
+                    watched.add(os.path.dirname(os.path.abspath(path)))
+        return {path for path in watched if any(path.startswith(root) for root in self.paths)}
+
+    @staticmethod
+    def _mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return -1
+
+    def _snapshot(self):
+        self._mtimes = {path: self._mtime(path) for path in self._watched()}
+
+    def _scan(self) -> Set[str]:
+        changed = set()
+        for path, mtime in self._mtimes.items():
+            current = self._mtime(path)
+            if current != mtime:
+                self._mtimes[path] = current
+                changed.add(path)
+        return changed
+
+    # ---- reacting ----
+
+    def _packages_for(self, paths: Set[str]) -> Set[str]:
+        packages = set()
+        for package, roots in self._plugin_roots().items():
+            for root in roots:
+                if any(path == root or path.startswith(root + os.sep) for path in paths):
+                    packages.add(package)
+        return packages
+
+    def _handle(self, paths: Set[str]):
+        # directory listings cached by the import system are stale now
+        importlib.invalidate_caches()
+        try:
+            packages = self._packages_for(paths)
+            if packages:
+                results = self.plugin_manager.reload_plugins(sorted(packages))
+                self.reloads += sum(1 for result in results.values() if result["success"])
+                logger.info(f"Reloaded changed plugins: {results}")
+
+            registered = self.plugin_manager.load_missing_plugins()
+            if registered:
+                self.registered += len(registered)
+                logger.info(f"Registered new plugin versions: {registered}")
+        except Exception as e:
+            logger.error(e, exc_info=True)
+
+        if self.backend == "poll":
+            self._snapshot()
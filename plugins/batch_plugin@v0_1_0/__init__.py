@@ -0,0 +1,3 @@
+from .plugin import Plugin
+
+__all__ = ["Plugin"]
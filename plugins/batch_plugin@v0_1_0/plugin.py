@@ -0,0 +1,56 @@
+import logging
+import pluggy
+from pydantic import BaseModel
+
+PROJECT_NAME = "alpha-miner"
+
+hookimpl = pluggy.HookimplMarker(PROJECT_NAME)
+
+
+class Config(BaseModel):
+    version: str = "1.0"
+    symbols: str = ",".join(["BTC", "ETH", "SOL", "LINK"])
+
+
+class Plugin:
+    # pandas + DuckDB number crunching, keep it off the server's GIL
+    executor = "process"
+
+    @hookimpl
+    @classmethod
+    def schema(cls):
+        return Config.model_json_schema()
+
+    @hookimpl
+    @classmethod
+    def config(cls, json=None):
+        return Config.model_validate(json or {})
+
+    @hookimpl
+    @classmethod
+    async def run(cls, config: Config, logger: logging.Logger):
+        from plugins.indicators import job_state
+        from plugins.signals import create_signals, signal_state
+
+        logger.debug(f"running with config: {config}")
+        symbols = [s.strip() for s in config.symbols.split(",")]
+        return create_signals(symbols, state=job_state(logger.name, signal_state))
+
+    @hookimpl
+    @classmethod
+    async def run_batch(cls, configs: list[Config], loggers: list[logging.Logger]):
+        from plugins.indicators import job_state
+        from plugins.signals import create_signals, signal_state
+
+        # a symbol's signal does not depend on the others, so one call covers every session
+        symbols = []
+        for config, logger in zip(configs, loggers):
+            logger.debug(f"running with config: {config}")
+            symbols.append([s.strip() for s in config.symbols.split(",")])
+        signals = create_signals(
+            list(dict.fromkeys(s for group in symbols for s in group)),
+            state=job_state(f"{__name__}:batch", signal_state),
+        )
+        if signals.empty:
+            return [signals] * len(configs)
+        return [signals[signals["symbol"].isin(group)].reset_index(drop=True) for group in symbols]
@@ -0,0 +1,197 @@
+"""
+Incremental indicators for plugins: rolling state per symbol in NumPy ring buffers, updated
+in O(1) per new bar instead of recomputing the whole window every run.
+
+Keep the state of a scheduler job between its runs with `job_state(logger.name, factory)`.
+The job logger handed to `run` is named after the scheduler job id.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+# running sums are recomputed from the buffer this often, so float error does not build up
+RESYNC_EVERY = 1024
+
+T = TypeVar("T")
+
+
+class RollingMeans:
+    """
+    Means over the last `windows` values of many series (one per key, e.g. a symbol). Every
+    series keeps its last `max(windows)` values in a row of one ring buffer, plus a running
+    sum per window. `push` adds one value to each of the given series at once. Until a series
+    has `window` values, its mean is over the values it has, like SQL's
+    `AVG(...) OVER (ROWS BETWEEN window - 1 PRECEDING AND CURRENT ROW)`.
+
+    With `scale`, values are fixed point (prices in cents: `scale=100`) and kept as int64, so
+    sums are exact and `compare` tells equal means apart from almost equal ones. Otherwise
+    sums are floats, recomputed from the buffer every `RESYNC_EVERY` values.
+    """
+
+    def __init__(self, windows: Sequence[int], scale: Optional[int] = None):
+        self.windows = np.array(sorted(set(windows)), dtype=np.int64)
+        self.capacity = int(self.windows.max())
+        self.scale = scale
+        self._dtype = np.int64 if scale else np.float64
+        self._rows: Dict[str, int] = {}
+        self._buffer = np.zeros((0, self.capacity), dtype=self._dtype)
+        # values pushed so far, the next slot is `count % capacity`
+        self._count = np.zeros(0, dtype=np.int64)
+        self._sums = np.zeros((0, len(self.windows)), dtype=self._dtype)
+        # sums before the last push
+        self._previous = np.zeros((0, len(self.windows)), dtype=self._dtype)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def column(self, window: int) -> int:
+        return int(np.searchsorted(self.windows, window))
+
+    def rows(self, keys: Iterable[str]) -> np.ndarray:
+        """Row of each key, added (empty) for unknown keys."""
+        keys = list(keys)
+        new = [key for key in dict.fromkeys(keys) if key not in self._rows]
+        if new:
+            for key in new:
+                self._rows[key] = len(self._rows)
+            grow = len(new)
+            width = len(self.windows)
+            self._buffer = np.vstack(
+                [self._buffer, np.zeros((grow, self.capacity), dtype=self._dtype)]
+            )
+            self._count = np.concatenate([self._count, np.zeros(grow, dtype=np.int64)])
+            self._sums = np.vstack([self._sums, np.zeros((grow, width), dtype=self._dtype)])
+            self._previous = np.vstack([self._previous, np.zeros((grow, width), dtype=self._dtype)])
+        return np.array([self._rows[key] for key in keys], dtype=np.int64)
+
+    def push(self, rows: np.ndarray, values: np.ndarray):
+        """Append `values[i]` to the series in row `rows[i]`, each row at most once."""
+        if self.scale:
+            values = np.rint(np.asarray(values) * self.scale).astype(np.int64)
+        count = self._count[rows]
+        slot = count % self.capacity
+        self._previous[rows] = self._sums[rows]
+
+        for i, window in enumerate(self.windows):
+            # the value leaving this window, once it is full
+            leaving = self._buffer[rows, (count - window) % self.capacity]
+            self._sums[rows, i] += values - np.where(count >= window, leaving, 0)
+
+        self._buffer[rows, slot] = values
+        count = self._count[rows] = count + 1
+
+        if not self.scale:
+            resync = rows[count % RESYNC_EVERY == 0]
+            if len(resync):
+                self._resync(resync)
+
+    def _resync(self, rows: np.ndarray):
+        count = self._count[rows]
+        for i, window in enumerate(self.windows):
+            back = np.arange(1, window + 1)
+            slots = (count[:, None] - back) % self.capacity
+            self._sums[rows, i] = self._buffer[rows[:, None], slots].sum(axis=1)
+
+    def _sizes(self, rows: np.ndarray, previous: bool) -> np.ndarray:
+        # values in each window, 0 when there are none
+        count = self._count[rows] - (1 if previous else 0)
+        return np.minimum(np.maximum(count, 0)[:, None], self.windows)
+
+    def means(self, rows: np.ndarray, previous: bool = False) -> np.ndarray:
+        """(len(rows), len(windows)) means, NaN where a series has no values (yet)."""
+        sums = (self._previous if previous else self._sums)[rows]
+        sizes = self._sizes(rows, previous)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / sizes
+        if self.scale:
+            means = means / self.scale
+        return np.where(sizes > 0, means, np.nan)
+
+    def compare(self, rows: np.ndarray, a: int, b: int, previous: bool = False) -> np.ndarray:
+        """Sign of mean(window a) - mean(window b) per row, NaN without values."""
+        sums = (self._previous if previous else self._sums)[rows]
+        sizes = self._sizes(rows, previous)
+        i, j = self.column(a), self.column(b)
+        # a / n_a - b / n_b has the sign of a * n_b - b * n_a, exact for int64 sums
+        difference = sums[:, i] * sizes[:, j] - sums[:, j] * sizes[:, i]
+        return np.where(sizes[:, i] > 0, np.sign(difference), np.nan)
+
+    def state_size(self) -> int:
+        """Bytes held by the buffers."""
+        arrays = (self._buffer, self._count, self._sums, self._previous)
+        return sum(array.nbytes for array in arrays)
+
+
+class Crossover:
+    """
+    Moving-average crossover signal per key, on top of `RollingMeans((fast, slow), scale)`:
+    "BUY" when the fast mean crosses above the slow one on the last value, "SELL" when it
+    crosses below, else "HOLD".
+
+    `last_seen` keeps a marker per key (for example the day of the last bar fed), so a caller
+    can tell which bars are new on the next run.
+    """
+
+    def __init__(self, fast: int = 5, slow: int = 15, scale: Optional[int] = None):
+        self.fast = fast
+        self.slow = slow
+        self.means = RollingMeans((fast, slow), scale)
+        self.last_seen: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+
+    def push(self, keys: Sequence[str], values: np.ndarray):
+        """`values` is (len(keys), bars), oldest bar first: each row is fed in order."""
+        values = np.asarray(values)
+        rows = self.means.rows(keys)
+        for bar in range(values.shape[1]):
+            self.means.push(rows, values[:, bar])
+
+    def latest(self, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Fast means, slow means and signals of `keys` after their last value."""
+        rows = self.means.rows(keys)
+        means = self.means.means(rows)
+        now = self.means.compare(rows, self.fast, self.slow)
+        before = self.means.compare(rows, self.fast, self.slow, previous=True)
+
+        # comparisons with NaN (no previous value yet) are False, so those HOLD
+        with np.errstate(invalid="ignore"):
+            buy = (before <= 0) & (now > 0)
+            sell = (before >= 0) & (now < 0)
+        signal = np.where(buy, "BUY", np.where(sell, "SELL", "HOLD"))
+        fast = means[:, self.means.column(self.fast)]
+        slow = means[:, self.means.column(self.slow)]
+        return fast, slow, signal
+
+
+_job_states: "OrderedDict[str, Any]" = OrderedDict()
+_job_states_lock = threading.Lock()
+MAX_JOB_STATES = 10_000
+
+
+def job_state(key: str, factory: Callable[[], T]) -> T:
+    """
+    State kept between runs under `key` (a scheduler job id), created with `factory` on first
+    use. The least recently used states are dropped past `MAX_JOB_STATES`.
+    """
+    with _job_states_lock:
+        state = _job_states.get(key)
+        if state is None:
+            state = _job_states[key] = factory()
+            while len(_job_states) > MAX_JOB_STATES:
+                _job_states.popitem(last=False)
+        else:
+            _job_states.move_to_end(key)
+        return state
+
+
+def drop_job_state(key: str):
+    with _job_states_lock:
+        _job_states.pop(key, None)
+
+
+def job_state_keys() -> List[str]:
+    with _job_states_lock:
+        return list(_job_states)
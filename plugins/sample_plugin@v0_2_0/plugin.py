@@ -27,9 +27,11 @@ class Plugin:
     @hookimpl
     @classmethod
     async def run(cls, config: Config, logger: logging.Logger):
-        from .data import create_signals
+        from plugins.indicators import job_state
+        from plugins.signals import create_signals, signal_state
 
         logger.debug(f"running with config: {config}")
         symbols = [s.strip() for s in config.symbols.split(",")]
-        signals = create_signals(symbols)
+        # the job logger is named after the scheduler job, keep its averages between runs
+        signals = create_signals(symbols, state=job_state(logger.name, signal_state))
         return signals
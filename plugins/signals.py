@@ -0,0 +1,287 @@
+"""
+Generated daily price history and MA(5)/MA(15) crossover signals, shared by the plugins that
+report them (`sample_plugin@v0_2_0`, `batch_plugin@v0_1_0`). Like `plugins.indicators` it is
+not part of any one plugin version, so reloading a plugin keeps the history built so far.
+"""
+
+import threading
+import zlib
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from plugins.indicators import Crossover
+
+# --------------------------------------------------
+# Fixed "today" prices (can be adjusted anytime)
+# --------------------------------------------------
+TODAY_PRICE_MAP = {
+    "BTC": 43000.0,
+    "ETH": 2300.0,
+    "BNB": 310.0,
+    "SOL": 95.0,
+    "XRP": 0.62,
+    "ADA": 0.48,
+    "DOGE": 0.08,
+    "AVAX": 35.0,
+    "DOT": 7.2,
+    "LINK": 14.5,
+}
+
+NUM_DAYS = 60
+# bars the signal query needs per symbol: 15 for ma_15 and one more for its previous value
+SIGNAL_BARS = 16
+SEED = 42
+# prices have at most 6 decimals (see `round_prices`), the indicators keep them as integers
+PRICE_SCALE = 1_000_000
+
+
+class _Series:
+    """Daily bars of one symbol, oldest first, with the generator to extend them."""
+
+    __slots__ = ("last_day", "close", "volume", "rng")
+
+    def __init__(self, last_day: np.datetime64, close, volume, rng):
+        self.last_day = last_day
+        self.close = close
+        self.volume = volume
+        self.rng = rng
+
+
+class PriceHistory:
+    """
+    Random daily price history per symbol, kept in NumPy arrays between runs.
+
+    A symbol's first request generates `num_days` bars at once: a random walk starting from
+    its "today" price, as the cumulative product of daily factors. Later requests only append
+    the bars of days that passed since. Each symbol has its own seeded generator, so its bars
+    do not depend on which other symbols are requested with it.
+    """
+
+    def __init__(self, num_days: int = NUM_DAYS, seed: int = SEED):
+        self.num_days = num_days
+        self.seed = seed
+        self._series: Dict[str, _Series] = {}
+        self._lock = threading.Lock()
+        # incremental indicators remember which history they were fed from
+        self.token = object()
+
+    def _walk(self, rng, start_price: float, days: int):
+        # close_t = close_{t-1} * (1 - 1% noise), floored like a price
+        factors = np.maximum(1.0 - 0.01 * rng.standard_normal(days), 1e-6)
+        close = np.maximum(start_price * np.cumprod(factors), 0.0001)
+        volume = rng.integers(1_000_000, 50_000_000, size=days)
+        return close, volume
+
+    def _series_for(self, symbol: str, start_price: float, today: np.datetime64) -> _Series:
+        series = self._series.get(symbol)
+        if series is None:
+            rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+            close, volume = self._walk(rng, start_price, self.num_days)
+            series = self._series[symbol] = _Series(today, close, volume, rng)
+            return series
+
+        new_days = int((today - series.last_day).astype(int))
+        if new_days > 0:
+            # only the bars of the days since the last request
+            new_days = min(new_days, self.num_days)
+            close, volume = self._walk(series.rng, float(series.close[-1]), new_days)
+            series.close = np.concatenate([series.close, close])[-self.num_days :]
+            series.volume = np.concatenate([series.volume, volume])[-self.num_days :]
+            series.last_day = today
+        return series
+
+    def series(
+        self, symbols: Iterable[str], price_map: Dict[str, float], today: np.datetime64
+    ) -> List[Tuple[str, np.datetime64, np.ndarray, np.ndarray]]:
+        """(symbol, last day, closes, volumes) of every symbol in `price_map`, up to `today`."""
+        with self._lock:
+            result = []
+            for symbol in dict.fromkeys(symbols):
+                if symbol in price_map:
+                    s = self._series_for(symbol, price_map[symbol], today)
+                    result.append((symbol, s.last_day, s.close, s.volume))
+            return result
+
+    def bars(
+        self,
+        symbols: Iterable[str],
+        price_map: Dict[str, float],
+        today: np.datetime64,
+        last: Optional[int] = None,
+    ) -> pa.Table:
+        """The last `last` (default all) bars of every symbol in `price_map`, as Arrow."""
+        last = min(last or self.num_days, self.num_days)
+        series = self.series(symbols, price_map, today)
+        if not series:
+            return pa.table({})
+
+        closes = np.concatenate([close[-last:] for _, _, close, _ in series])
+        volumes = np.concatenate([volume[-last:] for _, _, _, volume in series])
+        counts = np.array([min(last, len(close)) for _, _, close, _ in series])
+        # days back from each series' last day, oldest first
+        offsets = np.concatenate([np.arange(count - 1, -1, -1) for count in counts])
+        last_days = np.repeat(np.array([last_day for _, last_day, _, _ in series]), counts)
+        timestamps = (last_days - offsets.astype("timedelta64[D]")).astype("datetime64[us]")
+
+        return pa.table(
+            {
+                "timestamp": timestamps,
+                "symbol": pa.DictionaryArray.from_arrays(
+                    np.repeat(np.arange(len(series), dtype=np.int32), counts),
+                    [symbol for symbol, _, _, _ in series],
+                ),
+                "close": round_prices(closes),
+                "volume": volumes,
+            }
+        )
+
+
+def round_prices(close: np.ndarray) -> np.ndarray:
+    # cents, or 6 decimals below 1
+    return np.where(close < 1, np.round(close, 6), np.round(close, 2))
+
+
+SIGNALS_QUERY = """
+    WITH indicators AS (
+        SELECT
+            timestamp,
+            symbol,
+            close,
+            volume,
+            AVG(close) OVER (
+                PARTITION BY symbol
+                ORDER BY timestamp
+                ROWS BETWEEN 4 PRECEDING AND CURRENT ROW
+            ) AS ma_5,
+            AVG(close) OVER (
+                PARTITION BY symbol
+                ORDER BY timestamp
+                ROWS BETWEEN 14 PRECEDING AND CURRENT ROW
+            ) AS ma_15
+        FROM bars
+    ),
+    signals AS (
+        SELECT *,
+            LAG(ma_5) OVER (PARTITION BY symbol ORDER BY timestamp) AS prev_ma_5,
+            LAG(ma_15) OVER (PARTITION BY symbol ORDER BY timestamp) AS prev_ma_15
+        FROM indicators
+    )
+    SELECT
+        timestamp,
+        CAST(symbol AS VARCHAR) AS symbol,
+        close,
+        ma_5,
+        ma_15,
+        CASE
+            WHEN prev_ma_5 <= prev_ma_15 AND ma_5 > ma_15 THEN 'BUY'
+            WHEN prev_ma_5 >= prev_ma_15 AND ma_5 < ma_15 THEN 'SELL'
+            ELSE 'HOLD'
+        END AS signal
+    FROM signals
+    -- latest signal per symbol
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY timestamp DESC) = 1
+    ORDER BY symbol
+"""
+
+_history = PriceHistory()
+_connection: Optional[duckdb.DuckDBPyConnection] = None
+_connection_lock = threading.Lock()
+_local = threading.local()
+
+
+def _cursor() -> duckdb.DuckDBPyConnection:
+    """This thread's cursor on the module's long-lived in-memory DuckDB database."""
+    global _connection
+    cursor = getattr(_local, "cursor", None)
+    if cursor is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = duckdb.connect(database=":memory:")
+            cursor = _local.cursor = _connection.cursor()
+    return cursor
+
+
+def signal_state() -> Crossover:
+    """Empty MA(5)/MA(15) state for `create_signals`."""
+    return Crossover(5, 15, scale=PRICE_SCALE)
+
+
+def create_signals(
+    symbols=["BTC", "ETH", "SOL", "LINK"],
+    price_map: Optional[Dict[str, float]] = None,
+    today: Optional[date] = None,
+    state: Optional[Crossover] = None,
+) -> pd.DataFrame:
+    """
+    Latest MA(5)/MA(15) crossover signal per symbol. `price_map` gives the "today" price of
+    each symbol the history starts from (`TODAY_PRICE_MAP` by default), unknown symbols are
+    skipped.
+
+    The moving averages are kept in `state` (see `plugins.indicators`), which is fed only the
+    bars it has not seen yet, so pass the same one on every run. Gives the same result as
+    `create_signals_sql`.
+    """
+    day = np.datetime64(today or date.today(), "D")
+    history = _history
+    series = history.series(symbols, price_map or TODAY_PRICE_MAP, day)
+    if not series:
+        return pd.DataFrame()
+
+    state = state or signal_state()
+    series.sort(key=lambda item: item[0])
+    keys = [symbol for symbol, _, _, _ in series]
+    with state.lock:
+        # symbols grouped by how many of their bars are new, usually all by one
+        pending: Dict[int, List[int]] = {}
+        for i, (symbol, last_day, close, _) in enumerate(series):
+            seen = state.last_seen.get(symbol)
+            if seen is not None and seen[0] is history.token:
+                new = min(int((last_day - seen[1]).astype(int)), len(close))
+            else:
+                new = len(close)
+            if new > 0:
+                pending.setdefault(new, []).append(i)
+            state.last_seen[symbol] = (history.token, last_day)
+
+        for new, group in pending.items():
+            closes = np.stack([series[i][2][-new:] for i in group])
+            state.push([keys[i] for i in group], round_prices(closes))
+
+        ma_5, ma_15, signal = state.latest(keys)
+
+    last_days = np.array([last_day for _, last_day, _, _ in series])
+    return pd.DataFrame(
+        {
+            "timestamp": last_days.astype("datetime64[us]"),
+            "symbol": keys,
+            "close": round_prices(np.array([close[-1] for _, _, close, _ in series])),
+            "ma_5": ma_5,
+            "ma_15": ma_15,
+            "signal": signal,
+        }
+    )
+
+
+def create_signals_sql(
+    symbols=["BTC", "ETH", "SOL", "LINK"],
+    price_map: Optional[Dict[str, float]] = None,
+    today: Optional[date] = None,
+) -> pd.DataFrame:
+    """`create_signals` as one DuckDB window query over the last bars, the reference."""
+    day = np.datetime64(today or date.today(), "D")
+    bars = _history.bars(symbols, price_map or TODAY_PRICE_MAP, day, last=SIGNAL_BARS)
+    if bars.num_rows == 0:
+        return pd.DataFrame()
+
+    # DuckDB scans the Arrow table in place, nothing is copied into a table first
+    cursor = _cursor()
+    cursor.register("bars", bars)
+    try:
+        return cursor.execute(SIGNALS_QUERY).df()
+    finally:
+        cursor.unregister("bars")
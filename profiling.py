@@ -0,0 +1,320 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import pluggy
+
+# marker for implementations of `plugin_runner.RunSpec`, same project name as its hookspecs
+hookimpl = pluggy.HookimplMarker("job-scheduler")
+
+PROFILE_MODES = ("sample", "cprofile")
+
+# allocations of the profiling itself, left out of the snapshots
+_OWN_ALLOCATIONS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, os.path.join(os.path.dirname(pluggy.__file__), "*")),
+)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+
+
+class RunStats:
+    """Wall time, CPU time of the running thread and peak traced allocation of one run."""
+
+    __slots__ = ("started_at", "wall", "cpu", "peak_alloc", "_wall0", "_cpu0", "_alloc0")
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.wall: Optional[float] = None
+        self.cpu: Optional[float] = None
+        # only known while tracemalloc is tracing
+        self.peak_alloc: Optional[int] = None
+
+    def start(self):
+        if tracemalloc.is_tracing():
+            # the peak is process wide, runs overlapping this one count towards it
+            self._alloc0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            self._alloc0 = None
+        self._cpu0 = time.thread_time()
+        self._wall0 = time.perf_counter()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self._wall0
+        self.cpu = time.thread_time() - self._cpu0
+        if self._alloc0 is not None and tracemalloc.is_tracing():
+            self.peak_alloc = max(0, tracemalloc.get_traced_memory()[1] - self._alloc0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "peak_alloc": self.peak_alloc,
+        }
+
+
+class RunHooks:
+    """
+    Context manager around one run: calls the `pre_run` hooks, measures the run into a
+    `RunStats`, then calls the `post_run` hooks with it and the run's exception, if any.
+    """
+
+    __slots__ = ("hook", "scheduler_job_id", "package", "stats")
+
+    def __init__(self, hook, scheduler_job_id: str, package: str):
+        self.hook = hook
+        self.scheduler_job_id = scheduler_job_id
+        self.package = package
+        self.stats = RunStats()
+
+    def __enter__(self) -> RunStats:
+        self.hook.pre_run(scheduler_job_id=self.scheduler_job_id, package=self.package)
+        self.stats.start()
+        return self.stats
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.stop()
+        self.hook.post_run(
+            scheduler_job_id=self.scheduler_job_id,
+            package=self.package,
+            stats=self.stats,
+            error=exc,
+        )
+        return False
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Capture:
+    """Profile of the next `runs` runs of one scheduler job, filled in by `RunProfiler`."""
+
+    def __init__(
+        self,
+        scheduler_job_id: str,
+        runs: int,
+        mode: str = "sample",
+        interval: float = 0.005,
+        memory: bool = True,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.scheduler_job_id = scheduler_job_id
+        self.runs = runs
+        self.mode = mode
+        self.interval = interval
+        self.memory = memory
+        self.armed_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+        # runs started, including the ones in progress
+        self.started = 0
+        self.run_stats: List[Dict[str, Any]] = []
+        # collapsed stack -> samples
+        self.stacks: Counter = Counter()
+        self.profile: Optional[pstats.Stats] = None
+        self.allocations: Counter = Counter()
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format of flamegraph.pl / speedscope, one per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """cProfile's busiest functions, by cumulative time."""
+        if self.profile is None:
+            return []
+        rows = []
+        for (filename, line, name), (_, calls, own, total, _) in self.profile.stats.items():
+            rows.append(
+                {
+                    "function": f"{name} ({os.path.basename(filename)}:{line})",
+                    "calls": calls,
+                    "own_time": own,
+                    "cumulative_time": total,
+                }
+            )
+        rows.sort(key=lambda row: row["cumulative_time"], reverse=True)
+        return rows[:limit]
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "scheduler_job_id": self.scheduler_job_id,
+            "mode": self.mode,
+            "runs_wanted": self.runs,
+            "complete": self.done.is_set(),
+            "armed_at": self.armed_at,
+            "finished_at": self.finished_at,
+            "runs": list(self.run_stats),
+            "samples": sum(self.stacks.values()),
+            "collapsed": self.collapsed(),
+            "functions": self.functions(),
+            # bytes still allocated after the runs, per source line
+            "allocations": [
+                {"where": where, "size": size} for where, size in self.allocations.most_common(20)
+            ],
+        }
+
+
+class RunProfiler:
+    """
+    `pre_run`/`post_run` hooks that profile the next runs of the jobs armed with `arm`.
+
+    "sample" mode reads the run's thread stack every `interval` seconds from a background
+    thread and counts collapsed stacks, the data of a flamegraph. "cprofile" mode traces every
+    call of the run with cProfile. With `memory`, tracemalloc is on while the capture lasts,
+    giving each run's peak allocation and the lines whose allocations outlived the runs.
+    Runs on a shared event loop ("async" placement) share its thread, so other coroutines
+    running meanwhile are profiled with them.
+
+    While nothing is armed, `armed` is False and the hooks are not called at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._captures: Dict[str, Capture] = {}
+        # latest capture per job, finished or not
+        self._latest: Dict[str, Capture] = {}
+        # thread id -> (capture, cProfile, tracemalloc snapshot) of the run it is running
+        self._running: Dict[int, Tuple[Capture, Optional[cProfile.Profile], Any]] = {}
+        self._sampler: Optional[threading.Thread] = None
+        # whether tracemalloc was turned on here, and so is turned off here
+        self._tracing = False
+        self.armed = False
+
+    def arm(self, scheduler_job_id: str, runs: int = 1, **options) -> Capture:
+        """Profile the next `runs` runs of the job, replacing a capture armed before."""
+        capture = Capture(scheduler_job_id, runs, **options)
+        with self._lock:
+            previous = self._captures.get(scheduler_job_id)
+            if previous is not None:
+                self._finish(previous)
+            self._captures[scheduler_job_id] = self._latest[scheduler_job_id] = capture
+            self.armed = True
+        return capture
+
+    def disarm(self, scheduler_job_id: str) -> Optional[Capture]:
+        with self._lock:
+            capture = self._captures.get(scheduler_job_id)
+            if capture is not None:
+                self._finish(capture)
+            return capture
+
+    def latest(self, scheduler_job_id: str) -> Optional[Capture]:
+        return self._latest.get(scheduler_job_id)
+
+    @hookimpl
+    def pre_run(self, scheduler_job_id: str, package: str):
+        with self._lock:
+            capture = self._captures.get(scheduler_job_id)
+            thread_id = threading.get_ident()
+            if capture is None or capture.started >= capture.runs or thread_id in self._running:
+                return
+            capture.started += 1
+
+            snapshot = None
+            if capture.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                    self._tracing = True
+                snapshot = _snapshot()
+
+            profile = None
+            if capture.mode == "cprofile":
+                profile = cProfile.Profile()
+            self._running[thread_id] = (capture, profile, snapshot)
+            if capture.mode == "sample" and self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample, name="run-profiler", daemon=True
+                )
+                self._sampler.start()
+
+        if profile is not None:
+            profile.enable()
+
+    @hookimpl
+    def post_run(
+        self, scheduler_job_id: str, package: str, stats: RunStats, error: Optional[BaseException]
+    ):
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._running.get(thread_id)
+            if entry is None or entry[0].scheduler_job_id != scheduler_job_id:
+                return
+            # stops the sampling of this thread before the work below
+            del self._running[thread_id]
+        capture, profile, snapshot = entry
+        if profile is not None:
+            profile.disable()
+
+        allocations = None
+        if snapshot is not None and tracemalloc.is_tracing():
+            allocations = _snapshot().compare_to(snapshot, "lineno")
+
+        with self._lock:
+            if profile is not None:
+                if capture.profile is None:
+                    capture.profile = pstats.Stats(profile)
+                else:
+                    capture.profile.add(profile)
+            for stat in (allocations or [])[:50]:
+                if stat.size_diff > 0:
+                    capture.allocations[str(stat.traceback[0])] += stat.size_diff
+            capture.run_stats.append(
+                {**stats.to_dict(), "error": repr(error) if error is not None else None}
+            )
+            if len(capture.run_stats) >= capture.runs:
+                self._finish(capture)
+
+    def _finish(self, capture: Capture):
+        # with the lock held
+        if self._captures.get(capture.scheduler_job_id) is capture:
+            del self._captures[capture.scheduler_job_id]
+        if self._tracing and not any(c.memory for c in self._captures.values()):
+            tracemalloc.stop()
+            self._tracing = False
+        capture.finished_at = time.time()
+        capture.done.set()
+        self.armed = bool(self._captures)
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                running = {
+                    thread_id: capture
+                    for thread_id, (capture, _, _) in self._running.items()
+                    if capture.mode == "sample"
+                }
+                if not running and not self._captures:
+                    self._sampler = None
+                    return
+            if running:
+                frames = sys._current_frames()
+                for thread_id, capture in running.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        capture.stacks[_collapse(frame)] += 1
+                interval = min(capture.interval for capture in running.values())
+            else:
+                interval = 0.05
+            time.sleep(interval)
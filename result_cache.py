@@ -0,0 +1,200 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+def _sizeof(value: Any) -> int:
+    """Rough size of a run result, used for the memory cap."""
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        # pandas DataFrame / Series
+        try:
+            usage = memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        except Exception:
+            pass
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        # numpy arrays, pyarrow tables
+        return nbytes
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items()
+        )
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """A run in progress that identical runs wait for instead of running themselves."""
+
+    __slots__ = ("done", "result", "error", "loop_waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.loop_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+
+class ResultCache:
+    """
+    Results of runs shared between jobs whose runs are identical, keyed by the caller (see
+    `PluginRunner.result_key`: package, plugin version, config fingerprint, time bucket).
+
+    Entries live until `expires_at` (a `time.time()` value given with each run) and are
+    evicted least recently used first once there are more than `max_entries` of them or they
+    take more than `max_bytes`. While a key is being computed, other runs of the same key wait
+    for that result (or error) instead of running too, from threads or event loops alike.
+    Errors are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # key -> (result, size, expires_at)
+        self._entries: OrderedDict[Hashable, Tuple[Any, int, float]] = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        # runs that waited for an identical one in flight
+        self.shared = 0
+        self.evictions: Counter = Counter()
+
+    def _begin(self, key: Hashable) -> Tuple[str, Any]:
+        """("hit", result), ("leader", flight) when the caller runs it, or ("wait", flight)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return "hit", entry[0]
+                self._evict(key, "expired")
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return "wait", flight
+
+            self.misses += 1
+            flight = self._flights[key] = _Flight()
+            return "leader", flight
+
+    def _finish(self, key: Hashable, flight: _Flight, expires_at: float):
+        with self._lock:
+            del self._flights[key]
+            if flight.error is None:
+                self._store(key, flight.result, expires_at)
+            # waiters register under the lock, none can be missed past this point
+            flight.done.set()
+            loop_waiters, flight.loop_waiters = flight.loop_waiters, []
+
+        for loop, future in loop_waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, flight)
+            except RuntimeError:
+                # loop is closed
+                pass
+
+    def _store(self, key: Hashable, result: Any, expires_at: float):
+        size = _sizeof(result)
+        if size > self.max_bytes or expires_at <= time.time():
+            return
+        self._entries[key] = (result, size, expires_at)
+        self.bytes += size
+
+        now = time.time()
+        for old_key in [k for k, entry in self._entries.items() if entry[2] <= now]:
+            self._evict(old_key, "expired")
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)), "lru")
+
+    def _evict(self, key: Hashable, reason: str):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        self.evictions[reason] += 1
+
+    def get_or_run(self, key: Hashable, expires_at: float, run: Callable[[], Any]) -> Any:
+        state, value = self._begin(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            value.done.wait()
+            return _outcome(value)
+
+        flight = value
+        try:
+            flight.result = run()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight, expires_at)
+        return flight.result
+
+    async def get_or_run_async(
+        self, key: Hashable, expires_at: float, run: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        state, value = self._begin(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            flight = value
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                if not flight.done.is_set():
+                    flight.loop_waiters.append((loop, future))
+                    registered = True
+                else:
+                    registered = False
+            if registered:
+                await future
+            return _outcome(flight)
+
+        flight = value
+        try:
+            flight.result = await run()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight, expires_at)
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "in_flight": len(self._flights),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "evictions": dict(self.evictions),
+        }
+
+
+def _resolve(future: asyncio.Future, flight: _Flight):
+    if not future.done():
+        future.set_result(None)
+
+
+def _outcome(flight: _Flight) -> Any:
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
@@ -0,0 +1,294 @@
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, Optional, Tuple
+
+from sqlalchemy import Engine, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import JobRun, JobRunResult
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # results are stored as JSON only
+    pd = pa = pq = None
+
+# rows per parquet row group, the unit a stored result is streamed back in
+PARQUET_ROW_GROUP_SIZE = 10_000
+# bytes of a stored result read per query
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+def serialize_result(result: Any) -> Optional[Tuple[str, bytes]]:
+    """
+    Encode a run's return value as (format, data): zstd Parquet for DataFrames when pyarrow
+    is installed, JSON for everything else. None means there is nothing to store.
+    """
+    if result is None:
+        return None
+
+    if pd is not None and isinstance(result, pd.DataFrame):
+        buffer = io.BytesIO()
+        table = pa.Table.from_pandas(result, preserve_index=False)
+        pq.write_table(table, buffer, compression="zstd", row_group_size=PARQUET_ROW_GROUP_SIZE)
+        return "parquet", buffer.getvalue()
+
+    if hasattr(result, "model_dump_json"):
+        return "json", result.model_dump_json().encode()
+
+    return "json", json.dumps(result, default=str).encode()
+
+
+class ResultBlob(io.RawIOBase):
+    """
+    Read-only, seekable file over the stored result of a run, fetched `chunk_size` bytes at a
+    time with `substr` instead of loading the whole blob. pyarrow reads a Parquet file's footer
+    first and then one row group at a time, so only the row groups being sent are in memory.
+    """
+
+    def __init__(
+        self, db_engine: Engine, run_id: int, size: int, chunk_size: int = BLOB_CHUNK_SIZE
+    ):
+        super().__init__()
+        self.db_engine = db_engine
+        self.run_id = run_id
+        self.size = size
+        self.chunk_size = chunk_size
+        self.position = 0
+        # (offset, bytes) of the last chunk read, the footer is read in small pieces
+        self._chunk: Tuple[int, bytes] = (0, b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        data = self._read(self.position, min(len(buffer), self.size - self.position))
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        start, chunk = self._chunk
+        if start <= offset and offset + length <= start + len(chunk):
+            return chunk[offset - start : offset - start + length]
+        query = select(
+            func.substr(JobRunResult.data, offset + 1, max(length, self.chunk_size))
+        ).where(JobRunResult.run_id == self.run_id)
+        with self.db_engine.connect() as connection:
+            chunk = connection.scalar(query)
+        self._chunk = (offset, bytes(chunk or b""))
+        return self._chunk[1][:length]
+
+    def chunks(self) -> Iterator[bytes]:
+        """The whole blob, a chunk at a time."""
+        self.seek(0)
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+
+def stream_arrow(source: Any) -> Iterator[bytes]:
+    """
+    Re-encode a stored Parquet result (a file object such as `ResultBlob`) as an Arrow IPC
+    stream, one row group at a time.
+    """
+    parquet = pq.ParquetFile(source)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, parquet.schema_arrow)
+    for batch in parquet.iter_batches(batch_size=PARQUET_ROW_GROUP_SIZE):
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+def stream_ndjson(result_format: str, source: Any) -> Iterator[bytes]:
+    """Stream a stored result as NDJSON, one line per row (or per list item for JSON)."""
+    if result_format == "parquet":
+        parquet = pq.ParquetFile(source)
+        for batch in parquet.iter_batches(batch_size=PARQUET_ROW_GROUP_SIZE):
+            yield "".join(json.dumps(row, default=str) + "\n" for row in batch.to_pylist()).encode()
+        return
+
+    # a JSON document is parsed whole
+    value = json.loads(source.read())
+    for item in value if isinstance(value, list) else [value]:
+        yield (json.dumps(item) + "\n").encode()
+
+
+def runs_query(
+    plugin_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 100,
+):
+    """Runs newest first, keyset paginated by the id of the last run of the previous page."""
+    query = select(JobRun).order_by(JobRun.id.desc()).limit(limit)
+    if plugin_id is not None:
+        query = query.where(JobRun.plugin_id == plugin_id)
+    if session_id is not None:
+        query = query.where(JobRun.session_id == session_id)
+    if status is not None:
+        query = query.where(JobRun.status == status)
+    if since is not None:
+        query = query.where(JobRun.finished_at >= since)
+    if cursor is not None:
+        query = query.where(JobRun.id < cursor)
+    return query
+
+
+def run_result_query(run_id: int):
+    # the blob itself is only read by `ResultBlob`, a chunk at a time
+    return select(JobRunResult.format, func.length(JobRunResult.data)).where(
+        JobRunResult.run_id == run_id
+    )
+
+
+def open_run_result(db_engine: Engine, run_id: int, row) -> Optional[Tuple[str, ResultBlob]]:
+    """Format and `ResultBlob` of a `run_result_query` row, None without one."""
+    if row is None:
+        return None
+    return str(row[0]), ResultBlob(db_engine, run_id, int(row[1]))
+
+
+class RunRecorder:
+    """
+    Records finished runs into `job_runs` / `job_run_results` without touching the database on
+    the scheduler thread.
+
+    `record` only puts the run on a bounded queue (dropping and counting it when full). A
+    background thread serializes results and writes runs in bulk, one transaction per
+    `batch_size` runs or `flush_interval` seconds, and deletes runs older than
+    `retention_seconds` every `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        db_engine: Engine,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 100_000,
+        retention_seconds: Optional[float] = 7 * 24 * 3600,
+        purge_interval: float = 300,
+    ):
+        self.db_engine = db_engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="run-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Flush what is queued and stop the writer thread."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def record(self, run: dict, result: Any = None):
+        """
+        Queue one finished run. `run` holds the `JobRun` columns except `id` and
+        `result_format`, `result` is the raw return value of the run.
+        """
+        try:
+            self.queue.put_nowait((run, result))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        next_purge = time.monotonic()
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+
+            if self.retention_seconds is not None and time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + self.purge_interval
+                try:
+                    self.purge()
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+
+    def write(self, batch: list):
+        rows, results = [], []
+        for run, result in batch:
+            try:
+                serialized = serialize_result(result)
+            except Exception as e:
+                logger.warning(f"Cannot store result of {run['scheduler_job_id']}: {e}")
+                serialized = None
+            rows.append({**run, "result_format": serialized[0] if serialized else None})
+            results.append(serialized)
+
+        with Session(self.db_engine) as session:
+            run_ids = session.scalars(
+                insert(JobRun).returning(JobRun.id, sort_by_parameter_order=True), rows
+            ).all()
+            result_rows = [
+                {"run_id": run_id, "format": serialized[0], "data": serialized[1]}
+                for run_id, serialized in zip(run_ids, results)
+                if serialized
+            ]
+            if result_rows:
+                session.execute(insert(JobRunResult), result_rows)
+            session.commit()
+
+        self.written += len(rows)
+
+    def purge(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds or 0)
+        with Session(self.db_engine) as session:
+            expired = select(JobRun.id).where(JobRun.finished_at < cutoff)
+            session.execute(delete(JobRunResult).where(JobRunResult.run_id.in_(expired)))
+            session.execute(delete(JobRun).where(JobRun.finished_at < cutoff))
+            session.commit()
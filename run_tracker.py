@@ -0,0 +1,195 @@
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set, Tuple
+
+from apscheduler.events import (
+    JobExecutionEvent,
+    JobSubmissionEvent,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_ERROR,
+    EVENT_JOB_SUBMITTED,
+    EVENT_JOB_REMOVED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_MAX_INSTANCES,
+)
+
+from executors import EVENT_JOB_RUN_LIMITED
+
+if TYPE_CHECKING:
+    from plugin_manager import PluginManager
+
+
+class RunTracker:
+    """Feeds a manager's `metrics` and `run_recorder` from its scheduler's job events."""
+
+    def __init__(self, plugin_manager: "PluginManager"):
+        self.plugin_manager = plugin_manager
+        # (scheduler job id, run time) -> (submitted at, active job id) of the runs in flight
+        self._submitted: Dict[Tuple[str, datetime], Tuple[float, Optional[int]]] = {}
+        # plugin id -> interval, set as its jobs are scheduled, for the coalesced tick counts
+        self.intervals: Dict[str, float] = {}
+        # (scheduler job id, run time) of the ticks refused for the run limit, until the
+        # scheduler's EVENT_JOB_MAX_INSTANCES for the same tick comes in
+        self._limited: Set[Tuple[str, datetime]] = set()
+
+    def listen(self, event: JobExecutionEvent):
+        metrics = self.plugin_manager.metrics
+        if event.code == EVENT_JOB_SUBMITTED:
+            entry = self.plugin_manager.runner.active_configs.get(event.job_id)
+            self._submitted[(event.job_id, event.scheduled_run_times[-1])] = (
+                time.time(),
+                entry.job_id if entry else None,
+            )
+            self._record_tick(event)
+        elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+            self._record_run(event)
+        elif event.code == EVENT_JOB_RUN_LIMITED:
+            self._limited.add((event.job_id, event.scheduled_run_times[-1]))
+            self._record_tick(event)
+            metrics.run_limited(event.job_id)
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            if self.run_limited(event):
+                self._limited.discard((event.job_id, event.scheduled_run_times[-1]))
+                return
+            self._record_tick(event)
+            metrics.max_instances(event.job_id)
+        elif event.code == EVENT_JOB_MISSED:
+            metrics.missed(event.job_id)
+            self._record_missed(event)
+        elif event.code == EVENT_JOB_REMOVED:
+            metrics.remove(event.job_id)
+
+    def run_limited(self, event: JobSubmissionEvent) -> bool:
+        """Whether a skipped tick was refused for its plugin's run limit, not max_instances."""
+        return (event.job_id, event.scheduled_run_times[-1]) in self._limited
+
+    def _record_tick(self, event: JobSubmissionEvent):
+        self.plugin_manager.metrics.scheduled(
+            event.job_id,
+            event.scheduled_run_times[-1].timestamp(),
+            self.intervals.get(event.job_id.partition("/")[0]),
+        )
+
+    def _record_run(self, event: JobExecutionEvent):
+        finished = time.time()
+        submitted, job_id = self._submitted.pop(
+            (event.job_id, event.scheduled_run_time), (None, None)
+        )
+        started = self.plugin_manager.runner.run_started.pop(event.job_id, None)
+        if started is None or (submitted is not None and started < submitted):
+            # runs in worker processes only have their submission time
+            started = submitted
+
+        self.plugin_manager.metrics.finished(
+            event.job_id,
+            started - event.scheduled_run_time.timestamp() if started else None,
+            finished - started if started else None,
+            event.code == EVENT_JOB_ERROR,
+        )
+        error = None
+        if event.code == EVENT_JOB_ERROR:
+            error = f"{event.exception!r}\n{event.traceback or ''}"
+        self._record(
+            event,
+            job_id,
+            "success" if event.code == EVENT_JOB_EXECUTED else "error",
+            datetime.fromtimestamp(started, timezone.utc) if started else None,
+            datetime.fromtimestamp(finished, timezone.utc),
+            finished - started if started else None,
+            error,
+            event.retval if event.code == EVENT_JOB_EXECUTED else None,
+        )
+
+    def _record_missed(self, event: JobExecutionEvent):
+        # a tick skipped for being later than misfire_grace_time, never started
+        _, job_id = self._submitted.pop((event.job_id, event.scheduled_run_time), (None, None))
+        if job_id is None:
+            entry = self.plugin_manager.runner.active_configs.get(event.job_id)
+            job_id = entry.job_id if entry else None
+        self._record(
+            event,
+            job_id,
+            "missed",
+            None,
+            datetime.now(timezone.utc),
+        )
+
+    def _record(
+        self,
+        event: JobExecutionEvent,
+        job_id: Optional[int],
+        status: str,
+        started_at: Optional[datetime],
+        finished_at: datetime,
+        duration: Optional[float] = None,
+        error: Optional[str] = None,
+        result: Any = None,
+    ):
+        run_recorder = self.plugin_manager.run_recorder
+        if not run_recorder:
+            return
+        plugin_id, _, session_id = event.job_id.partition("/")
+        run_recorder.record(
+            {
+                "scheduler_job_id": event.job_id,
+                "plugin_id": int(plugin_id),
+                "session_id": int(session_id),
+                "job_id": job_id,
+                "scheduled_at": event.scheduled_run_time,
+                "started_at": started_at,
+                "finished_at": finished_at,
+                "duration": duration,
+                "status": status,
+                "error": error,
+            },
+            result,
+        )
+
+    def executor_queues(self) -> Dict[str, Dict[str, int]]:
+        """Runs submitted and not finished (`in_flight`), and still waiting (`queued`)."""
+        scheduler = self.plugin_manager.scheduler
+        result = {}
+        for alias in ["default", *sorted(self.plugin_manager.placements.executors)]:
+            try:
+                executor = scheduler._lookup_executor(alias)
+            except KeyError:
+                continue
+            queued = getattr(executor, "queued", None)
+            if callable(queued):
+                queued = queued()
+            else:
+                # APScheduler's executors hand runs to a thread pool, their own or the loop's
+                pool = getattr(executor, "_pool", None)
+                if pool is None:
+                    pool = getattr(getattr(executor, "_eventloop", None), "_default_executor", None)
+                work_queue = getattr(pool, "_work_queue", None)
+                queued = work_queue.qsize() if work_queue is not None else 0
+            result[alias] = {
+                "in_flight": sum(getattr(executor, "_instances", {}).values()),
+                "queued": queued,
+            }
+        return result
+
+    def prometheus(self) -> str:
+        """`metrics` in Prometheus text format, with the executor queues as gauges."""
+        queues = self.executor_queues()
+        waiting = self.plugin_manager.runner.limiter.waiting()
+        gauges = {
+            "job_scheduler_executor_in_flight": {
+                (("executor", alias),): depth["in_flight"] for alias, depth in queues.items()
+            },
+            "job_scheduler_executor_queued": {
+                (("executor", alias),): depth["queued"] for alias, depth in queues.items()
+            },
+            "job_scheduler_run_limit_waiting": {
+                (("package", package),): count for package, count in waiting.items()
+            },
+        }
+        return self.plugin_manager.metrics.prometheus(gauges)
+
+    def summary(self, plugin_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            **self.plugin_manager.metrics.summary(None if plugin_id is None else str(plugin_id)),
+            "executors": self.executor_queues(),
+            "run_limit_waiting": self.plugin_manager.runner.limiter.waiting(),
+        }
@@ -1,24 +1,33 @@
 import asyncio
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Any, Dict, List, Optional
 from fastapi import (
     Depends,
     FastAPI,
     Body,
     HTTPException,
     Request,
+    Response,
     WebSocket,
     WebSocketDisconnect,
 )
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import logging
 
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from cluster import Cluster
 from create_data import create_data
 from log_handler import JobLogHandler
-from models import Job, Plugin
+from lookup_cache import LookupCache
+from metrics import SchedulerMetrics
+from models import Job
 from plugin_manager import PluginManager
+from result_cache import ResultCache
+from run_store import RunRecorder, stream_arrow, stream_ndjson
 from ws_manager import WSConnectionManager
 import os
 import dotenv
@@ -39,6 +48,34 @@ def get_plugin_manager(request: Request) -> PluginManager:
 
 PluginManagerState = Annotated[PluginManager, Depends(get_plugin_manager)]
 
+# async drivers for the endpoints' engine, keyed by the dialect of DB_CONNECTION
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def create_async_db_engine(db_connection: str) -> Optional[AsyncEngine]:
+    """
+    Async engine for the endpoints: ASYNC_DB_CONNECTION, else DB_CONNECTION with its async
+    driver. None for in-memory databases, the endpoints then share the sync engine.
+    """
+    async_connection = os.getenv("ASYNC_DB_CONNECTION")
+    if not async_connection:
+        if ":memory:" in db_connection:
+            return None
+        scheme, sep, rest = db_connection.partition("://")
+        driver = ASYNC_DRIVERS.get(scheme.split("+")[0])
+        if driver is None:
+            return None
+        async_connection = driver + sep + rest
+
+    if async_connection.startswith("sqlite"):
+        return create_async_engine(async_connection)
+    return create_async_engine(
+        async_connection,
+        pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        pool_pre_ping=True,
+    )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -56,15 +93,60 @@ async def lifespan(app: FastAPI):
         create_data(db_engine)
     else:
         db_engine = create_engine(db_connection)
+    async_db_engine = create_async_db_engine(db_connection)
 
     # Initialise log handler and plugin manager once we have a running event loop
     loop = asyncio.get_running_loop()
-    log_handler = JobLogHandler(manager.send_log, loop)
+    log_handler = JobLogHandler(manager.send_logs, loop)
 
     plugin_manager = PluginManager(
         db_engine,
         log_handler=log_handler,
         module_paths=os.getenv("MODULE_PATH", "").split(":"),
+        run_recorder=RunRecorder(
+            db_engine,
+            retention_seconds=float(os.getenv("RUN_RETENTION_SECONDS", 7 * 24 * 3600)),
+        ),
+        async_db_engine=async_db_engine,
+        # LAZY_PLUGINS=1 imports plugins on first use, PLUGIN_PREWARM_WORKERS imports in parallel
+        lazy_plugins=os.getenv("LAZY_PLUGINS", "0") == "1",
+        prewarm_workers=int(os.getenv("PLUGIN_PREWARM_WORKERS", 0)),
+        # PLUGIN_WATCH=auto|watchfiles|poll reloads plugins when their files change
+        watch=os.getenv("PLUGIN_WATCH") or None,
+        # spread each plugin's jobs over its interval, JOB_JITTER adds up to N random seconds
+        phase_offsets=os.getenv("JOB_PHASE_OFFSETS", "0") == "1",
+        jitter=float(os.getenv("JOB_JITTER", 0)) or None,
+        # SCHEDULER_ENGINE=event keeps the schedule in compact per-plugin arrays, for 100k+ jobs
+        engine=os.getenv("SCHEDULER_ENGINE", "apscheduler"),
+        max_runs_per_plugin=int(os.getenv("MAX_RUNS_PER_PLUGIN", 0)) or None,
+        # seconds to collect the due ticks of plugins implementing `run_batch`
+        batch_window=float(os.getenv("BATCH_WINDOW", 0.2)),
+        # shared results of identical runs, for plugins declaring `cache_results`
+        result_cache=ResultCache(
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+        ),
+        # lag and duration histograms per job for up to METRICS_MAX_JOB_HISTOGRAMS jobs
+        metrics=SchedulerMetrics(
+            max_job_histograms=int(os.getenv("METRICS_MAX_JOB_HISTOGRAMS", 1000))
+        ),
+        # CACHE_POLL_INTERVAL > 0 picks up plugin/job changes made by other nodes
+        lookup_cache=LookupCache(
+            db_engine=db_engine,
+            poll_interval=float(os.getenv("CACHE_POLL_INTERVAL", 0)) or None,
+        ),
+        # CLUSTER=1 splits the jobs between the nodes sharing the database, by leased shards
+        cluster=(
+            Cluster(
+                db_engine,
+                node_id=os.getenv("CLUSTER_NODE_ID") or None,
+                shards=int(os.getenv("CLUSTER_SHARDS", 256)),
+                heartbeat_interval=float(os.getenv("CLUSTER_HEARTBEAT_INTERVAL", 5)),
+                lease_seconds=float(os.getenv("CLUSTER_LEASE_SECONDS", 20)),
+            )
+            if os.getenv("CLUSTER", "0") == "1"
+            else None
+        ),
     )
 
     # ---- STARTUP ----
@@ -72,11 +154,14 @@ async def lifespan(app: FastAPI):
 
     # store in app state
     app.state.plugin_manager = plugin_manager
+    app.state.log_handler = log_handler
 
     yield
 
     # ---- SHUTDOWN ----
     plugin_manager.stop()
+    if async_db_engine is not None:
+        await async_db_engine.dispose()
 
     # Immediate hard exit after 1 second for cleaning up
     await asyncio.sleep(1)
@@ -95,9 +180,12 @@ app.add_middleware(
 
 
 @app.websocket("/ws/logs/{plugin_id}/{session_id}")
-async def websocket_logs_endpoint(websocket: WebSocket, plugin_id: int, session_id: int):
+async def websocket_logs_endpoint(
+    websocket: WebSocket, plugin_id: int, session_id: int, since: Optional[int] = None
+):
     job_id = f"{plugin_id}/{session_id}"
-    await manager.connect(websocket, job_id)
+    # recent lines are replayed first; `since` resumes after the last seq the client saw
+    await manager.connect(websocket, job_id, since)
     try:
         while True:
             # Keep connection alive; you can also handle client messages here if needed
@@ -106,14 +194,99 @@ async def websocket_logs_endpoint(websocket: WebSocket, plugin_id: int, session_
         manager.disconnect(websocket, job_id)
 
 
+@app.get("/logs/stats")
+async def log_stats(request: Request):
+    return {
+        "pipeline": request.app.state.log_handler.stats(),
+        "websockets": manager.stats(),
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats(plugin_manager: PluginManagerState):
+    return {**plugin_manager.lookup_cache.stats(), "results": plugin_manager.result_cache.stats()}
+
+
+@app.get("/cluster")
+async def cluster_status(plugin_manager: PluginManagerState):
+    if plugin_manager.cluster is None:
+        raise HTTPException(status_code=404, detail="Not running as part of a cluster")
+    scheduled, paused = plugin_manager.scheduled_job_count()
+    return {**plugin_manager.cluster.status(), "jobs": scheduled, "paused_jobs": paused}
+
+
+@app.get("/metrics")
+async def metrics(plugin_manager: PluginManagerState):
+    return Response(
+        plugin_manager.metrics_text(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/metrics/summary")
+async def metrics_summary(plugin_manager: PluginManagerState, plugin_id: Optional[int] = None):
+    # per-job figures only for one plugin, a server can run many thousands of jobs
+    return plugin_manager.metrics_summary(plugin_id)
+
+
+def _profile_response(capture, format: str):
+    if format == "collapsed":
+        return Response(capture.collapsed(), media_type="text/plain; charset=utf-8")
+    return capture.result()
+
+
+@app.post("/profile/{plugin_id}/{session_id}")
+async def profile_job(
+    plugin_manager: PluginManagerState,
+    plugin_id: int,
+    session_id: int,
+    runs: int = 1,
+    mode: str = "sample",
+    interval: float = 0.005,
+    memory: bool = True,
+    timeout: float = 60,
+    format: str = "json",
+):
+    """
+    Profile the job's next `runs` runs and return the result once they finished, or what was
+    captured so far after `timeout` seconds (`complete` is false then, the capture goes on).
+    `format=collapsed` returns the sampled stacks as text, for flamegraph.pl or speedscope.
+    """
+    try:
+        capture = plugin_manager.profile_job(
+            f"{plugin_id}/{session_id}", runs, mode=mode, interval=interval, memory=memory
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job is not scheduled")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.to_thread(capture.done.wait, timeout)
+    return _profile_response(capture, format)
+
+
+@app.get("/profile/{plugin_id}/{session_id}")
+async def job_profile(
+    plugin_manager: PluginManagerState, plugin_id: int, session_id: int, format: str = "json"
+):
+    capture = plugin_manager.profiler.latest(f"{plugin_id}/{session_id}")
+    if capture is None:
+        raise HTTPException(status_code=404, detail="No profile captured for this job")
+    return _profile_response(capture, format)
+
+
+@app.delete("/profile/{plugin_id}/{session_id}")
+async def stop_profile(plugin_manager: PluginManagerState, plugin_id: int, session_id: int):
+    capture = plugin_manager.profiler.disarm(f"{plugin_id}/{session_id}")
+    return {"success": capture is not None}
+
+
 @app.get("/plugins")
-def plugins(plugin_manager: PluginManagerState):
+async def plugins(plugin_manager: PluginManagerState):
     # plugin_manager: PluginManager = app.state.plugin_manager
-    return plugin_manager.get_all_plugins()
+    return await plugin_manager.get_all_plugins_async()
 
 
 @app.post("/plugins")
-def create_plugin(plugin_manager: PluginManagerState, payload: dict = Body(...)):
+async def create_plugin(plugin_manager: PluginManagerState, payload: dict = Body(...)):
     """
     Create a plugin record and load it into the PluginManager.
 
@@ -121,11 +294,10 @@ def create_plugin(plugin_manager: PluginManagerState, payload: dict = Body(...))
     {
       "package": "plugins.sample_plugin@v0_1_0.Plugin",
       "interval": 60,
-      "description": "Sample plugin"
+      "description": "Sample plugin",
+      "executor": "process"   # optional: thread | async | process
     }
     """
-    from sqlalchemy.orm import Session
-
     required_keys = {"package", "interval"}
     if not required_keys.issubset(payload):
         raise HTTPException(
@@ -136,25 +308,17 @@ def create_plugin(plugin_manager: PluginManagerState, payload: dict = Body(...))
     package = payload["package"]
     interval = payload["interval"]
     description = payload.get("description")
+    executor = payload.get("executor")
 
     # Load into manager
     try:
-        plugin_manager.load_plugin(package)
+        # importing the plugin module blocks
+        await asyncio.to_thread(plugin_manager.load_plugin, package)
         # Insert into DB
-        with Session(plugin_manager.db_engine) as session:
-            plugin_row = Plugin(
-                package=package,
-                interval=interval,
-                description=description,
-            )
-
-            session.add(plugin_row)
-            session.flush()  # get ID
-            plugin_id = plugin_row.id
-            session.commit()
-            return {
-                "id": plugin_id,
-            }
+        plugin_id = await plugin_manager.add_plugin_async(package, interval, description, executor)
+        return {
+            "id": plugin_id,
+        }
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -162,104 +326,140 @@ def create_plugin(plugin_manager: PluginManagerState, payload: dict = Body(...))
         )
 
 
-# TODO: change logic of /config/{job_id} instead
-
-# @app.post("/jobs/default")
-# def create_default_jobs(plugin_manager: PluginManagerState, payload: dict = Body(...)):
-#     """
-#     Create jobs using the plugin's default config for one or more users.
-
-#     Expected payload:
-#     {
-#       "pluginId": 1,
-#       "userIds": [1, 2],          # optional, defaults to [1]
-#       "description": "optional",  # optional
-#       "active": true              # optional, default true
-#     }
-#     """
-#     from sqlalchemy.orm import Session
-
-#     plugin_id = payload.get("pluginId")
-#     if plugin_id is None:
-#         raise HTTPException(status_code=400, detail="pluginId is required")
-
-#     session_ids = payload.get("userIds") or [1]
-#     if not isinstance(session_ids, list):
-#         raise HTTPException(status_code=400, detail="userIds must be a list")
-
-#     description = payload.get("description")
-#     active = bool(payload.get("active", True))
-
-#     plugin_item = plugin_manager.get_plugin_by_id(plugin_id)
-#     if not plugin_item:
-#         raise HTTPException(status_code=404, detail=f"Plugin with id {plugin_id} not found")
-
-#     plugin = plugin_manager.get_plugin_instance(str(plugin_item.package))
-#     if not plugin:
-#         # try to load once
-#         plugin_manager.load_plugin(str(plugin_item.package), True)
-#         plugin = plugin_manager.get_plugin_instance(str(plugin_item.package))
-#     if not plugin:
-#         raise HTTPException(status_code=500, detail="Failed to load plugin instance")
-
-#     # default config from plugin
-#     try:
-#         default_config = plugin.config()  # pydantic model
-#         config_json = default_config.model_dump_json()
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=f"Failed to get default config: {str(e)}")
-
-#     created_jobs = []
-#     with Session(plugin_manager.db_engine) as session:
-#         for session_id in session_ids:
-#             job = Job(
-#                 session_id=int(session_id),
-#                 plugin_id=plugin_item.id,
-#                 config=config_json,
-#                 active=1 if active else 0,
-#                 description=description,
-#             )
-#             session.add(job)
-#             session.flush()
-
-#             # schedule job
-#             plugin_manager.add_job_instance(job, plugin_item)
-#             if active:
-#                 plugin_manager.activate_job(job.id)
-
-#             created_jobs.append(
-#                 {
-#                     "id": job.id,
-#                     "session_id": job.session_id,
-#                     "plugin_id": job.plugin_id,
-#                     "config": job.config,
-#                     "description": job.description,
-#                     "active": job.active,
-#                 }
-#             )
-
-#         session.commit()
-
-#     return {
-#         "plugin": {
-#             "id": plugin_item.id,
-#             "package": plugin_item.package,
-#             "interval": plugin_item.interval,
-#             "description": plugin_item.description,
-#         },
-#         "jobs": created_jobs,
-#     }
+BULK_ACTIONS = ("create", "update", "activate", "deactivate")
+# user ids per bulk request
+MAX_BULK_JOBS = 50_000
+
+
+@app.post("/jobs/bulk/{action}")
+async def bulk_jobs(plugin_manager: PluginManagerState, action: str, payload: dict = Body(...)):
+    """
+    Create, update, activate or deactivate the jobs of many users of one plugin at once.
+
+    Expected payload:
+    {
+      "pluginId": 1,
+      "userIds": [1, 2],
+      "config": {...},            # create/update, the plugin's default config if left out
+      "configs": {"2": {...}},    # create/update, optional, config of a user instead of "config"
+      "description": "optional",  # create/update
+      "active": true              # create, optional, default true
+    }
+
+    Update sets the config of each user's active job. Activate picks a user's newest config
+    unless one is active already, deactivate the active one. Returns a result per user id, in
+    the order given and without repeats:
+    {"results": [{"userId": 1, "success": true, "job_id": ...},
+                 {"userId": 2, "success": false, "error": ...}], "succeeded": ..., "failed": ...}
+    """
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown bulk action: {action}")
+    plugin_id = payload.get("pluginId")
+    if plugin_id is None:
+        raise HTTPException(status_code=400, detail="pluginId is required")
+    user_ids = payload.get("userIds")
+    if not isinstance(user_ids, list) or not user_ids:
+        raise HTTPException(status_code=400, detail="userIds must be a non-empty list")
+    if len(user_ids) > MAX_BULK_JOBS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_JOBS} userIds per request")
+
+    plugin_item = await plugin_manager.get_plugin_by_id_async(plugin_id)
+    if not plugin_item:
+        raise HTTPException(status_code=404, detail=f"Plugin with id {plugin_id} not found")
+
+    # session id -> its result
+    results: Dict[int, Dict[str, Any]] = {}
+    session_ids: List[int] = []
+    for user_id in user_ids:
+        try:
+            session_ids.append(int(user_id))
+        except (TypeError, ValueError):
+            pass
+    session_ids = list(dict.fromkeys(session_ids))
+
+    try:
+        if action in ("create", "update"):
+            plugin = await plugin_manager.get_plugin_instance_async(str(plugin_item.package))
+            if not plugin:
+                raise HTTPException(status_code=500, detail="Failed to load plugin instance")
+            base = payload.get("config")
+            overrides = payload.get("configs") or {}
+            if not isinstance(overrides, dict):
+                raise HTTPException(status_code=400, detail="configs must be an object")
+            if action == "update" and base is None and not overrides:
+                raise HTTPException(status_code=400, detail="config or configs is required")
+            base_json = None
+            if base is not None or action == "create":
+                # validated once for every user without a config of its own
+                try:
+                    base_json = plugin.config(base).model_dump_json()
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid config: {str(e)}")
+
+            configs: Dict[int, str] = {}
+            for session_id in session_ids:
+                override = overrides.get(str(session_id))
+                try:
+                    if override is not None:
+                        configs[session_id] = plugin.config(override).model_dump_json()
+                    elif base_json is not None:
+                        configs[session_id] = base_json
+                    else:
+                        results[session_id] = {"success": False, "error": "No config given"}
+                except Exception as e:
+                    results[session_id] = {"success": False, "error": f"Invalid config: {str(e)}"}
+
+            if configs and action == "create":
+                results.update(
+                    await plugin_manager.add_jobs_async(
+                        plugin_id,
+                        configs,
+                        payload.get("description"),
+                        bool(payload.get("active", True)),
+                    )
+                )
+            elif configs:
+                results.update(
+                    await plugin_manager.update_jobs_async(
+                        plugin_id, configs, payload.get("description")
+                    )
+                )
+        elif session_ids:
+            results.update(
+                await plugin_manager.set_jobs_active_async(
+                    plugin_id, session_ids, action == "activate"
+                )
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to {action} jobs: {str(e)}")
+
+    ordered: List[Dict[str, Any]] = []
+    seen = set()
+    for user_id in user_ids:
+        try:
+            session_id = int(user_id)
+        except (TypeError, ValueError):
+            ordered.append({"userId": user_id, "success": False, "error": "Invalid user id"})
+            continue
+        if session_id not in seen:
+            seen.add(session_id)
+            ordered.append({"userId": session_id, **results[session_id]})
+
+    succeeded = sum(1 for result in ordered if result["success"])
+    return {"results": ordered, "succeeded": succeeded, "failed": len(ordered) - succeeded}
 
 
 @app.get("/schema/{session_id}/{plugin_id}")
-def schema(plugin_manager: PluginManagerState, session_id: int, plugin_id: int):
-    plugin_item = plugin_manager.get_plugin_by_id(plugin_id)
+async def schema(plugin_manager: PluginManagerState, session_id: int, plugin_id: int):
+    plugin_item = await plugin_manager.get_plugin_by_id_async(plugin_id)
     assert plugin_item
 
     try:
-        plugin = plugin_manager.get_plugin_instance(str(plugin_item.package))
+        plugin = await plugin_manager.get_plugin_instance_async(str(plugin_item.package))
         if plugin != None:
-            configs = plugin_manager.get_jobs_for_plugin_and_user(plugin_id, session_id)
+            configs = await plugin_manager.get_jobs_for_plugin_and_user_async(plugin_id, session_id)
             if len(configs) == 0:
                 # add empty config so that when saving it will be new job
                 configs.append(
@@ -281,60 +481,125 @@ def schema(plugin_manager: PluginManagerState, session_id: int, plugin_id: int):
 
 
 @app.post("/activate/{job_id}/{activation}")
-def activate_config(plugin_manager: PluginManagerState, job_id: int, activation: bool):
+async def activate_config(plugin_manager: PluginManagerState, job_id: int, activation: bool):
     if activation:
-        plugin_manager.activate_job(job_id)
+        await plugin_manager.activate_job_async(job_id)
     else:
-        plugin_manager.deactivate_job(job_id)
+        await plugin_manager.deactivate_job_async(job_id)
     return {"success": True}
 
 
 @app.post("/delete/{job_id}")
-def delete_job(plugin_manager: PluginManagerState, job_id: int):
-    plugin_manager.remove_job(job_id)
+async def delete_job(plugin_manager: PluginManagerState, job_id: int):
+    await plugin_manager.remove_job_async(job_id)
     return {"success": True}
 
 
 @app.post("/reload/{package}")
-def reload_plugin(plugin_manager: PluginManagerState, package: str):
-    try:
-        plugin_manager.load_plugin(package, True)
-        return {"success": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to reload plugin: {str(e)}")
+async def reload_plugin(plugin_manager: PluginManagerState, package: str):
+    result = (await asyncio.to_thread(plugin_manager.reload_plugins, [package]))[package]
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=f"Failed to reload plugin: {result['error']}")
+    return result
+
+
+@app.post("/reload")
+async def reload_plugins(plugin_manager: PluginManagerState, payload: dict = Body(...)):
+    """
+    Reload several plugins in one call, each on its own: {"packages": ["...", "..."]}.
+    Returns {package: {"success": true, "seconds": ...} | {"success": false, "error": ...}}.
+    """
+    packages = payload.get("packages")
+    if not isinstance(packages, list) or not packages:
+        raise HTTPException(status_code=400, detail="Missing required field: packages")
+    return await asyncio.to_thread(plugin_manager.reload_plugins, packages)
 
 
 @app.post("/config/{job_id}")
-def update_config(plugin_manager: PluginManagerState, job_id: int, payload: dict = Body(...)):
+async def update_config(plugin_manager: PluginManagerState, job_id: int, payload: dict = Body(...)):
     try:
         if job_id == 0:
             plugin_id = payload["pluginId"]
         else:
-            job_item = plugin_manager.get_job_by_id(job_id)
+            job_item = await plugin_manager.get_job_by_id_async(job_id)
             assert job_item
             plugin_id = int(job_item.plugin_id)  # type: ignore
 
-        plugin_item = plugin_manager.get_plugin_by_id(plugin_id)
+        plugin_item = await plugin_manager.get_plugin_by_id_async(plugin_id)
         assert plugin_item
-        plugin = plugin_manager.get_plugin_instance(str(plugin_item.package))
+        plugin = await plugin_manager.get_plugin_instance_async(str(plugin_item.package))
         if not plugin:
             return {"error": "Plugin not found"}
         config = plugin.config(payload.get("config"))
         if job_id == 0:
-            plugin_manager.add_job(
+            await plugin_manager.add_job_async(
                 payload["userId"],
                 plugin_id,
                 config.model_dump_json(),
                 payload.get("description"),
             )
         else:
-            plugin_manager.update_job(job_id, config.model_dump_json(), payload.get("description"))
+            await plugin_manager.update_job_async(
+                job_id, config.model_dump_json(), payload.get("description")
+            )
 
         return config
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update config: {str(e)}")
 
 
+@app.get("/runs")
+async def runs(
+    plugin_manager: PluginManagerState,
+    plugin_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 100,
+):
+    limit = max(1, min(limit, 1000))
+    items = await plugin_manager.get_runs_async(plugin_id, session_id, status, since, cursor, limit)
+    return {
+        "runs": items,
+        # pass back as `cursor` for the next (older) page
+        "next_cursor": items[-1].id if len(items) == limit else None,
+    }
+
+
+@app.get("/runs/{run_id}/result")
+async def run_result(plugin_manager: PluginManagerState, run_id: int, format: str = "ndjson"):
+    """
+    Stream a stored run result, read from the database a chunk at a time. DataFrame results are
+    decoded one Parquet row group at a time and sent as NDJSON (`format=ndjson`), an Arrow IPC
+    stream (`format=arrow`) or the stored Parquet file (`format=parquet`). Other results are
+    JSON (`format=json`) or NDJSON.
+    """
+    result = await plugin_manager.get_run_result_async(run_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No result stored for run {run_id}")
+
+    # the blob is read a chunk at a time by the streams, in a worker thread
+    result_format, blob = result
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(result_format, blob), media_type="application/x-ndjson"
+        )
+    if format == result_format == "json":
+        return StreamingResponse(blob.chunks(), media_type="application/json")
+    if format == result_format == "parquet":
+        return StreamingResponse(blob.chunks(), media_type="application/vnd.apache.parquet")
+    if format == "arrow" and result_format == "parquet":
+        return StreamingResponse(
+            stream_arrow(blob), media_type="application/vnd.apache.arrow.stream"
+        )
+
+    raise HTTPException(
+        status_code=400,
+        detail=f"Result of run {run_id} is {result_format}, cannot be sent as {format}",
+    )
+
+
 # static site
 static_files = os.getenv("STATIC_FILES")
 if static_files:
@@ -0,0 +1,95 @@
+import pluggy
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from plugin_runner import ActiveConfig, PluginRunner
+
+
+class Config(BaseModel):
+    symbols: str = "BTC"
+    window: int = 5
+    tags: list[str] = []
+
+
+def plugin_class(**attributes):
+    """A plugin class counting how often its `config` hook parses a config."""
+
+    class Plugin:
+        parsed = 0
+
+        @classmethod
+        def config(cls, json=None):
+            cls.parsed += 1
+            return Config.model_validate(json or {})
+
+    for name, value in attributes.items():
+        setattr(Plugin, name, value)
+    return Plugin
+
+
+def test_config_is_parsed_once_per_version_and_class():
+    plugin = plugin_class()
+    entry = ActiveConfig('{"symbols": "ETH"}', job_id=7)
+
+    first, second = entry.validated(plugin), entry.validated(plugin)
+    assert plugin.parsed == 1
+    assert first == second == Config(symbols="ETH")
+    # every run gets its own copy
+    assert first is not second
+
+    # a reloaded class validates again, as does an invalidated entry
+    reloaded = plugin_class()
+    entry.validated(reloaded)
+    assert reloaded.parsed == 1
+    entry.invalidate()
+    entry.validated(reloaded)
+    assert reloaded.parsed == 2
+
+
+def test_mutable_fields_are_copied_deeply():
+    plugin = plugin_class()
+    entry = ActiveConfig('{"tags": ["a"]}')
+
+    entry.validated(plugin).tags.append("b")
+    assert entry.validated(plugin).tags == ["a"]
+    assert not entry.shallow_copy
+
+
+def test_shared_config_is_one_frozen_instance():
+    plugin = plugin_class(shared_config=True)
+    entry = ActiveConfig('{"window": 15}')
+
+    shared = entry.validated(plugin)
+    assert entry.validated(plugin) is shared
+    assert shared.window == 15 and isinstance(shared, Config)
+    with pytest.raises(ValidationError):
+        shared.window = 1
+
+
+def test_fingerprint_is_equal_for_equal_values():
+    plugin = plugin_class()
+    explicit = ActiveConfig('{"symbols": "BTC", "window": 5}')
+    defaults = ActiveConfig("{}")
+    other = ActiveConfig('{"window": 6}')
+
+    assert explicit.fingerprint(plugin) == defaults.fingerprint(plugin)
+    assert explicit.fingerprint(plugin) != other.fingerprint(plugin)
+
+
+def test_runner_runs_with_the_active_config():
+    plugins = pluggy.PluginManager("job-scheduler")
+    plugin = plugin_class()
+    plugins.register(plugin, "tests.Plugin")
+    runner = PluginRunner(plugins)
+
+    assert runner.prepare_run("tests.Plugin", "1/1") is None
+    runner.active_configs["1/1"] = ActiveConfig('{"symbols": "SOL"}', job_id=3)
+    _, config, logger = runner.prepare_run("tests.Plugin", "1/1")
+    assert config.symbols == "SOL" and logger.name == "1/1"
+    assert runner.active_config_json("1/1") == '{"symbols": "SOL"}'
+
+    runner.prepare_run("tests.Plugin", "1/1")
+    assert plugin.parsed == 1
+    runner.invalidate_config_models()
+    runner.prepare_run("tests.Plugin", "1/1")
+    assert plugin.parsed == 2
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from executors import AsyncLoopExecutor
+
+
+async def run_jobs(executor: AsyncLoopExecutor, funcs: dict, runs: int = 1) -> list:
+    """Submit `runs` runs of each job id -> function, and return their events once done."""
+    scheduler = AsyncIOScheduler()
+    scheduler.add_executor(executor, "async")
+    loop = asyncio.get_running_loop()
+    events = []
+    done = asyncio.Event()
+    expected = len(funcs) * runs
+
+    def listener(event):
+        events.append(event)
+        if len(events) == expected:
+            loop.call_soon_threadsafe(done.set)
+
+    scheduler.add_listener(listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    scheduler.start()
+    try:
+        jobs = [
+            scheduler.add_job(
+                func, id=job_id, executor="async", next_run_time=None, max_instances=runs
+            )
+            for job_id, func in funcs.items()
+        ]
+        for _ in range(runs):
+            for job in jobs:
+                executor.submit_job(job, [datetime.now(timezone.utc)])
+        await asyncio.wait_for(done.wait(), 5)
+    finally:
+        scheduler.shutdown()
+    assert all(event.code == EVENT_JOB_EXECUTED for event in events)
+    return events
+
+
+def test_coroutines_run_on_the_schedulers_loop_and_functions_in_threads():
+    seen = []
+
+    async def coroutine_run():
+        seen.append(("coroutine", asyncio.get_running_loop(), threading.get_ident()))
+
+    def sync_run():
+        seen.append(("sync", None, threading.get_ident()))
+
+    async def scenario():
+        await run_jobs(AsyncLoopExecutor(), {"1/1": coroutine_run, "1/2": sync_run}, runs=2)
+        return asyncio.get_running_loop(), threading.get_ident()
+
+    loop, thread = asyncio.run(scenario())
+    # no loop per run, every run of the coroutine shares the scheduler's
+    assert {entry[1:] for entry in seen if entry[0] == "coroutine"} == {(loop, thread)}
+    assert thread not in {entry[2] for entry in seen if entry[0] == "sync"}
+
+
+def test_each_job_stays_on_its_worker_loop():
+    loops = {}
+
+    def recorder(job_id):
+        async def run():
+            loops.setdefault(job_id, set()).add(asyncio.get_running_loop())
+
+        return run
+
+    async def scenario():
+        executor = AsyncLoopExecutor(worker_loops=2)
+        await run_jobs(executor, {f"1/{n}": recorder(f"1/{n}") for n in range(6)}, runs=3)
+        return asyncio.get_running_loop()
+
+    scheduler_loop = asyncio.run(scenario())
+    assert all(len(job_loops) == 1 for job_loops in loops.values())
+    used = set().union(*loops.values())
+    assert scheduler_loop not in used and 1 <= len(used) <= 2
+
+
+def test_runs_per_loop_are_capped():
+    running = []
+    peak = []
+
+    async def run():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.02)
+        running.pop()
+
+    async def scenario():
+        executor = AsyncLoopExecutor(max_runs_per_loop=2)
+        await run_jobs(executor, {f"1/{n}": run for n in range(5)}, runs=2)
+
+    asyncio.run(scenario())
+    assert len(peak) == 10 and max(peak) == 2
@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from benchmarks import bench_suite
+from models import Job, Plugin
+
+
+def test_percentiles_are_in_milliseconds():
+    result = bench_suite.percentiles([0.001 * n for n in range(1, 101)])
+    assert result["p50"] == pytest.approx(51)
+    assert result["p99"] == pytest.approx(100)
+    assert result["max"] == pytest.approx(100)
+    assert result["mean"] == pytest.approx(50.5)
+    assert bench_suite.percentiles([])["p95"] is None
+
+
+def test_seed_creates_every_plugin_session_pair():
+    engine, db_connection = bench_suite.seed("noop", 3, 5, 2)
+    with Session(engine) as session:
+        assert session.scalar(select(func.count()).select_from(Plugin)) == 3
+        assert session.scalar(select(func.count()).select_from(Job)) == 15
+        assert set(session.scalars(select(Plugin.interval))) == {2}
+    assert db_connection.startswith("sqlite:///")
+    engine.dispose()
+
+
+def test_compare_prints_the_change_of_every_number(tmp_path, capsys):
+    for name, runs in (("before", 100), ("after", 150)):
+        report = {"results": {"noop": {"runs_per_sec": runs, "tick_ms": {"p50": 1.0}}}}
+        (tmp_path / f"{name}.json").write_text(json.dumps(report))
+
+    bench_suite.compare(str(tmp_path / "before.json"), str(tmp_path / "after.json"))
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["noop.runs_per_sec", "100", "150", "+50.0%"]
+    assert lines[1].split() == ["noop.tick_ms.p50", "1", "1", "+0.0%"]
+
+
+def test_a_short_noop_scenario_reports_runs_and_lag():
+    args = argparse.Namespace(
+        plugins=1,
+        sessions=3,
+        interval=1,
+        mode="thread",
+        duration=1.5,
+        warmup=0.5,
+        cpu_ms=1,
+        log_lines=1,
+    )
+    result = asyncio.run(bench_suite.run_scenario("noop", args))
+
+    assert result["jobs"] == 3 and result["expected_runs_per_sec"] == 3
+    assert result["runs_per_sec"] > 0 and result["ticks"] > 0
+    assert result["start_lag_ms"]["p50"] is not None
+    assert {"missed", "max_instances", "run_limited", "coalesced"} <= set(result)
+    # the report is plain JSON
+    json.dumps(result)
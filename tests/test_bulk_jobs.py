@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from benchmarks import synthetic
+from create_data import create_data
+from lookup_cache import LookupCache
+from models import CacheInvalidation, Job
+from plugin_manager import PluginManager
+
+CONFIG = '{"version": "1.0"}'
+
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request):
+    path = os.path.join(tempfile.mkdtemp(prefix="bulk-jobs-"), "jobs.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    create_data(
+        engine,
+        session_ids=[1, 2],
+        plugin_data=[
+            {"package": synthetic.package("noop", 0), "interval": 60, "description": "noop"}
+        ],
+    )
+    # no pooled connections, their threads would outlive the tests' event loops
+    async_engine = (
+        create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+        if request.param == "async"
+        else None
+    )
+    # publishes to `cache_invalidations`, polling only starts with the manager
+    lookup_cache = LookupCache(db_engine=engine, poll_interval=60)
+    yield PluginManager(engine, async_db_engine=async_engine, lookup_cache=lookup_cache)
+    engine.dispose()
+
+
+async def call(manager: PluginManager, method: str, *args):
+    """The async variant, which runs the sync one in a thread without an async engine."""
+    return await getattr(manager, f"{method}_async")(*args)
+
+
+def active_configs(manager: PluginManager):
+    with Session(manager.db_engine) as session:
+        rows = session.execute(select(Job.session_id, Job.config).where(Job.active == 1))
+        return dict(rows.all())
+
+
+def published(manager: PluginManager):
+    """Keys of the job invalidations for the other nodes, and clear them."""
+    with Session(manager.db_engine) as session:
+        rows = session.scalars(select(CacheInvalidation)).all()
+        for row in rows:
+            session.delete(row)
+        session.commit()
+        return sorted(row.key for row in rows if row.kind == "jobs")
+
+
+def test_create_update_and_toggle(manager):
+    async def scenario():
+        results = await call(manager, "add_jobs", 1, {2: CONFIG, 3: CONFIG}, "bulk")
+        assert all(result["success"] for result in results.values())
+        assert set(results) == {2, 3}
+        assert set(active_configs(manager)) == {1, 2, 3}
+        assert manager.runner.active_configs["1/3"].config == CONFIG
+        assert published(manager) == ["1/2", "1/3"]
+
+        results = await call(manager, "update_jobs", 1, {3: '{"version": "2.0"}', 4: CONFIG})
+        assert results[3]["success"]
+        assert results[4] == {"success": False, "error": "No active job for this session"}
+        assert manager.runner.active_configs["1/3"].config == '{"version": "2.0"}'
+        assert published(manager) == ["1/3"]
+
+        results = await call(manager, "set_jobs_active", 1, [2, 3, 4], False)
+        assert all(result["success"] for result in results.values())
+        assert set(active_configs(manager)) == {1}
+        assert "1/2" not in manager.runner.active_configs
+        assert published(manager) == ["1/2", "1/3"]
+
+        results = await call(manager, "set_jobs_active", 1, [2, 4], True)
+        assert results[2]["success"] and not results[4]["success"]
+        assert set(active_configs(manager)) == {1, 2}
+
+    asyncio.run(scenario())
+
+
+def test_rows_the_database_refuses_fail_on_their_own(manager):
+    with manager.db_engine.begin() as connection:
+        for event in ("INSERT", "UPDATE"):
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER reject_{event.lower()} BEFORE {event} ON jobs "
+                "WHEN NEW.session_id = 13 BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+            )
+
+    async def scenario():
+        results = await call(manager, "add_jobs", 1, {12: CONFIG, 13: CONFIG, 14: CONFIG})
+        assert results[12]["success"] and results[14]["success"]
+        assert results[13]["success"] is False
+        assert "rejected" in results[13]["error"]
+        assert set(active_configs(manager)) == {1, 2, 12, 14}
+        assert published(manager) == ["1/12", "1/14"]
+        assert "1/13" not in manager.runner.active_configs
+
+        results = await call(manager, "update_jobs", 1, {12: CONFIG, 2: '{"version": "2.0"}'})
+        assert all(result["success"] for result in results.values())
+
+    asyncio.run(scenario())
+
+
+def test_endpoint_returns_a_result_per_user_in_order(manager):
+    import httpx
+
+    from server import app
+
+    async def scenario():
+        app.state.plugin_manager = manager
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/jobs/bulk/deactivate", json={"pluginId": 1, "userIds": [2, "x", 9, "2"]}
+            )
+        assert response.status_code == 200
+        body = response.json()
+        assert [(result["userId"], result["success"]) for result in body["results"]] == [
+            (2, True),
+            ("x", False),
+            (9, True),
+        ]
+        assert (body["succeeded"], body["failed"]) == (2, 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,194 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Callable, List, Set
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_suite import seed
+from cluster import Cluster
+from lookup_cache import LookupCache
+from models import Job, job_shard_key
+from plugin_manager import PluginManager
+
+HEARTBEAT = 0.2
+LEASE = 1.0
+TIMEOUT = 15 * LEASE
+
+
+@pytest.fixture
+def engine():
+    engine, _ = seed("noop", 2, 12, 60)
+    yield engine
+    engine.dispose()
+
+
+def expected_jobs(engine) -> Set[str]:
+    with Session(engine) as session:
+        rows = session.execute(select(Job.plugin_id, Job.session_id)).all()
+    return {f"{plugin_id}/{session_id}" for plugin_id, session_id in rows}
+
+
+def make_node(engine, n: int) -> PluginManager:
+    return PluginManager(
+        engine,
+        lookup_cache=LookupCache(db_engine=engine, poll_interval=HEARTBEAT / 2),
+        cluster=Cluster(
+            engine,
+            node_id=f"node-{n}",
+            shards=16,
+            heartbeat_interval=HEARTBEAT,
+            lease_seconds=LEASE,
+        ),
+    )
+
+
+def scheduled(node: PluginManager) -> Set[str]:
+    return {job.id for job in node.scheduler.get_jobs()}
+
+
+def settled(nodes: List[PluginManager], expected: Set[str]) -> bool:
+    node_ids = [node.cluster.node_id for node in nodes]  # type: ignore
+    for node in nodes:
+        cluster = node.cluster
+        assert cluster is not None
+        wanted = {s for s in range(cluster.shards) if cluster.owner(s, node_ids) == cluster.node_id}
+        if cluster.owned != wanted:
+            return False
+    seen: Counter = Counter()
+    for node in nodes:
+        seen.update(scheduled(node))
+    return set(seen) == expected and all(count == 1 for count in seen.values())
+
+
+async def wait_for(check: Callable[[], bool]):
+    start = time.perf_counter()
+    while not check():
+        assert time.perf_counter() - start < TIMEOUT, "cluster did not settle"
+        await asyncio.sleep(0.05)
+
+
+def assert_owned_once(nodes: List[PluginManager], expected: Set[str]):
+    owners = {job_id: [n for n in nodes if job_id in scheduled(n)] for job_id in expected}
+    assert all(len(found) == 1 for found in owners.values())
+    for node in nodes:
+        # every node only knows the configs of the jobs it schedules
+        assert set(node.runner.active_configs) == scheduled(node)
+
+
+def test_each_job_is_owned_by_exactly_one_node(engine):
+    expected = expected_jobs(engine)
+
+    async def scenario():
+        nodes = [make_node(engine, n) for n in range(3)]
+        for node in nodes:
+            node.start()
+        try:
+            await wait_for(lambda: settled(nodes, expected))
+            assert_owned_once(nodes, expected)
+            assert all(scheduled(node) for node in nodes)
+        finally:
+            for node in nodes:
+                node.stop()
+
+    asyncio.run(scenario())
+
+
+def test_shards_rebalance_when_a_node_joins_and_leaves(engine):
+    expected = expected_jobs(engine)
+
+    async def scenario():
+        first = make_node(engine, 0)
+        first.start()
+        nodes = [first]
+        try:
+            await wait_for(lambda: settled(nodes, expected))
+            assert scheduled(first) == expected
+
+            joining = make_node(engine, 1)
+            joining.start()
+            nodes.append(joining)
+            await wait_for(lambda: settled(nodes, expected))
+            assert_owned_once(nodes, expected)
+            moved = scheduled(joining)
+            assert moved and scheduled(first) == expected - moved
+
+            nodes.remove(joining)
+            joining.stop()
+            await wait_for(lambda: settled(nodes, expected))
+            assert scheduled(first) == expected
+            assert set(first.runner.active_configs) == expected
+        finally:
+            for node in nodes:
+                node.stop()
+
+    asyncio.run(scenario())
+
+
+def test_expired_node_loses_its_jobs_without_touching_the_new_owner(engine):
+    expected = expected_jobs(engine)
+
+    async def scenario():
+        nodes = [make_node(engine, n) for n in range(2)]
+        for node in nodes:
+            node.start()
+        try:
+            await wait_for(lambda: settled(nodes, expected))
+            survivor, cut_off = nodes
+            lost = scheduled(cut_off)
+            assert lost
+
+            def unreachable():
+                raise OSError("database unreachable")
+
+            cut_off.cluster.heartbeat = unreachable  # type: ignore
+            await wait_for(lambda: not scheduled(cut_off) and settled([survivor], expected))
+
+            # the cut-off node dropped its own state, the survivor's is whole
+            assert not cut_off.runner.active_configs
+            assert set(survivor.runner.active_configs) == expected
+            assert all(survivor.runner.active_configs[job_id] for job_id in lost)
+        finally:
+            for node in nodes:
+                node.stop()
+
+    asyncio.run(scenario())
+
+
+def test_job_ids_spread_evenly_over_the_shards():
+    cluster = Cluster(None, shards=16)  # type: ignore
+    for session_ids in (range(1, 1601), range(16, 16 * 1601, 16)):
+        counts = Counter(
+            cluster.shard_of(plugin_id, session_id)
+            for plugin_id in (1, 2, 3)
+            for session_id in session_ids
+        )
+        # 300 jobs per shard on average, also for session ids that are multiples of the shards
+        assert len(counts) == 16
+        assert max(counts.values()) < 1.2 * 300 and min(counts.values()) > 0.8 * 300
+
+
+def test_the_shard_key_column_selects_the_jobs_of_a_shard(engine):
+    cluster = Cluster(engine, shards=16)
+    with Session(engine) as session:
+        # rows inserted in bulk, without the ORM, get their shard key too
+        session.execute(
+            insert(Job),
+            [{"plugin_id": 1, "session_id": 1000 + n, "config": "{}"} for n in range(5)],
+        )
+        session.commit()
+        rows = session.execute(select(Job.plugin_id, Job.session_id, Job.shard_key)).all()
+        assert all(key == job_shard_key(p, s) for p, s, key in rows)
+
+        for shard in (0, 7):
+            selected = session.execute(
+                select(Job.plugin_id, Job.session_id).where(
+                    cluster.in_shards(Job.shard_key, [shard])
+                )
+            ).all()
+            assert selected
+            assert sorted(selected) == sorted(
+                (p, s) for p, s, _ in rows if cluster.shard_of(p, s) == shard
+            )
@@ -0,0 +1,177 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from apscheduler.executors.base import BaseExecutor, run_job
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import create_engine, update
+
+import event_scheduler
+from benchmarks import synthetic
+from create_data import create_data
+from event_scheduler import JOBSTORE, EventScheduler
+from job_placement import phase_start
+from models import Job
+from plugin_manager import PluginManager
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class RecordingExecutor(BaseExecutor):
+    """Keeps the submitted (job, run times) instead of running them."""
+
+    def __init__(self):
+        super().__init__()
+        self.submitted = []
+
+    def submit_job(self, job, run_times):
+        self.submitted.append((job, run_times))
+
+    def _do_submit_job(self, job, run_times):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(event_scheduler.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = EventScheduler()
+    scheduler.add_executor(RecordingExecutor(), "default")
+    return scheduler
+
+
+def trigger(interval: float, offset: float, jitter=None) -> IntervalTrigger:
+    return IntervalTrigger(
+        seconds=interval, start_date=EPOCH + timedelta(seconds=offset), jitter=jitter
+    )
+
+
+def submitted(scheduler: EventScheduler):
+    """(job id, run time as a timestamp) of the runs submitted so far, and forget them."""
+    executor = scheduler._lookup_executor("default")
+    runs = [(job.id, run_times[0].timestamp()) for job, run_times in executor.submitted]
+    executor.submitted.clear()
+    return runs
+
+
+def test_add_pause_resume_remove(scheduler):
+    job = scheduler.add_job(print, trigger(10, 3), id="1/1")
+    assert job.offset == 3
+    assert job.next_run_time.timestamp() == 1003
+    assert scheduler.job_count() == (1, 0)
+    with pytest.raises(ConflictingIdError):
+        scheduler.add_job(print, trigger(10, 3), id="1/1")
+
+    assert scheduler.pause_job("1/1").next_run_time is None
+    assert scheduler.job_count() == (0, 1)
+    assert scheduler.resume_job("1/1").next_run_time.timestamp() == 1003
+    assert scheduler.job_count() == (1, 0)
+
+    job = scheduler.modify_job("1/1", trigger=trigger(20, 5))
+    assert (job.trigger.interval_length, job.offset) == (20, 5)
+    assert job.next_run_time.timestamp() == 1005
+
+    scheduler.remove_job("1/1")
+    assert scheduler.get_job("1/1") is None
+    assert scheduler.job_count() == (0, 0)
+    with pytest.raises(JobLookupError):
+        scheduler.remove_job("1/1")
+
+
+def test_paused_jobs_are_skipped(scheduler, clock):
+    scheduler.add_job(print, trigger(10, 3), id="1/1")
+    scheduler.add_job(print, trigger(10, 4), id="1/2")
+    scheduler.pause_job("1/2")
+
+    clock[0] = 1005
+    assert scheduler._process_jobs() == 8
+    assert submitted(scheduler) == [("1/1", 1003)]
+
+
+def test_a_stalled_scheduler_catches_up_with_one_run_per_job(scheduler, clock):
+    scheduler.add_job(print, trigger(10, 3), id="1/1")
+    scheduler.add_job(print, trigger(10, 7), id="1/2")
+
+    # four intervals late
+    clock[0] = 1045
+    assert scheduler._process_jobs() == 2
+    assert sorted(submitted(scheduler)) == [("1/1", 1043), ("1/2", 1037)]
+
+    clock[0] = 1047
+    scheduler._process_jobs()
+    assert submitted(scheduler) == [("1/2", 1047)]
+
+
+def test_jitter_delays_each_run_within_the_interval(scheduler, clock):
+    scheduler.add_job(print, trigger(10, 3, jitter=30), id="1/1")
+    scheduler.add_job(print, trigger(10, 3, jitter=30), id="1/2")
+    assert scheduler.get_job("1/1").trigger.jitter == pytest.approx(9.9)
+
+    clock[0] = 1003
+    assert scheduler._process_jobs() <= 9.9
+    assert submitted(scheduler) == []
+    scheduler.pause_job("1/2")
+
+    clock[0] = 1012.95
+    scheduler._process_jobs()
+    [(job_id, run_time)] = submitted(scheduler)
+    assert job_id == "1/1"
+    assert 1003 <= run_time <= 1012.9
+
+    # the next tick is on the phase again, whatever the previous run's jitter
+    assert scheduler.get_job("1/1").next_run_time.timestamp() == 1013
+
+
+def test_runs_past_their_misfire_grace_time_are_missed(scheduler, clock):
+    scheduler.add_job(print, trigger(10, 3), id="1/1", misfire_grace_time=1)
+    scheduler.add_job(print, trigger(10, 3), id="1/2", misfire_grace_time=None)
+
+    clock[0] = 1008
+    scheduler._process_jobs()
+    executor = scheduler._lookup_executor("default")
+    codes = {
+        job.id: [event.code for event in run_job(job, JOBSTORE, run_times, __name__)]
+        for job, run_times in executor.submitted
+    }
+    assert codes == {"1/1": [EVENT_JOB_MISSED], "1/2": [EVENT_JOB_EXECUTED]}
+
+
+def test_jobs_are_rebuilt_from_the_database_rows():
+    path = os.path.join(tempfile.mkdtemp(prefix="event-scheduler-"), "jobs.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    create_data(
+        engine,
+        session_ids=[1, 2, 3],
+        plugin_data=[
+            {"package": synthetic.package("noop", 0), "interval": 60, "description": "noop"}
+        ],
+    )
+    with engine.begin() as connection:
+        connection.execute(update(Job).where(Job.session_id == 3).values(active=0))
+
+    def scheduled_jobs():
+        manager = PluginManager(engine, engine="event", phase_offsets=True, jitter=5)
+        assert manager.scheduled_job_count() == (2, 1)
+        return {job.id: job for job in manager.scheduler.get_jobs()}
+
+    jobs = scheduled_jobs()
+    assert jobs["1/3"].next_run_time is None
+    for job_id in ("1/1", "1/2"):
+        assert jobs[job_id].trigger.jitter == 5
+        offset = (phase_start(job_id, 60) - EPOCH).total_seconds() % 60
+        assert jobs[job_id].offset == pytest.approx(offset)
+
+    # a restart puts every job back on the same tick
+    rebuilt = scheduled_jobs()
+    assert {job_id: job.next_run_time for job_id, job in rebuilt.items()} == {
+        job_id: job.next_run_time for job_id, job in jobs.items()
+    }
+    engine.dispose()
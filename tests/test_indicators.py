@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from plugins import signals
+from plugins.indicators import RESYNC_EVERY, Crossover, RollingMeans
+
+
+def rolling(values: np.ndarray, window: int) -> np.ndarray:
+    # AVG(...) OVER (ROWS BETWEEN window - 1 PRECEDING AND CURRENT ROW)
+    return pd.Series(values).rolling(window, min_periods=1).mean().to_numpy()
+
+
+@pytest.mark.parametrize("scale", [None, 100])
+def test_means_match_a_window_over_the_whole_series(scale):
+    rng = np.random.default_rng(1)
+    series = np.round(rng.uniform(1, 100, (3, 40)), 2)
+    means = RollingMeans((5, 15), scale)
+    rows = means.rows(["a", "b", "c"])
+
+    for bar in range(series.shape[1]):
+        means.push(rows, series[:, bar])
+        previous = means.means(rows, previous=True)
+        current = means.means(rows)
+        for column, window in enumerate((5, 15)):
+            expected = np.array([rolling(row[: bar + 1], window)[-1] for row in series])
+            np.testing.assert_allclose(current[:, column], expected, rtol=1e-12)
+            if bar == 0:
+                assert np.isnan(previous[:, column]).all()
+            else:
+                before = np.array([rolling(row[:bar], window)[-1] for row in series])
+                np.testing.assert_allclose(previous[:, column], before, rtol=1e-12)
+
+
+def test_float_sums_are_resynced():
+    values = 1e6 + np.random.default_rng(2).uniform(0, 1, RESYNC_EVERY * 3)
+    means = RollingMeans((7,))
+    rows = means.rows(["a"])
+    for value in values:
+        means.push(rows, np.array([value]))
+    assert means.means(rows)[0, 0] == pytest.approx(values[-7:].mean(), rel=1e-15)
+
+
+def test_fixed_point_compare_tells_equal_means_apart():
+    means = RollingMeans((2, 3), scale=10)
+    rows = means.rows(["a"])
+    for value in (0.1, 0.1, 0.1):
+        means.push(rows, np.array([value]))
+    assert means.compare(rows, 2, 3)[0] == 0
+    means.push(rows, np.array([0.2]))
+    assert means.compare(rows, 2, 3)[0] == 1
+
+
+def test_crossover_signals():
+    crossover = Crossover(2, 3)
+    seen = []
+    for value in (3, 2, 1, 5, 0, 0):
+        crossover.push(["a"], np.array([[value]]))
+        seen.append(str(crossover.latest(["a"])[2][0]))
+    # equal means after the second value, as in SQL leaving them counts as a crossing
+    assert seen == ["HOLD", "HOLD", "SELL", "BUY", "HOLD", "SELL"]
+
+
+def test_signals_match_the_sql_reference(monkeypatch):
+    symbols = [f"SYM{i}" for i in range(30)]
+    price_map = {symbol: 0.5 + i for i, symbol in enumerate(symbols)}
+    monkeypatch.setattr(signals, "_history", signals.PriceHistory())
+    state = signals.signal_state()
+
+    # the whole history on the first day, a bar per symbol on each later one
+    start = date(2026, 1, 1)
+    seen = set()
+    for day in range(20):
+        today = start + timedelta(days=day)
+        sql = signals.create_signals_sql(symbols, price_map, today)
+        incremental = signals.create_signals(symbols, price_map, today, state=state)
+
+        assert list(incremental["symbol"]) == list(sql["symbol"])
+        assert list(incremental["timestamp"]) == list(sql["timestamp"])
+        assert list(incremental["signal"]) == list(sql["signal"])
+        columns = ["close", "ma_5", "ma_15"]
+        np.testing.assert_allclose(incremental[columns], sql[columns], rtol=1e-12)
+        seen.update(sql["signal"])
+
+    # the comparison covered crossings, not only holds
+    assert {"BUY", "SELL"} <= seen
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+
+from create_data import create_data
+from plugin_manager import PluginManager
+from plugin_runner import LazyPlugin
+
+PLUGIN = """
+from pydantic import BaseModel
+
+
+class Config(BaseModel):
+    value: int = 0
+
+
+class Plugin:
+    executor = "async"
+
+    @classmethod
+    def config(cls, json=None):
+        return Config.model_validate(json or {})
+
+    @classmethod
+    async def run(cls, config, logger):
+        return config.value
+"""
+
+
+@pytest.fixture
+def plugin_rows(monkeypatch):
+    """A database with jobs of two plugin modules that are not imported yet."""
+    root = tempfile.mkdtemp(prefix="lazy-")
+    names = [f"lazy_plugin_{uuid.uuid4().hex[:8]}" for _ in range(2)]
+    for name in names:
+        with open(os.path.join(root, f"{name}.py"), "w") as f:
+            f.write(PLUGIN)
+    monkeypatch.syspath_prepend(root)
+    packages = [f"{name}.Plugin" for name in names]
+
+    engine = create_engine(f"sqlite:///{os.path.join(root, 'jobs.sqlite')}")
+    create_data(
+        engine,
+        session_ids=[1, 2],
+        plugin_data=[
+            {"package": package, "interval": 60, "description": "lazy"} for package in packages
+        ],
+    )
+    # create_data imports them for their default configs, start from a fresh process
+    for name in names:
+        del sys.modules[name]
+    yield engine, names, packages
+    for name, package in zip(names, packages):
+        PluginManager.manager.unregister(name=package)
+        sys.modules.pop(name, None)
+    engine.dispose()
+
+
+def test_lazy_plugins_are_scheduled_before_they_are_imported(plugin_rows):
+    engine, names, packages = plugin_rows
+    manager = PluginManager(engine, lazy_plugins=True)
+
+    assert manager.scheduled_job_count() == (4, 0)
+    assert not any(name in sys.modules for name in names)
+    lazy = manager.manager.get_plugin(packages[0])
+    assert isinstance(lazy, LazyPlugin) and not lazy.loaded
+    # placed by the execution mode until the class says otherwise
+    assert {job.executor for job in manager.scheduler.get_jobs()} == {"default"}
+
+    # first use imports it, and its jobs move to the executor it declares
+    assert manager.get_plugin_instance(packages[0]).config().value == 0
+    assert names[0] in sys.modules and names[1] not in sys.modules
+    assert set(manager.import_times) == {packages[0]}
+    executors = {job.id: job.executor for job in manager.scheduler.get_jobs()}
+    assert executors == {"1/1": "async", "1/2": "async", "2/1": "default", "2/2": "default"}
+
+
+def test_prewarm_imports_every_lazy_plugin(plugin_rows):
+    engine, names, packages = plugin_rows
+    manager = PluginManager(engine, lazy_plugins=True, prewarm_workers=2)
+    # the background warm-up may still be going, wait for it
+    manager.prewarm_plugins(wait=True)
+    for package in packages:
+        manager.manager.get_plugin(package).resolve()
+
+    assert all(name in sys.modules for name in names)
+    assert set(manager.import_times) == set(packages)
+    assert all(seconds >= 0 for seconds in manager.import_times.values())
+    assert {job.executor for job in manager.scheduler.get_jobs()} == {"async"}
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+from log_handler import JobLogHandler
+
+
+def record(job_id: str, message: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(job_id, level, __file__, 0, message, None, None)
+
+
+class Collector:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, job_id, lines):
+        self.calls.append((job_id, [line["message"] for line in lines]))
+
+
+def test_records_are_flushed_per_job_in_order():
+    async def scenario():
+        collector = Collector()
+        handler = JobLogHandler(collector, asyncio.get_running_loop(), flush_interval=0.05)
+        for message in ["a", "b", "c"]:
+            handler.handle(record("1/1", message))
+        handler.handle(record("2/1", "x"))
+        assert collector.calls == []
+
+        await asyncio.sleep(0.2)
+        assert sorted(collector.calls) == [("1/1", ["a", "b", "c"]), ("2/1", ["x"])]
+        assert handler.stats()["buffered"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_full_batch_is_flushed_before_the_interval():
+    async def scenario():
+        collector = Collector()
+        handler = JobLogHandler(
+            collector, asyncio.get_running_loop(), flush_interval=60, flush_size=5
+        )
+        for i in range(4):
+            handler.handle(record("1/1", str(i)))
+        await asyncio.sleep(0.05)
+        assert collector.calls == []
+
+        handler.handle(record("1/1", "4"))
+        await asyncio.sleep(0.05)
+        assert collector.calls == [("1/1", ["0", "1", "2", "3", "4"])]
+
+    asyncio.run(scenario())
+
+
+def test_records_are_sampled_then_dropped_under_pressure():
+    async def scenario():
+        collector = Collector()
+        handler = JobLogHandler(
+            collector,
+            asyncio.get_running_loop(),
+            flush_interval=60,
+            max_buffered=100,
+            sample_watermark=0.5,
+            sample_every=10,
+        )
+        # below the watermark everything is kept
+        for i in range(50):
+            handler.handle(record("1/1", f"info {i}"))
+        assert handler.stats()["buffered"] == 50
+        # above it, one in ten records below WARNING
+        for i in range(100):
+            handler.handle(record("1/1", f"sampled {i}"))
+        assert handler.stats()["buffered"] == 60
+        # warnings are kept until the buffer is full, then nothing is
+        for i in range(45):
+            handler.handle(record("2/1", f"warning {i}", logging.WARNING))
+
+        stats = handler.stats()
+        assert stats["buffered"] == 100
+        assert stats["dropped"] == 95
+        assert stats["dropped_by_job"] == {"1/1": 90, "2/1": 5}
+
+        await handler.flush_batches()
+        lines = dict(collector.calls)
+        assert len(lines["1/1"]) == 61 and len(lines["2/1"]) == 41
+        assert lines["1/1"][-1] == "90 log lines dropped (log buffer full)"
+        assert lines["2/1"][-1] == "5 log lines dropped (log buffer full)"
+
+        # the drops are reported once
+        collector.calls.clear()
+        handler.handle(record("1/1", "again"))
+        await handler.flush_batches()
+        assert collector.calls == [("1/1", ["again"])]
+
+    asyncio.run(scenario())
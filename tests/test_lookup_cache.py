@@ -0,0 +1,119 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from lookup_cache import LookupCache
+from models import Base, Job, Plugin
+
+
+@pytest.fixture
+def engine():
+    path = os.path.join(tempfile.mkdtemp(prefix="lookup-cache-"), "cache.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def job(job_id: int, plugin_id: int = 1, session_id: int = 1) -> Job:
+    return Job(id=job_id, plugin_id=plugin_id, session_id=session_id)
+
+
+def test_fills_started_before_an_invalidation_are_ignored():
+    cache = LookupCache()
+
+    # a read starts, a write invalidates while its rows are loaded
+    generation = cache.generation
+    cache.invalidate_jobs("1/1")
+    cache.set_jobs("1/1", [job(1)], generation)
+    cache.set_job(job(1), generation)
+    cache.set_plugins([Plugin(id=1)], generation)
+    assert cache.get_jobs("1/1") is None
+    assert cache.get_job(1) is None
+    assert cache.get_plugins() is None
+
+    # a read started after it is kept
+    generation = cache.generation
+    cache.set_jobs("1/1", [job(1)], generation)
+    cache.set_plugins([Plugin(id=1)], generation)
+    assert [row.id for row in cache.get_jobs("1/1")] == [1]
+    assert cache.get_plugin(1).id == 1
+
+
+@pytest.mark.parametrize(
+    "invalidate",
+    [
+        lambda cache: cache.invalidate_plugins(),
+        lambda cache: cache.invalidate_jobs("2/1"),
+        lambda cache: cache.invalidate_all_jobs(),
+        lambda cache: cache.clear(),
+    ],
+)
+def test_every_invalidation_bumps_the_generation(invalidate):
+    cache = LookupCache()
+    generation = cache.generation
+    invalidate(cache)
+    assert cache.generation > generation
+
+    cache.set_job(job(1), generation)
+    assert cache.get_job(1) is None
+
+
+def test_invalidating_a_job_list_drops_its_jobs_only():
+    cache = LookupCache()
+    generation = cache.generation
+    cache.set_jobs("1/1", [job(1), job(2)], generation)
+    for row in (job(1), job(2), job(3, session_id=2)):
+        cache.set_job(row, generation)
+
+    cache.invalidate_jobs("1/1")
+    assert cache.get_jobs("1/1") is None
+    assert cache.get_job(1) is None and cache.get_job(2) is None
+    assert cache.get_job(3).id == 3
+
+
+def test_job_entries_are_lru_bounded():
+    cache = LookupCache(max_job_lists=2, max_jobs=2)
+    generation = cache.generation
+    for n in (1, 2):
+        cache.set_jobs(f"{n}/1", [job(n, plugin_id=n)], generation)
+        cache.set_job(job(n, plugin_id=n), generation)
+    # used last, so kept over "2/1" and job 2
+    cache.get_jobs("1/1")
+    cache.get_job(1)
+    cache.set_jobs("3/1", [job(3, plugin_id=3)], generation)
+    cache.set_job(job(3, plugin_id=3), generation)
+
+    assert cache.get_jobs("2/1") is None and cache.get_job(2) is None
+    assert cache.get_jobs("1/1") is not None and cache.get_job(1) is not None
+    assert cache.stats()["job_lists"] == 2 and cache.stats()["jobs"] == 2
+
+
+def test_polled_invalidations_are_applied_once(engine):
+    writer = LookupCache(db_engine=engine, poll_interval=60)
+    reader = LookupCache(db_engine=engine, poll_interval=60)
+    seen = []
+    reader.add_listener(lambda kind, key: seen.append((kind, key)))
+
+    generation = reader.generation
+    reader.set_jobs("1/1", [job(1)], generation)
+    reader.set_plugins([Plugin(id=1)], generation)
+    with Session(engine) as session:
+        writer.publish(session, "jobs", "1/1")
+        session.commit()
+
+    reader.poll()
+    assert reader.get_jobs("1/1") is None
+    assert reader.get_plugin(1) is not None
+    assert seen == [("jobs", "1/1")]
+
+    # the lookback window reads the entry again, it is not applied twice
+    generation = reader.generation
+    reader.poll()
+    assert seen == [("jobs", "1/1")] and reader.remote_invalidations == 1
+    # nor does it bump the generation of a read in between
+    reader.set_jobs("1/1", [job(1)], generation)
+    assert reader.get_jobs("1/1") is not None
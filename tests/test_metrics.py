@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.events import (
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_SUBMITTED,
+    JobExecutionEvent,
+    JobSubmissionEvent,
+)
+
+from metrics import SchedulerMetrics
+from plugin_manager import PluginManager
+from plugin_runner import ActiveConfig, PluginRunner
+from run_tracker import RunTracker
+
+
+def test_job_histograms_are_capped():
+    metrics = SchedulerMetrics(max_job_histograms=2)
+    for session_id in range(1, 4):
+        metrics.finished(f"1/{session_id}", 0.02, 0.3, error=False)
+
+    jobs = metrics.summary("1")["jobs"]
+    assert jobs["1/1"]["lag"]["count"] == 1 and jobs["1/2"]["duration"]["count"] == 1
+    assert jobs["1/3"]["lag"] is None and jobs["1/3"]["duration"] is None
+    # the plugin's histograms still see every run
+    assert metrics.summary()["plugins"]["1"]["duration"]["count"] == 3
+
+    text = metrics.prometheus()
+    assert 'job_scheduler_job_run_duration_seconds_count{plugin_id="1",session_id="2"} 1' in text
+    assert 'session_id="3"' not in text
+    assert "job_scheduler_jobs_without_histograms 1" in text
+
+    # a removed job frees its place for the next new one
+    metrics.remove("1/1")
+    metrics.finished("1/4", 0.01, 0.1, error=False)
+    assert metrics.summary("1")["jobs"]["1/4"]["lag"]["count"] == 1
+
+
+class NoScheduler:
+    def get_job(self, job_id):
+        raise AssertionError("looked up a job on every tick")
+
+
+class Recorder:
+    def __init__(self):
+        self.records = []
+
+    def record(self, run, result):
+        self.records.append(run)
+
+
+def test_tracker_keeps_intervals_and_overlapping_runs_apart():
+    plugin_manager = PluginManager.__new__(PluginManager)
+    plugin_manager.scheduler = NoScheduler()
+    plugin_manager.metrics = SchedulerMetrics()
+    plugin_manager.runner = PluginRunner(PluginManager.manager)
+    plugin_manager.runner.active_configs["1/1"] = ActiveConfig("{}", 7)
+    plugin_manager.run_recorder = recorder = Recorder()
+    tracker = RunTracker(plugin_manager)
+    tracker.intervals["1"] = 10
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    first, second = start, start + timedelta(seconds=30)
+
+    # two runs of the same job in flight at once, the second after two coalesced ticks
+    for run_time in (first, second):
+        tracker.listen(JobSubmissionEvent(EVENT_JOB_SUBMITTED, "1/1", "default", [run_time]))
+    for run_time in (second, first):
+        tracker.listen(JobExecutionEvent(EVENT_JOB_EXECUTED, "1/1", "default", run_time))
+
+    assert plugin_manager.metrics.totals()["coalesced"] == 2
+    assert [record["scheduled_at"] for record in recorder.records] == [second, first]
+    # each run found its own submission
+    assert all(
+        record["job_id"] == 7 and record["duration"] is not None for record in recorder.records
+    )
+    assert tracker._submitted == {}
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+
+from models import Base
+from plugin_manager import PluginManager
+from plugin_watcher import PluginWatcher
+
+PLUGIN = """
+from . import helper
+
+
+class Plugin:
+    @classmethod
+    def run(cls):
+        return helper.VERSION
+"""
+
+
+def write(path: str, source: str):
+    with open(path, "w") as f:
+        f.write(source)
+
+
+@pytest.fixture
+def plugins(monkeypatch):
+    """Two plugin packages side by side in a module path, each with a helper module."""
+    root = tempfile.mkdtemp(prefix="watch-")
+    packages = []
+    for _ in range(2):
+        name = f"watched_plugin_{uuid.uuid4().hex[:8]}"
+        os.mkdir(os.path.join(root, name))
+        write(os.path.join(root, name, "__init__.py"), "from .plugin import Plugin\n")
+        write(os.path.join(root, name, "plugin.py"), PLUGIN)
+        write(os.path.join(root, name, "helper.py"), "VERSION = 1\n")
+        packages.append(f"{name}.Plugin")
+    monkeypatch.syspath_prepend(root)
+    # edits within the same second must not load a stale .pyc
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    for package in packages:
+        PluginManager.import_plugin(package)
+    yield root, packages
+    for package in packages:
+        PluginManager.manager.unregister(name=package)
+        for module in PluginManager.plugin_modules(package):
+            del sys.modules[module]
+
+
+def test_a_changed_file_reloads_only_its_plugin(plugins):
+    root, packages = plugins
+    changed, untouched = packages
+    engine = create_engine(f"sqlite:///{os.path.join(root, 'jobs.sqlite')}")
+    Base.metadata.create_all(engine)
+    manager = PluginManager(engine)
+    watcher = PluginWatcher(manager, [root], backend="poll", debounce=0.1, poll_interval=0.05)
+    classes = {package: manager.manager.get_plugin(package) for package in packages}
+    versions = {package: PluginManager.plugin_version(package) for package in packages}
+
+    watcher.start()
+    try:
+        # let the first snapshot be taken before the edit
+        time.sleep(0.2)
+        write(os.path.join(root, changed.partition(".")[0], "helper.py"), "VERSION = 2\n")
+        deadline = time.monotonic() + 10
+        while watcher.reloads == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+        engine.dispose()
+
+    assert watcher.reloads == 1
+    assert manager.manager.get_plugin(changed) is not classes[changed]
+    assert manager.manager.get_plugin(changed).run() == 2
+    assert PluginManager.plugin_version(changed) == versions[changed] + 1
+    assert manager.manager.get_plugin(untouched) is classes[untouched]
+    assert PluginManager.plugin_version(untouched) == versions[untouched]
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from apscheduler.executors.base import MaxInstancesReachedError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from benchmarks import synthetic
+from executors import PluginProcessExecutor, RunLimiter, run_in_worker
+
+PACKAGE = synthetic.package("noop", 0)
+
+
+def test_a_spawned_worker_runs_the_job():
+    limiter = RunLimiter()
+    executor = PluginProcessExecutor(
+        lambda scheduler_job_id: '{"value": 3}',
+        packages=[PACKAGE],
+        max_workers=1,
+        limiter=limiter,
+        limit=lambda package: 1,
+    )
+
+    async def scenario():
+        scheduler = AsyncIOScheduler()
+        scheduler.add_executor(executor, "process")
+        events = []
+        done = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def listener(event):
+            events.append(event)
+            loop.call_soon_threadsafe(done.set)
+
+        scheduler.add_listener(listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+        # returns with the worker started and the plugin imported
+        scheduler.start()
+        try:
+            job = scheduler.add_job(
+                run_in_worker,
+                "date",
+                run_date=datetime.now(timezone.utc),
+                args=[PACKAGE, "1/1", None],
+                id="1/1",
+                executor="process",
+                misfire_grace_time=1,
+                next_run_time=None,
+            )
+
+            # the plugin is at its run limit, the run is refused before it is queued
+            assert limiter.try_acquire(PACKAGE, 1)
+            with pytest.raises(MaxInstancesReachedError):
+                executor.submit_job(job, [datetime.now(timezone.utc)])
+            assert limiter.skipped[PACKAGE] == 1
+            limiter.release(PACKAGE, 1)
+
+            # a date trigger, the worker does not rely on the job's trigger for the interval
+            executor.submit_job(job, [datetime.now(timezone.utc)])
+            await asyncio.wait_for(done.wait(), 30)
+        finally:
+            scheduler.shutdown()
+
+        [event] = events
+        assert (event.code, event.job_id, event.retval) == (EVENT_JOB_EXECUTED, "1/1", True)
+        # the slot taken on submission is given back with the result
+        assert limiter.running(PACKAGE) == 0
+
+    asyncio.run(scenario())
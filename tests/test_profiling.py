@@ -0,0 +1,78 @@
+import tracemalloc
+
+import pluggy
+
+from plugin_runner import PluginRunner
+from profiling import RunHooks
+
+# allocations of the profiled runs, kept alive past them
+kept = []
+
+
+def busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def allocate():
+    kept.append([bytearray(1024) for _ in range(200)])
+
+
+def run(runner: PluginRunner, scheduler_job_id: str, work, error=None):
+    try:
+        with RunHooks(runner.run_hooks.hook, scheduler_job_id, "tests.Plugin"):
+            work()
+            if error is not None:
+                raise error
+    except Exception:
+        pass
+
+
+def test_cprofile_capture_of_the_next_runs():
+    runner = PluginRunner(pluggy.PluginManager("alpha-miner"))
+    assert not runner._hooked()
+    capture = runner.profiler.arm("1/1", runs=2, mode="cprofile", memory=False)
+    assert runner._hooked()
+
+    # another job's run is not profiled
+    run(runner, "1/2", lambda: busy(1000))
+    run(runner, "1/1", lambda: busy(1000))
+    assert not capture.done.is_set()
+    run(runner, "1/1", lambda: busy(1000), ValueError("boom"))
+
+    assert capture.done.is_set() and not runner._hooked()
+    result = capture.result()
+    assert result["complete"] and len(result["runs"]) == 2
+    assert [stats["error"] for stats in result["runs"]] == [None, "ValueError('boom')"]
+    assert all(stats["wall"] > 0 and stats["peak_alloc"] is None for stats in result["runs"])
+    [row] = [row for row in capture.functions() if row["function"].startswith("busy ")]
+    assert row["calls"] == 2
+    # a third run after the capture ends is not recorded
+    run(runner, "1/1", lambda: busy(1000))
+    assert len(capture.run_stats) == 2
+
+
+def test_memory_capture_traces_only_while_armed():
+    runner = PluginRunner(pluggy.PluginManager("alpha-miner"))
+    was_tracing = tracemalloc.is_tracing()
+    capture = runner.profiler.arm("1/1", runs=1, mode="cprofile", memory=True)
+
+    run(runner, "1/1", allocate)
+
+    assert capture.done.is_set()
+    [stats] = capture.run_stats
+    assert stats["peak_alloc"] >= 200 * 1024
+    where, size = capture.allocations.most_common(1)[0]
+    assert __file__ in where and size >= 200 * 1024
+    # turned on for the capture, and off again once it is done
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_disarm_finishes_a_capture_with_the_runs_so_far():
+    runner = PluginRunner(pluggy.PluginManager("alpha-miner"))
+    capture = runner.profiler.arm("1/1", runs=5, mode="cprofile", memory=False)
+    run(runner, "1/1", lambda: busy(10))
+
+    assert runner.profiler.disarm("1/1") is capture
+    assert capture.done.is_set() and len(capture.run_stats) == 1
+    assert runner.profiler.latest("1/1") is capture
+    assert not runner._hooked()
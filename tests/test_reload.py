@@ -0,0 +1,129 @@
+import os
+import sys
+import tempfile
+import textwrap
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+
+import plugins.indicators
+from models import Base
+from plugin_manager import PluginManager
+
+PLUGIN = """
+from plugins import indicators
+
+from . import helper
+
+
+class Plugin:
+    started = None
+    release = None
+
+    @classmethod
+    def run(cls):
+        if cls.started is not None:
+            cls.started.set()
+            cls.release.wait(5)
+        # read at the end of the run, from the module globals it started with
+        return helper.VERSION
+"""
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    """A plugin package with a helper module, importing the shared `plugins.indicators`."""
+    root = tempfile.mkdtemp(prefix="reload-")
+    name = f"reload_plugin_{uuid.uuid4().hex[:8]}"
+    os.mkdir(os.path.join(root, name))
+    write(root, name, "__init__.py", "from .plugin import Plugin\n")
+    write(root, name, "plugin.py", PLUGIN)
+    write(root, name, "helper.py", "VERSION = 1\n")
+    monkeypatch.syspath_prepend(root)
+    # edits within the same second must not load a stale .pyc
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+
+    package = f"{name}.Plugin"
+    PluginManager.import_plugin(package)
+    yield root, name, package
+    PluginManager.manager.unregister(name=package)
+    for module in PluginManager.plugin_modules(package):
+        del sys.modules[module]
+
+
+def write(root: str, name: str, filename: str, source: str):
+    with open(os.path.join(root, name, filename), "w") as f:
+        f.write(textwrap.dedent(source))
+
+
+def test_only_the_plugins_own_modules_are_reimported(plugin):
+    root, name, package = plugin
+    old = {module: sys.modules[module] for module in PluginManager.plugin_modules(package)}
+    assert set(old) == {name, f"{name}.plugin", f"{name}.helper"}
+
+    write(root, name, "helper.py", "VERSION = 22\n")
+    new_class = PluginManager.reimport_plugin(package)
+
+    assert new_class.run() == 22
+    assert PluginManager.manager.get_plugin(package) is new_class
+    for module, old_module in old.items():
+        assert sys.modules[module] is not old_module
+    # shared by every plugin, not part of this one
+    assert sys.modules["plugins.indicators"] is plugins.indicators
+    assert sys.modules[f"{name}.plugin"].indicators is plugins.indicators
+
+
+def test_a_failed_import_restores_the_old_modules(plugin):
+    root, name, package = plugin
+    old_class = PluginManager.manager.get_plugin(package)
+    old = {module: sys.modules[module] for module in PluginManager.plugin_modules(package)}
+
+    write(root, name, "helper.py", "VERSION = (\n")
+    with pytest.raises(SyntaxError):
+        PluginManager.reimport_plugin(package)
+
+    assert {module: sys.modules[module] for module in PluginManager.plugin_modules(package)} == old
+    assert sys.modules[name].plugin is old[f"{name}.plugin"]
+    assert PluginManager.manager.get_plugin(package) is old_class
+    assert old_class.run() == 1
+
+
+def test_a_run_in_progress_keeps_the_old_class(plugin):
+    root, name, package = plugin
+    old_class = PluginManager.manager.get_plugin(package)
+    old_class.started, old_class.release = threading.Event(), threading.Event()
+    results = []
+    run = threading.Thread(target=lambda: results.append(old_class.run()))
+    run.start()
+    assert old_class.started.wait(5)
+
+    write(root, name, "helper.py", "VERSION = 22\n")
+    new_class = PluginManager.reimport_plugin(package)
+    old_class.release.set()
+    run.join(5)
+
+    assert results == [1]
+    assert new_class is not old_class
+    assert new_class.run() == 22
+
+
+def test_load_plugin_with_override_reloads(plugin):
+    root, name, package = plugin
+    engine = create_engine(f"sqlite:///{os.path.join(root, 'jobs.sqlite')}")
+    Base.metadata.create_all(engine)
+    manager = PluginManager(engine)
+    old_class = manager.load_plugin(package)
+    version = PluginManager.plugin_version(package)
+
+    write(root, name, "helper.py", "VERSION = (\n")
+    # the error is logged, the old class stays
+    assert manager.load_plugin(package, override=True) is old_class
+
+    write(root, name, "helper.py", "VERSION = 22\n")
+    new_class = manager.load_plugin(package, override=True)
+    assert new_class is not old_class
+    assert new_class.run() == 22
+    assert PluginManager.plugin_version(package) == version + 1
+    engine.dispose()
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from result_cache import ResultCache
+
+
+class Runs:
+    """A run function counting its calls, optionally held until `release` is set."""
+
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def later(seconds: float = 60) -> float:
+    return time.time() + seconds
+
+
+def test_results_are_reused_until_they_expire():
+    cache = ResultCache()
+    run = Runs()
+    assert cache.get_or_run("key", later(0.05), run) == "result"
+    assert cache.get_or_run("key", later(0.05), run) == "result"
+    assert run.calls == 1
+
+    time.sleep(0.1)
+    cache.get_or_run("key", later(), run)
+    assert run.calls == 2
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["evictions"] == {"expired": 1}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.get_or_run(key, later(), Runs(key))
+    # "a" used last, "b" goes first
+    cache.get_or_run("a", later(), Runs())
+    cache.get_or_run("c", later(), Runs("c"))
+
+    run = Runs("b again")
+    assert cache.get_or_run("b", later(), run) == "b again" and run.calls == 1
+    assert cache.stats()["evictions"] == {"lru": 2}
+
+
+def test_entries_are_bounded_by_bytes():
+    value = b"x" * 100
+    cache = ResultCache(max_bytes=250)
+    cache.get_or_run("a", later(), Runs(value))
+    cache.get_or_run("b", later(), Runs(value))
+    assert cache.stats()["entries"] == 1 and cache.bytes <= 250
+
+    # a result larger than the cap is returned but not kept
+    large = b"x" * 1000
+    assert cache.get_or_run("c", later(), Runs(large)) == large
+    assert cache.stats()["entries"] == 1
+
+
+def test_identical_runs_from_threads_share_one_run():
+    cache = ResultCache()
+    run = Runs()
+    run.release.clear()
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(cache.get_or_run, "key", later(), run) for _ in range(8)]
+        while cache.stats()["shared"] < 7:
+            time.sleep(0.01)
+        run.release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["result"] * 8
+    assert run.calls == 1
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_errors_reach_the_waiters_and_are_not_cached():
+    cache = ResultCache()
+    run = Runs(error=ValueError("failed"))
+    run.release.clear()
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(cache.get_or_run, "key", later(), run) for _ in range(3)]
+        while cache.stats()["shared"] < 2:
+            time.sleep(0.01)
+        run.release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert run.calls == 1
+
+    assert cache.get_or_run("key", later(), Runs("ok")) == "ok"
+
+
+def test_identical_async_runs_share_one_run():
+    async def scenario():
+        cache = ResultCache()
+        calls = 0
+
+        async def run():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(
+            *(cache.get_or_run_async("key", later(), run) for _ in range(5))
+        )
+        assert results == ["result"] * 5 and calls == 1
+        assert await cache.get_or_run_async("key", later(), run) == "result"
+        assert calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_async_run_waits_for_a_thread_in_flight():
+    async def scenario():
+        cache = ResultCache()
+        run = Runs()
+        run.release.clear()
+        leader = asyncio.get_running_loop().run_in_executor(
+            None, cache.get_or_run, "key", later(), run
+        )
+        while cache.stats()["in_flight"] == 0:
+            await asyncio.sleep(0.01)
+
+        async def never():
+            raise AssertionError("ran twice")
+
+        waiter = asyncio.ensure_future(cache.get_or_run_async("key", later(), never))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        run.release.set()
+        assert await waiter == "result" and await leader == "result"
+
+    asyncio.run(scenario())
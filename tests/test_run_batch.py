@@ -0,0 +1,167 @@
+import asyncio
+import uuid
+
+import pluggy
+import pytest
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from pydantic import BaseModel
+
+from executors import RunBatcher
+from job_placement import PHASE_EPOCH, JobPlacement
+from models import Plugin
+from plugin_manager import PluginManager
+from plugin_runner import ActiveConfig, PluginRunner, run_job, run_job_async, run_job_batched
+
+
+class Config(BaseModel):
+    value: int = 0
+
+
+class BatchPlugin:
+    """Doubles each config's value, `calls` records the configs of every `run_batch` call."""
+
+    calls: list = []
+
+    @classmethod
+    def config(cls, json=None):
+        return Config.model_validate(json or {})
+
+    @classmethod
+    async def run_batch(cls, configs, loggers):
+        cls.calls.append([config.value for config in configs])
+        return [ValueError("odd") if config.value % 2 else config.value * 2 for config in configs]
+
+
+def test_batcher_groups_the_runs_of_a_key_within_the_window():
+    calls = []
+
+    async def run(items):
+        calls.append(items)
+        return [item.upper() for item in items]
+
+    async def scenario():
+        batcher = RunBatcher(window=0.05)
+        first = await asyncio.gather(
+            batcher.submit("a", "x", run),
+            batcher.submit("a", "y", run),
+            batcher.submit("b", "z", run),
+        )
+        # the next tick is a batch of its own
+        second = await batcher.submit("a", "w", run)
+        return batcher, first, second
+
+    batcher, first, second = asyncio.run(scenario())
+    assert first == ["X", "Y", "Z"] and second == "W"
+    assert sorted(calls) == [["w"], ["x", "y"], ["z"]]
+    assert (batcher.batches, batcher.batched_runs) == (3, 4)
+
+
+def test_a_full_batch_is_flushed_before_the_window_ends():
+    calls = []
+
+    async def run(items):
+        calls.append(list(items))
+        return items
+
+    async def scenario():
+        batcher = RunBatcher(window=30)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit("a", i, run, max_size=2) for i in range(4))), 5
+        )
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3]
+    assert calls == [[0, 1], [2, 3]]
+
+
+def test_each_caller_gets_its_own_result_or_error():
+    async def run(items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    async def short(items):
+        return items[:1]
+
+    async def scenario():
+        batcher = RunBatcher(window=0.01)
+        results = await asyncio.gather(
+            batcher.submit("a", "ok", run),
+            batcher.submit("a", "bad", run),
+            return_exceptions=True,
+        )
+        assert results[0] == "ok"
+        assert isinstance(results[1], ValueError)
+
+        # a batch that does not answer every run fails all of them
+        results = await asyncio.gather(
+            batcher.submit("a", 1, short), batcher.submit("a", 2, short), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def runner():
+    plugins = pluggy.PluginManager("alpha-miner")
+    plugins.register(BatchPlugin, "tests.BatchPlugin")
+    BatchPlugin.calls = []
+    return PluginRunner(plugins, batch_window=0.05)
+
+
+@pytest.mark.parametrize("placement", ["thread", "async"])
+def test_the_jobs_of_a_tick_share_one_run_batch_call(runner, placement):
+    runner.batch_placements["tests.BatchPlugin"] = placement
+    for session_id, config in [(1, '{"value": 1}'), (2, '{"value": 2}'), (3, '{"value": "x"}')]:
+        runner.active_configs[f"1/{session_id}"] = ActiveConfig(config)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(
+                run_job_batched("tests.BatchPlugin", f"1/{session_id}", runner.name)
+                for session_id in (1, 2, 3, 4)
+            ),
+            return_exceptions=True,
+        )
+
+    odd, doubled, invalid, inactive = asyncio.run(scenario())
+    # one call, with the configs that validate
+    assert BatchPlugin.calls == [[1, 2]]
+    assert isinstance(odd, ValueError)
+    assert doubled == 4
+    # a config that does not validate fails its own job only
+    assert isinstance(invalid, Exception)
+    # a job without an active config has nothing to run
+    assert inactive is None
+
+
+def test_batched_plugins_are_placed_on_the_batch_executor():
+    package = f"tests.batch_{uuid.uuid4().hex[:8]}.Plugin"
+    plugin_manager = PluginManager.__new__(PluginManager)
+    plugin_manager.runner = PluginRunner(PluginManager.manager)
+    plugin_manager.scheduler = AsyncIOScheduler()
+    plugin_manager.execution_mode = "thread"
+    plugin_manager.worker_loops = 0
+    plugin_manager.max_runs_per_loop = None
+    plugin_manager.phase_offsets = True
+    plugin_manager.jitter = 5
+    placements = JobPlacement(plugin_manager, default_executor=False)
+    row = Plugin(id=1, package=package, interval=60, executor="async")
+
+    # not imported yet, nothing is known about `run_batch`
+    assert placements.target(row) == (run_job_async, "async")
+
+    PluginManager.manager.register(BatchPlugin, package)
+    try:
+        assert placements.target(row) == (run_job_batched, "batch")
+        # the run_batch call itself goes where the plugin is placed
+        assert plugin_manager.runner.batch_placements[package] == "async"
+
+        # every job of the plugin on the same tick, without jitter, to be batched together
+        trigger = placements.trigger("1/7", 60, batched=True)
+        assert trigger.start_date == PHASE_EPOCH and not trigger.jitter
+
+        row.executor = None
+        assert placements.target(row) == (run_job_batched, "batch")
+        assert plugin_manager.runner.batch_placements[package] == "thread"
+    finally:
+        PluginManager.manager.unregister(name=package)
+    assert placements.target(row) == (run_job, "default")
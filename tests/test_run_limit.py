@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, JobSubmissionEvent
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from executors import EVENT_JOB_RUN_LIMITED, LimitedThreadExecutor, RunLimiter
+from metrics import SchedulerMetrics
+from plugin_manager import PluginManager
+from run_tracker import RunTracker
+
+
+def test_try_acquire_never_queues():
+    limiter = RunLimiter()
+    assert limiter.try_acquire("pkg", 2)
+    assert limiter.try_acquire("pkg", 2)
+    assert not limiter.try_acquire("pkg", 2)
+    assert limiter.skipped["pkg"] == 1
+    assert limiter.waiting() == {}
+
+    limiter.release("pkg", 2)
+    assert limiter.try_acquire("pkg", 2)
+    assert limiter.try_acquire("other", None)
+    assert limiter.running("other") == 0
+
+
+def test_limited_runs_are_skipped_before_they_take_a_thread():
+    limiter = RunLimiter()
+    release = threading.Event()
+    started = []
+
+    def blocking_run(package, scheduler_job_id):
+        started.append(scheduler_job_id)
+        release.wait(5)
+
+    async def scenario():
+        scheduler = AsyncIOScheduler()
+        scheduler.add_executor(LimitedThreadExecutor(limiter, lambda package: 1), "default")
+        events = []
+        scheduler.add_listener(
+            lambda event: events.append((event.code, event.job_id)),
+            EVENT_JOB_EXECUTED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_RUN_LIMITED,
+        )
+        scheduler.start()
+        now = datetime.now(timezone.utc) + timedelta(milliseconds=100)
+        for job_id in ("1/1", "1/2", "1/3"):
+            scheduler.add_job(blocking_run, "date", run_date=now, args=["pkg", job_id], id=job_id)
+        await asyncio.sleep(0.5)
+
+        # one run holds the plugin's slot, the others never reached the pool
+        assert len(started) == 1
+        limited = [job_id for code, job_id in events if code == EVENT_JOB_RUN_LIMITED]
+        assert set(limited) == {"1/1", "1/2", "1/3"} - set(started)
+        assert len(limited) == 2
+        # APScheduler still reports each refused tick as skipped for max_instances
+        skipped = {job_id for code, job_id in events if code == EVENT_JOB_MAX_INSTANCES}
+        assert skipped == set(limited)
+        assert limiter.running("pkg") == 1
+
+        release.set()
+        await asyncio.sleep(0.2)
+        assert limiter.running("pkg") == 0
+        assert (EVENT_JOB_EXECUTED, started[0]) in events
+        scheduler.shutdown(wait=False)
+
+    asyncio.run(scenario())
+
+
+def test_limited_ticks_are_not_counted_as_max_instances():
+    plugin_manager = PluginManager.__new__(PluginManager)
+    plugin_manager.scheduler = AsyncIOScheduler()
+    plugin_manager.metrics = SchedulerMetrics()
+    plugin_manager.run_recorder = None
+    tracker = RunTracker(plugin_manager)
+    run_time = datetime.now(timezone.utc)
+
+    def event(code, job_id):
+        return JobSubmissionEvent(code, job_id, "default", [run_time])
+
+    # a tick refused for the run limit, then the scheduler's report of the same tick
+    tracker.listen(event(EVENT_JOB_RUN_LIMITED, "1/1"))
+    assert tracker.run_limited(event(EVENT_JOB_MAX_INSTANCES, "1/1"))
+    tracker.listen(event(EVENT_JOB_MAX_INSTANCES, "1/1"))
+    assert not tracker.run_limited(event(EVENT_JOB_MAX_INSTANCES, "1/1"))
+    # a tick skipped because the job's previous run was still going
+    tracker.listen(event(EVENT_JOB_MAX_INSTANCES, "1/2"))
+
+    totals = plugin_manager.metrics.totals()
+    assert (totals["run_limited"], totals["max_instances"]) == (1, 1)
+    jobs = plugin_manager.metrics.summary("1")["jobs"]
+    assert (jobs["1/1"]["run_limited"], jobs["1/1"]["max_instances"]) == (1, 0)
+    assert (jobs["1/2"]["run_limited"], jobs["1/2"]["max_instances"]) == (0, 1)
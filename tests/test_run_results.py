@@ -0,0 +1,129 @@
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+import run_store
+from models import Base, JobRun, JobRunResult
+from run_store import ResultBlob, serialize_result, stream_arrow, stream_ndjson
+
+
+@pytest.fixture
+def engine():
+    path = os.path.join(tempfile.mkdtemp(prefix="run-results-"), "runs.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def store(engine, run_id: int, result) -> int:
+    result_format, data = serialize_result(result)
+    with Session(engine) as session:
+        session.add(
+            JobRun(
+                id=run_id,
+                scheduler_job_id="1/1",
+                plugin_id=1,
+                session_id=1,
+                finished_at=datetime.now(timezone.utc),
+                status="success",
+                result_format=result_format,
+            )
+        )
+        session.flush()
+        session.add(JobRunResult(run_id=run_id, format=result_format, data=data))
+        session.commit()
+    return len(data)
+
+
+def count_queries(engine):
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    return queries
+
+
+def test_blob_is_read_in_chunks(engine, monkeypatch):
+    monkeypatch.setattr(run_store, "PARQUET_ROW_GROUP_SIZE", 1000)
+    frame = pd.DataFrame({"symbol": [f"S{i % 50}" for i in range(20_000)], "close": range(20_000)})
+    size = store(engine, 1, frame)
+
+    blob = ResultBlob(engine, 1, size, chunk_size=4096)
+    queries = count_queries(engine)
+    assert b"".join(blob.chunks()) == serialize_result(frame)[1]
+    assert len(queries) == -(-size // 4096)
+    assert all("substr" in query for query in queries)
+
+    blob.seek(-8, io.SEEK_END)
+    assert blob.read()[-4:] == b"PAR1"
+
+    lines = b"".join(stream_ndjson("parquet", ResultBlob(engine, 1, size, 4096))).splitlines()
+    assert len(lines) == 20_000
+    assert json.loads(lines[-1]) == {"symbol": "S49", "close": 19_999}
+
+    table = pa.ipc.open_stream(b"".join(stream_arrow(ResultBlob(engine, 1, size, 4096)))).read_all()
+    assert table.to_pandas().equals(frame)
+
+
+def test_json_results(engine):
+    size = store(engine, 2, [{"a": 1}, {"a": 2}])
+    blob = ResultBlob(engine, 2, size, chunk_size=3)
+    assert b"".join(stream_ndjson("json", blob)) == b'{"a": 1}\n{"a": 2}\n'
+
+
+def test_endpoint_streams_the_stored_formats(engine):
+    import asyncio
+
+    import httpx
+
+    from plugin_manager import PluginManager
+    from server import app
+
+    frame = pd.DataFrame({"close": [1.0, 2.0, 3.0]})
+    store(engine, 3, frame)
+    store(engine, 4, {"signal": "buy"})
+    app.state.plugin_manager = PluginManager(engine)
+
+    async def get(path: str) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+
+    async def scenario():
+        response = await get("/runs/3/result?format=parquet")
+        assert response.content == serialize_result(frame)[1]
+        response = await get("/runs/3/result?format=ndjson")
+        assert response.text.splitlines() == ['{"close": 1.0}', '{"close": 2.0}', '{"close": 3.0}']
+        response = await get("/runs/4/result?format=json")
+        assert response.json() == {"signal": "buy"}
+        assert (await get("/runs/4/result?format=arrow")).status_code == 400
+        assert (await get("/runs/5/result")).status_code == 404
+
+    asyncio.run(scenario())
+
+
+def test_missed_run_is_recorded(engine):
+    from apscheduler.events import EVENT_JOB_MISSED, JobExecutionEvent
+
+    from plugin_manager import PluginManager
+    from run_store import RunRecorder
+
+    recorder = RunRecorder(engine)
+    manager = PluginManager(engine, run_recorder=recorder)
+    scheduled = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    manager.job_listener(JobExecutionEvent(EVENT_JOB_MISSED, "1/2", "default", scheduled))
+
+    recorder.write([recorder.queue.get_nowait()])
+    with Session(engine) as session:
+        run = session.query(JobRun).one()
+    assert (run.scheduler_job_id, run.plugin_id, run.session_id) == ("1/2", 1, 2)
+    assert run.status == "missed"
+    assert run.scheduled_at.replace(tzinfo=timezone.utc) == scheduled
+    assert run.started_at is None and run.duration is None and run.result_format is None
@@ -0,0 +1,73 @@
+import threading
+
+import numpy as np
+
+from plugins import signals
+from plugins.signals import PriceHistory
+
+PRICES = {"BTC": 43000.0, "ETH": 2300.0, "XRP": 0.62}
+DAY = np.datetime64("2026-01-10", "D")
+
+
+def closes(history: PriceHistory, symbols, today=DAY) -> dict:
+    return {symbol: close.copy() for symbol, _, close, _ in history.series(symbols, PRICES, today)}
+
+
+def test_a_symbols_bars_do_not_depend_on_the_others_requested():
+    alone = closes(PriceHistory(), ["ETH"])
+    together = closes(PriceHistory(), ["BTC", "ETH", "UNKNOWN", "ETH"])
+
+    # unknown symbols are skipped, duplicates answered once
+    assert list(together) == ["BTC", "ETH"]
+    np.testing.assert_array_equal(alone["ETH"], together["ETH"])
+    assert len(alone["ETH"]) == signals.NUM_DAYS
+    # a random walk from the "today" price
+    assert abs(alone["ETH"][0] / PRICES["ETH"] - 1) < 0.05
+
+
+def test_later_days_only_append_their_bars():
+    history = PriceHistory(num_days=30)
+    first = closes(history, ["BTC"])["BTC"]
+    # the same day again generates nothing
+    np.testing.assert_array_equal(closes(history, ["BTC"])["BTC"], first)
+
+    later = closes(history, ["BTC"], DAY + 3)["BTC"]
+    assert len(later) == 30
+    # the bars known so far are kept, shifted by the three new ones
+    np.testing.assert_array_equal(later[:-3], first[3:])
+    # continuing the walk from the last close
+    assert abs(later[-3] / first[-1] - 1) < 0.05
+
+
+def test_bars_are_the_last_days_of_each_symbol_as_arrow():
+    table = PriceHistory().bars(["XRP", "BTC"], PRICES, DAY, last=signals.SIGNAL_BARS)
+
+    assert table.num_rows == 2 * signals.SIGNAL_BARS
+    rows = table.to_pandas()
+    for _, group in rows.groupby("symbol", observed=True):
+        days = group["timestamp"].to_numpy().astype("datetime64[D]")
+        np.testing.assert_array_equal(days, DAY - np.arange(signals.SIGNAL_BARS)[::-1])
+    # 6 decimals below 1, cents above
+    for symbol, decimals in (("XRP", 6), ("BTC", 2)):
+        close = rows[rows["symbol"] == symbol]["close"]
+        assert (np.round(close, decimals) == close).all()
+
+
+def test_the_sql_reference_reuses_one_connection_per_thread(monkeypatch):
+    monkeypatch.setattr(signals, "_history", PriceHistory())
+    cursor = signals._cursor()
+    first = signals.create_signals_sql(["BTC", "ETH"], PRICES, DAY)
+    second = signals.create_signals_sql(["BTC", "ETH"], PRICES, DAY)
+
+    assert list(first["symbol"]) == ["BTC", "ETH"]
+    assert first.equals(second)
+    assert signals._cursor() is cursor
+    # the Arrow table is only registered for the query
+    tables = cursor.execute("SELECT table_name FROM information_schema.tables").fetchall()
+    assert ("bars",) not in tables
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(signals._cursor()))
+    thread.start()
+    thread.join()
+    assert other[0] is not cursor
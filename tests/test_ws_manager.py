@@ -0,0 +1,134 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+from ws_manager import LogRing, Subscriber, WSConnectionManager
+
+
+class FakeSocket:
+    """Records the frames sent; `send_text` waits on `gate` when one is given."""
+
+    def __init__(self, gate: Optional[asyncio.Event] = None):
+        self.gate = gate
+        self.frames = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.frames.append(json.loads(frame))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def lines(*messages):
+    return [{"level": "INFO", "message": message, "time": "t"} for message in messages]
+
+
+def test_overflow_skips_to_the_latest_frame():
+    subscriber = Subscriber(FakeSocket(), max_queue=3)
+    assert all(subscriber.offer(str(i)) for i in range(3))
+
+    assert not subscriber.offer("3")
+    notice, latest = subscriber.queue
+    assert json.loads(notice)[0]["message"] == "3 log frames skipped (connection too slow)"
+    assert latest == "3"
+    assert subscriber.overflows == 1 and subscriber.skipped_frames == 3
+
+
+def test_slow_subscriber_is_evicted_without_holding_up_others():
+    async def scenario():
+        manager = WSConnectionManager(max_queue=2, max_overflows=2)
+        fast, slow = FakeSocket(), FakeSocket(asyncio.Event())
+        await manager.connect(fast, "1/1")
+        await manager.connect(slow, "1/1")
+
+        for i in range(10):
+            await manager.send_logs("1/1", lines(str(i)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+
+        assert [frame[0]["message"] for frame in fast.frames] == [str(i) for i in range(10)]
+        assert slow.closed_with == 1013
+        stats = manager.stats()
+        assert stats["evictions"] == 1 and stats["subscribers"] == 1
+        assert stats["skipped_frames"] == 4
+        manager.disconnect(fast, "1/1")
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_that_catches_up_is_kept():
+    async def scenario():
+        manager = WSConnectionManager(max_queue=2, max_overflows=2)
+        gate = asyncio.Event()
+        socket = FakeSocket(gate)
+        await manager.connect(socket, "1/1")
+
+        for i in range(4):
+            await manager.send_logs("1/1", lines(str(i)))
+            await asyncio.sleep(0)
+        gate.set()
+        await asyncio.sleep(0.01)
+
+        # one overflow, then drained: the count starts over
+        subscriber = manager.active_connections["1/1"][socket]
+        assert subscriber.overflows == 0 and socket.closed_with is None
+        messages = [frame[0]["message"] for frame in socket.frames]
+        assert messages == ["0", "2 log frames skipped (connection too slow)", "3"]
+        manager.disconnect(socket, "1/1")
+
+    asyncio.run(scenario())
+
+
+def test_ring_replays_lines_after_a_seq():
+    ring = LogRing(max_lines=3)
+    for seq, line in enumerate(lines("a", "b", "c", "d"), start=1):
+        ring.append(seq, line)
+
+    # bounded to the last three lines
+    assert [line["seq"] for line in ring.replay()] == [2, 3, 4]
+    assert [line["message"] for line in ring.replay(since=2)] == ["c", "d"]
+    assert ring.replay(since=4) == []
+
+
+def test_ring_drops_lines_older_than_max_age():
+    ring = LogRing(max_lines=10, max_age=0.05)
+    ring.append(1, lines("old")[0])
+    time.sleep(0.1)
+    ring.append(2, lines("new")[0])
+
+    assert [line["message"] for line in ring.replay()] == ["new"]
+
+
+def test_new_subscriber_resumes_from_its_last_seq():
+    async def scenario():
+        manager = WSConnectionManager()
+        await manager.send_logs("1/1", lines("a", "b"))
+        await manager.send_logs("2/1", lines("other"))
+        await manager.send_logs("1/1", lines("c"))
+
+        resumed, fresh, restarted = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(resumed, "1/1", since=2)
+        await manager.connect(fresh, "1/1")
+        # a cursor past the last seq is from before a restart, everything is replayed
+        await manager.connect(restarted, "1/1", since=99)
+        await asyncio.sleep(0.01)
+
+        assert resumed.frames == [[{"seq": 4, "level": "INFO", "message": "c", "time": "t"}]]
+        assert [line["seq"] for line in fresh.frames[0]] == [1, 2, 4]
+        assert restarted.frames == fresh.frames
+
+        # live lines carry their seq too, after the replay
+        await manager.send_logs("1/1", lines("d"))
+        await asyncio.sleep(0.01)
+        assert resumed.frames[-1][0]["seq"] == 5
+        for socket in (resumed, fresh, restarted):
+            manager.disconnect(socket, "1/1")
+
+    asyncio.run(scenario())
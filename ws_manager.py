@@ -1,46 +1,240 @@
-from collections import defaultdict
-from typing import Dict, List
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, List, Optional
 from fastapi import WebSocket
-from datetime import datetime
 import asyncio
+import itertools
+import json
+import time
+
+
+class LogRing:
+    """
+    Recent log lines of one job, bounded by `max_lines` and optionally by `max_age` seconds.
+    Lines are kept as tuples, the dicts are only rebuilt for a replay.
+    """
+
+    __slots__ = ("lines", "max_age", "touched")
+
+    def __init__(self, max_lines: int, max_age: Optional[float] = None):
+        # (seq, appended_at, level, message, time)
+        self.lines: deque = deque(maxlen=max_lines)
+        self.max_age = max_age
+        self.touched = time.monotonic()
+
+    def append(self, seq: int, line: dict):
+        self.touched = time.monotonic()
+        self.lines.append((seq, self.touched, line["level"], line["message"], line["time"]))
+
+    def replay(self, since: Optional[int] = None) -> List[dict]:
+        """Lines with a sequence number greater than `since`, or all of them."""
+        if self.max_age is not None:
+            expired = time.monotonic() - self.max_age
+            while self.lines and self.lines[0][1] < expired:
+                self.lines.popleft()
+
+        return [
+            {"seq": seq, "level": level, "message": message, "time": time_text}
+            for seq, _, level, message, time_text in self.lines
+            if since is None or seq > since
+        ]
+
+
+class Subscriber:
+    """
+    One WebSocket with its own bounded queue of outbound frames, drained by a writer task,
+    so a slow client never blocks delivery to anyone else.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        # overflows since the queue was last drained empty
+        self.overflows = 0
+        self.skipped_frames = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, frame: str) -> bool:
+        """
+        Queue `frame` without blocking. On overflow the backlog is skipped so the client jumps
+        to the latest lines; returns False when the backlog was skipped.
+        """
+        self.ready.set()
+        if len(self.queue) < self.max_queue:
+            self.queue.append(frame)
+            return True
+
+        skipped = len(self.queue)
+        self.queue.clear()
+        self.overflows += 1
+        self.skipped_frames += skipped
+        notice = {
+            "level": "WARNING",
+            "message": f"{skipped} log frames skipped (connection too slow)",
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.queue.append(json.dumps([notice]))
+        self.queue.append(frame)
+        return False
+
+    async def write(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                await self.websocket.send_text(self.queue.popleft())
+            self.overflows = 0
 
 
 class WSConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = defaultdict(list)
+    """
+    Fans log frames out to WebSocket subscribers keyed by "{plugin_id}/{session_id}".
+
+    `send_logs` only enqueues onto each subscriber's bounded queue, it never awaits a socket.
+    A subscriber whose queue overflows `max_overflows` times in a row without catching up is
+    evicted and its socket closed.
 
-    async def connect(self, websocket: WebSocket, job_id: str):
+    Every line gets a `seq` number and the last `backlog_lines` (younger than `backlog_seconds`)
+    of each job are kept in a `LogRing`, replayed to new subscribers as one frame. Clients pass
+    the last `seq` they saw to resume without duplicates. At most `max_backlogs` rings are kept,
+    and rings idle for `backlog_idle_ttl` seconds are dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 256,
+        max_overflows: int = 3,
+        backlog_lines: int = 200,
+        backlog_seconds: Optional[float] = None,
+        max_backlogs: int = 10_000,
+        backlog_idle_ttl: float = 900,
+    ):
+        self.max_queue = max_queue
+        self.max_overflows = max_overflows
+        self.active_connections: Dict[str, Dict[WebSocket, Subscriber]] = defaultdict(dict)
+        self.backlog_lines = backlog_lines
+        self.backlog_seconds = backlog_seconds
+        self.max_backlogs = max_backlogs
+        self.backlog_idle_ttl = backlog_idle_ttl
+        # least recently written first
+        self.backlogs: OrderedDict[str, LogRing] = OrderedDict()
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._next_sweep = time.monotonic() + backlog_idle_ttl
+        self.evictions = 0
+        self.skipped_frames = 0
+        self._closing: set = set()
+
+    async def connect(self, websocket: WebSocket, job_id: str, since: Optional[int] = None):
         await websocket.accept()
-        self.active_connections[job_id].append(websocket)
+        subscriber = Subscriber(websocket, self.max_queue)
+
+        # backlog first, no await until registered so no line is missed or sent twice
+        ring = self.backlogs.get(job_id)
+        if since is not None and since > self._last_seq:
+            # cursor from before a server restart
+            since = None
+        if ring:
+            backlog = ring.replay(since)
+            if backlog:
+                subscriber.offer(json.dumps(backlog))
+
+        subscriber.task = asyncio.create_task(self._write(subscriber, job_id))
+        self.active_connections[job_id][websocket] = subscriber
+
+    async def _write(self, subscriber: Subscriber, job_id: str):
+        try:
+            await subscriber.write()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(subscriber.websocket, job_id)
 
     def disconnect(self, websocket: WebSocket, job_id: str):
         conns = self.active_connections.get(job_id)
         if not conns:
             return
 
-        if websocket in conns:
-            conns.remove(websocket)
+        subscriber = conns.pop(websocket, None)
+        if subscriber:
+            self.skipped_frames += subscriber.skipped_frames
+            if subscriber.task and subscriber.task is not asyncio.current_task():
+                subscriber.task.cancel()
 
         if not conns:
             self.active_connections.pop(job_id, None)
 
-    async def send_log(self, message: dict):
-        job_id = message["job_id"]
+    def _evict(self, subscriber: Subscriber, job_id: str):
+        self.evictions += 1
+        self.disconnect(subscriber.websocket, job_id)
+        task = asyncio.create_task(self._close(subscriber.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            # 1013: try again later
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def _record(self, job_id: str, lines: List[dict]):
+        ring = self.backlogs.get(job_id)
+        if ring is None:
+            ring = self.backlogs[job_id] = LogRing(self.backlog_lines, self.backlog_seconds)
+            if len(self.backlogs) > self.max_backlogs:
+                self.backlogs.popitem(last=False)
+        else:
+            self.backlogs.move_to_end(job_id)
+
+        for line in lines:
+            line["seq"] = self._last_seq = next(self._seq)
+            ring.append(line["seq"], line)
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.backlog_idle_ttl
+            idle = now - self.backlog_idle_ttl
+            while self.backlogs:
+                oldest_id, oldest = next(iter(self.backlogs.items()))
+                if oldest.touched >= idle:
+                    break
+                del self.backlogs[oldest_id]
+
+    async def send_logs(self, job_id: str, lines: List[dict]):
+        self._record(job_id, lines)
+
         conns = self.active_connections.get(job_id)
         if not conns:
             return
 
-        payload = {
-            "level": message["level"],
-            "message": message["message"],
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
+        # serialize the batch once, every subscriber gets the same frame
+        frame = json.dumps(lines)
 
-        results = await asyncio.gather(
-            *(ws.send_json(payload) for ws in conns),
-            return_exceptions=True,
-        )
+        for subscriber in list(conns.values()):
+            if not subscriber.offer(frame) and subscriber.overflows >= self.max_overflows:
+                self._evict(subscriber, job_id)
 
-        for ws, result in zip(conns.copy(), results):
-            if isinstance(result, Exception):
-                self.disconnect(ws, job_id)
+    def stats(self) -> dict:
+        depths = {
+            job_id: [len(subscriber.queue) for subscriber in conns.values()]
+            for job_id, conns in self.active_connections.items()
+        }
+        all_depths = [depth for job_depths in depths.values() for depth in job_depths]
+        return {
+            "subscribers": len(all_depths),
+            "queued_frames": sum(all_depths),
+            "max_queue_depth": max(all_depths, default=0),
+            "queue_depths": depths,
+            "evictions": self.evictions,
+            "backlogs": len(self.backlogs),
+            "backlog_lines": sum(len(ring.lines) for ring in self.backlogs.values()),
+            "skipped_frames": self.skipped_frames
+            + sum(
+                subscriber.skipped_frames
+                for conns in self.active_connections.values()
+                for subscriber in conns.values()
+            ),
+        }